@@ -0,0 +1,157 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2007, 2008 MySpace Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Incremental parsing of the MySpace activities Atom feeds.
+
+   iter_entries parses a feed from a file-like object as it is read and
+   yields one ActivityEntry per <entry>, discarding the element tree of each
+   entry once it has been handed out.
+"""
+
+import calendar
+import re
+
+try:
+    from xml.etree import cElementTree as ElementTree
+except ImportError:
+    from xml.etree import ElementTree
+
+__all__ = [
+    'ActivityEntry',
+    'ParseError',
+    'iter_entries',
+    'parse_atom_date',
+    ]
+
+# raised by iter_entries for a malformed feed, a SyntaxError subclass
+ParseError = ElementTree.ParseError
+
+ATOM_NS = '{http://www.w3.org/2005/Atom}'
+
+_ENTRY = ATOM_NS + 'entry'
+_ID = ATOM_NS + 'id'
+_TITLE = ATOM_NS + 'title'
+_UPDATED = ATOM_NS + 'updated'
+_PUBLISHED = ATOM_NS + 'published'
+_CONTENT = ATOM_NS + 'content'
+_LINK = ATOM_NS + 'link'
+_AUTHOR = ATOM_NS + 'author'
+_NAME = ATOM_NS + 'name'
+_URI = ATOM_NS + 'uri'
+_CATEGORY = ATOM_NS + 'category'
+
+_DATE_RE = re.compile(r'^(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(?:\.\d+)?(Z|[+-]\d\d:?\d\d)?$')
+
+def parse_atom_date(value):
+    """Converts an RFC 3339 date as used by Atom to seconds since the epoch (UTC).
+       Returns None if value can't be parsed.
+    """
+    match = _DATE_RE.match(value.strip())
+    if match is None:
+        return None
+    year, month, day, hour, minute, second = [int(part) for part in match.groups()[:6]]
+    timestamp = calendar.timegm((year, month, day, hour, minute, second, 0, 0, 0))
+    zone = match.group(7)
+    if zone and zone != 'Z':
+        sign = zone[0] == '-' and -1 or 1
+        zone = zone[1:].replace(':', '')
+        timestamp -= sign * (int(zone[:2]) * 3600 + int(zone[2:]) * 60)
+    return timestamp
+
+class ActivityEntry(object):
+
+    """One <entry> of an activities feed."""
+    __slots__ = ('id', 'title', 'updated', 'published', 'content', 'link', 'author_name', 'author_uri', 'categories')
+
+    def __init__(self, id=None, title=None, updated=None, published=None, content=None, link=None,
+                 author_name=None, author_uri=None, categories=None):
+        self.id = id
+        self.title = title
+        self.updated = updated
+        self.published = published
+        self.content = content
+        self.link = link
+        self.author_name = author_name
+        self.author_uri = author_uri
+        self.categories = categories or []
+
+    def updated_timestamp(self):
+        if self.updated is None:
+            return None
+        return parse_atom_date(self.updated)
+
+    def __repr__(self):
+        return '<ActivityEntry %s updated %s: %r>' % (self.id, self.updated, self.title)
+
+def _make_entry(elem):
+    entry = ActivityEntry()
+    for child in elem:
+        tag = child.tag
+        if tag == _ID:
+            entry.id = (child.text or '').strip()
+        elif tag == _TITLE:
+            entry.title = child.text
+        elif tag == _UPDATED:
+            entry.updated = (child.text or '').strip()
+        elif tag == _PUBLISHED:
+            entry.published = (child.text or '').strip()
+        elif tag == _CONTENT:
+            entry.content = child.text
+        elif tag == _LINK:
+            if entry.link is None or child.get('rel', 'alternate') == 'alternate':
+                entry.link = child.get('href')
+        elif tag == _AUTHOR:
+            entry.author_name = child.findtext(_NAME)
+            entry.author_uri = child.findtext(_URI)
+        elif tag == _CATEGORY:
+            entry.categories.append(child.get('term'))
+    return entry
+
+def iter_entries(stream, stop_at_id=None, stop_at_updated=None):
+    """Yields the entries of the Atom feed read from stream, newest first as
+       served by MySpace.
+
+       Iteration stops, without yielding it, at the entry whose id is
+       stop_at_id, or at the first entry not updated after stop_at_updated
+       (an Atom date string or seconds since the epoch). Pass the id/updated
+       value of the newest entry handled by the previous poll to only get the
+       entries added since.
+    """
+    if isinstance(stop_at_updated, basestring):
+        stop_at_updated = parse_atom_date(stop_at_updated)
+    root = None
+    for event, elem in ElementTree.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            continue
+        if elem.tag != _ENTRY:
+            continue
+        entry = _make_entry(elem)
+        # free the entry's subtree as soon as it has been converted
+        elem.clear()
+        if root is not None:
+            try:
+                root.remove(elem)
+            except ValueError:
+                pass
+        if stop_at_id is not None and entry.id == stop_at_id:
+            return
+        if stop_at_updated is not None:
+            updated = entry.updated_timestamp()
+            if updated is not None and updated <= stop_at_updated:
+                return
+        yield entry
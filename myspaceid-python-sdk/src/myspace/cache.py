@@ -0,0 +1,341 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2007, 2008 MySpace Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import cPickle
+import os
+import re
+import tempfile
+import threading
+import time
+import urlparse
+
+try:
+    from hashlib import sha1
+except ImportError:
+    from sha import new as sha1
+
+__all__ = [
+    'CacheEntry',
+    'DiskCache',
+    'MemoryCache',
+    'ResponseCache',
+    'endpoint_name',
+    ]
+
+DEFAULT_TTL = 300            # seconds
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_GENERATIONS = 10000
+
+"""Default time to live (seconds) per endpoint, see endpoint_name()
+"""
+DEFAULT_TTLS = {
+    'moods': 24 * 3600,
+    'profile': 3600,
+    'albums': 3600,
+    'albums/photos': 3600,
+    'photos': 3600,
+    'videos': 3600,
+    'friends': 600,
+    'mood': 60,
+    'status': 60,
+    'indicators': 30,
+}
+
+_USER_ID_RE = re.compile(r'/users/(\d+)(?:/|\.|$)')
+_NUMERIC_SEGMENT_RE = re.compile(r'^\d+(?:;\d+)*$')
+
+def endpoint_name(url):
+    """Returns the endpoint a MySpace API url belongs to, with the version,
+       the ids and the extension removed, e.g. 'profile' for
+       http://api.myspace.com/v1/users/1234/profile.json and 'albums/photos'
+       for http://api.myspace.com/v1/users/1234/albums/5/photos.json
+    """
+    path = urlparse.urlparse(url)[2]
+    segments = []
+    for segment in path.split('/')[2:]:
+        segment = segment.split('.')[0]
+        if segment and segment != 'users' and not _NUMERIC_SEGMENT_RE.match(segment):
+            segments.append(segment)
+    return '/'.join(segments)
+
+def user_id_from_url(url):
+    match = _USER_ID_RE.search(url)
+    if match:
+        return match.group(1)
+    return None
+
+class CacheEntry(object):
+
+    """A cached API response with its expiry time and HTTP validators."""
+    def __init__(self, value, expires, etag=None, last_modified=None):
+        self.value = value
+        self.expires = expires
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def is_fresh(self, now=None):
+        return (now or time.time()) < self.expires
+
+    def can_revalidate(self):
+        return self.etag is not None or self.last_modified is not None
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+class MemoryCache(object):
+
+    """In-process LRU cache backend holding at most max_entries entries."""
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._map = {}
+        # circular doubly linked list of [prev, next, key, value], most recently used first
+        self._root = root = []
+        root[:] = [root, root, None, None]
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        self._lock.acquire()
+        try:
+            link = self._map.get(key)
+            if link is None:
+                return None
+            self._unlink(link)
+            self._link_front(link)
+            return link[3]
+        finally:
+            self._lock.release()
+
+    def set(self, key, value):
+        self._lock.acquire()
+        try:
+            link = self._map.get(key)
+            if link is not None:
+                self._unlink(link)
+                link[3] = value
+            else:
+                link = [None, None, key, value]
+                self._map[key] = link
+            self._link_front(link)
+            while len(self._map) > self.max_entries:
+                oldest = self._root[0]
+                self._unlink(oldest)
+                del self._map[oldest[2]]
+        finally:
+            self._lock.release()
+
+    def delete(self, key):
+        self._lock.acquire()
+        try:
+            link = self._map.pop(key, None)
+            if link is not None:
+                self._unlink(link)
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._map.clear()
+            self._root[:] = [self._root, self._root, None, None]
+        finally:
+            self._lock.release()
+
+    def __len__(self):
+        return len(self._map)
+
+    def _unlink(self, link):
+        prev, next = link[0], link[1]
+        prev[1] = next
+        next[0] = prev
+
+    def _link_front(self, link):
+        root = self._root
+        first = root[1]
+        link[0] = root
+        link[1] = first
+        first[0] = link
+        root[1] = link
+
+class DiskCache(object):
+
+    """Cache backend storing one pickled entry per file in directory.
+
+       Reads touch the file so the least recently used entries are the ones
+       removed when more than max_entries files exist. The directory is checked
+       for that every prune_interval writes.
+    """
+    def __init__(self, directory, max_entries=10 * DEFAULT_MAX_ENTRIES, prune_interval=100):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.prune_interval = prune_interval
+        self._writes = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            f = open(path, 'rb')
+        except IOError:
+            return None
+        try:
+            try:
+                value = cPickle.load(f)
+            finally:
+                f.close()
+        except Exception:
+            # truncated, corrupt or pickled by an incompatible version of the code
+            self.delete(key)
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return value
+
+    def set(self, key, value):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                cPickle.dump(value, f, 2)
+            finally:
+                f.close()
+            os.rename(tmp_path, self._path(key))
+        except:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        self._writes += 1
+        if self._writes % self.prune_interval == 0:
+            self.prune()
+
+    def delete(self, key):
+        try:
+            os.unlink(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in self._entry_files():
+            self.delete(name[:-len('.cache')])
+
+    def prune(self):
+        names = self._entry_files()
+        if len(names) <= self.max_entries:
+            return
+        by_age = []
+        for name in names:
+            try:
+                by_age.append((os.path.getmtime(os.path.join(self.directory, name)), name))
+            except OSError:
+                pass
+        by_age.sort()
+        for mtime, name in by_age[:len(by_age) - self.max_entries]:
+            self.delete(name[:-len('.cache')])
+
+    def _entry_files(self):
+        return [name for name in os.listdir(self.directory) if name.endswith('.cache')]
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.cache')
+
+class ResponseCache(object):
+
+    """Opt-in cache for MySpace GET responses:
+
+          ms = MySpace(CONSUMER_KEY, CONSUMER_SECRET, token.key, token.secret, cache=ResponseCache())
+
+       Responses are keyed by the unsigned URL, the request parameters and the
+       access token, and stored in backend (a MemoryCache unless given, or a
+       DiskCache) for the per-endpoint ttls (see DEFAULT_TTLS and endpoint_name),
+       falling back to default_ttl. Expired entries that came with an ETag or
+       Last-Modified header are revalidated with a conditional request instead
+       of being fetched again.
+
+       Writes through the client (set_status, set_mood, create_album...) call
+       invalidate_user for the user in the URL, which bumps a per-user
+       generation that is part of every key. The generations live in memory,
+       so they are not shared between processes using the same DiskCache. Once
+       more than max_generations users have been invalidated they are all
+       forgotten and every entry cached until then is dropped.
+
+       Cached values are shared between callers and must not be modified.
+    """
+    def __init__(self, backend=None, ttls=None, default_ttl=DEFAULT_TTL, max_generations=DEFAULT_MAX_GENERATIONS):
+        self.backend = backend or MemoryCache()
+        self.ttls = DEFAULT_TTLS.copy()
+        if ttls:
+            self.ttls.update(ttls)
+        self.default_ttl = default_ttl
+        self.max_generations = max_generations
+        self._generations = {}
+        # part of every key, bumped when the generations are forgotten
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def make_key(self, url, parameters, token, raw=False):
+        user_id = user_id_from_url(url)
+        params = parameters and sorted(parameters.items()) or []
+        token_key = token and token.key or ''
+        key = repr((token_key, url, params, raw, self._epoch, self._generations.get(user_id, 0)))
+        return sha1(key).hexdigest()
+
+    def ttl_for(self, url):
+        return self.ttls.get(endpoint_name(url), self.default_ttl)
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def store(self, key, url, value, headers=None):
+        headers = headers or {}
+        entry = CacheEntry(value, time.time() + self.ttl_for(url),
+                           etag=headers.get('etag'), last_modified=headers.get('last-modified'))
+        self.backend.set(key, entry)
+        return entry
+
+    def revalidated(self, key, url, entry, headers=None):
+        """Marks entry fresh again after the server answered 304 Not Modified."""
+        headers = headers or {}
+        entry.expires = time.time() + self.ttl_for(url)
+        entry.etag = headers.get('etag', entry.etag)
+        entry.last_modified = headers.get('last-modified', entry.last_modified)
+        self.backend.set(key, entry)
+        return entry
+
+    def invalidate_user(self, user_id):
+        if user_id is None:
+            return
+        user_id = str(user_id)
+        self._lock.acquire()
+        try:
+            if user_id not in self._generations and len(self._generations) >= self.max_generations:
+                # forgetting a generation would revive the entries it replaced, drop them all instead
+                self._generations.clear()
+                self._epoch += 1
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        finally:
+            self._lock.release()
+
+    def invalidate_url(self, url):
+        self.invalidate_user(user_id_from_url(url))
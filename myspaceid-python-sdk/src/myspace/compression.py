@@ -0,0 +1,147 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2007, 2008 MySpace Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Decoding of gzip and deflate compressed HTTP responses.
+
+   The fetchers send ACCEPT_ENCODING with every request and decode the
+   responses as they are read, so callers only ever see the decoded body.
+"""
+
+import httplib
+import zlib
+
+__all__ = [
+    'ACCEPT_ENCODING',
+    'DecodingError',
+    'DecodingReader',
+    'decode_body',
+    'is_compressed',
+    ]
+
+ACCEPT_ENCODING = 'gzip, deflate'
+
+READ_CHUNK_SIZE = 8192
+
+class DecodingError(httplib.HTTPException):
+
+    """A compressed response body is corrupt. An HTTPException so that the
+       client reports it as a transport error.
+    """
+
+def _encoding(headers):
+    if not headers:
+        return None
+    value = headers.get('content-encoding') or headers.get('Content-Encoding')
+    return value and value.strip().lower() or None
+
+def is_compressed(headers):
+    """True if the Content-Encoding of a response is one we can decode."""
+    return _encoding(headers) in ('gzip', 'x-gzip', 'deflate')
+
+class _Decoder(object):
+
+    """Incremental decoder for one response body. 'deflate' is supposed to be
+       zlib wrapped, but some servers send raw deflate data; which one it is
+       is detected from the first bytes.
+    """
+    def __init__(self, encoding):
+        self.encoding = encoding
+        self._decompressor = None
+        if encoding in ('gzip', 'x-gzip'):
+            # 16 + MAX_WBITS: expect and check a gzip header and trailer
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._pending = ''
+
+    def decompress(self, data):
+        try:
+            return self._decompress(data)
+        except zlib.error, e:
+            raise DecodingError('Invalid %s response body: %s' % (self.encoding, e))
+
+    def flush(self):
+        try:
+            return self._flush()
+        except zlib.error, e:
+            raise DecodingError('Invalid %s response body: %s' % (self.encoding, e))
+
+    def _decompress(self, data):
+        if self._decompressor is None:
+            self._pending += data
+            if len(self._pending) < 2:
+                return ''
+            data, self._pending = self._pending, ''
+            header = (ord(data[0]) << 8) | ord(data[1])
+            if ord(data[0]) & 0x0f == 8 and header % 31 == 0:
+                self._decompressor = zlib.decompressobj()
+            else:
+                self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self._decompressor.decompress(data)
+
+    def _flush(self):
+        if self._decompressor is None:
+            if not self._pending:
+                return ''
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            data, self._pending = self._pending, ''
+            return self._decompressor.decompress(data) + self._decompressor.flush()
+        return self._decompressor.flush()
+
+def decode_body(body, headers):
+    """Returns body decoded as specified by the Content-Encoding in headers."""
+    if not body or not is_compressed(headers):
+        return body
+    decoder = _Decoder(_encoding(headers))
+    return decoder.decompress(body) + decoder.flush()
+
+class DecodingReader(object):
+
+    """File-like object returning the decoded body of a compressed response
+       read from fp. wire_bytes is the number of compressed bytes read from fp
+       so far, decoded_bytes the number of bytes returned.
+    """
+    def __init__(self, fp, headers):
+        self.fp = fp
+        self._decoder = _Decoder(_encoding(headers))
+        self._buffer = ''
+        self._eof = False
+        self.wire_bytes = 0
+        self.decoded_bytes = 0
+
+    def _fill(self):
+        data = self.fp.read(READ_CHUNK_SIZE)
+        if not data:
+            self._buffer += self._decoder.flush()
+            self._eof = True
+            return
+        self.wire_bytes += len(data)
+        self._buffer += self._decoder.decompress(data)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            while not self._eof:
+                self._fill()
+            data, self._buffer = self._buffer, ''
+        else:
+            while len(self._buffer) < size and not self._eof:
+                self._fill()
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        self.decoded_bytes += len(data)
+        return data
+
+    def close(self):
+        close = getattr(self.fp, 'close', None)
+        if close is not None:
+            close()
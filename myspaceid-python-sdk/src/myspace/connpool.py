@@ -0,0 +1,142 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2007, 2008 MySpace Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import httplib
+import select
+import threading
+import time
+
+__all__ = [
+    'ConnectionPool',
+    'is_connection_alive',
+    ]
+
+DEFAULT_MAX_SIZE = 10        # idle connections kept per host
+DEFAULT_IDLE_TIMEOUT = 60.0  # seconds an idle connection may sit in the pool
+
+CONNECTION_CLASSES = {
+    'http': httplib.HTTPConnection,
+    'https': httplib.HTTPSConnection,
+}
+
+def is_connection_alive(conn):
+    """Default health check for an idle connection.
+
+       An idle keep-alive socket should have nothing to read. If select()
+       reports it readable the server has either closed it or sent something
+       unexpected, and in both cases the connection can't be reused.
+    """
+    sock = conn.sock
+    if sock is None:
+        return False
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+    except (select.error, ValueError):
+        return False
+    return not readable
+
+class ConnectionPool(object):
+
+    """Keeps HTTP/1.1 connections open per (scheme, host, port) so that
+       consecutive requests to the same host can skip the TCP (and TLS)
+       handshake.
+
+       max_size      - maximum number of idle connections kept per host
+       idle_timeout  - idle connections older than this (seconds) are closed
+                       instead of being reused
+       health_check  - callable(conn) -> bool run before an idle connection is
+                       handed out again
+
+       A pool is thread safe and is meant to be shared, e.g. by passing the same
+       PooledUrlFetcher to every MySpace instance.
+    """
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, idle_timeout=DEFAULT_IDLE_TIMEOUT, health_check=is_connection_alive):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check = health_check
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def get(self, scheme, host, port=None):
+        """Returns a (connection, reused) tuple for the given host. reused is
+           True when the connection came out of the pool rather than being
+           newly created.
+        """
+        key = (scheme, host, port)
+        stale = []
+        conn = None
+        now = time.time()
+        self._lock.acquire()
+        try:
+            idle = self._idle.get(key)
+            while idle:
+                candidate, last_used = idle.pop()
+                if now - last_used > self.idle_timeout:
+                    stale.append(candidate)
+                    continue
+                conn = candidate
+                break
+        finally:
+            self._lock.release()
+        for c in stale:
+            c.close()
+        if conn is not None:
+            if self.health_check is None or self.health_check(conn):
+                return conn, True
+            conn.close()
+        return self._new_connection(scheme, host, port), False
+
+    def put(self, scheme, host, port, conn):
+        """Returns a connection to the pool once its response has been read
+           completely. Connections beyond max_size are closed.
+        """
+        key = (scheme, host, port)
+        self._lock.acquire()
+        try:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_size:
+                idle.append((conn, time.time()))
+                return
+        finally:
+            self._lock.release()
+        conn.close()
+
+    def clear(self):
+        """Closes all idle connections."""
+        self._lock.acquire()
+        try:
+            idle, self._idle = self._idle, {}
+        finally:
+            self._lock.release()
+        for conns in idle.itervalues():
+            for conn, last_used in conns:
+                conn.close()
+
+    def idle_count(self, scheme=None, host=None, port=None):
+        self._lock.acquire()
+        try:
+            if scheme is None:
+                return sum([len(conns) for conns in self._idle.itervalues()])
+            return len(self._idle.get((scheme, host, port), ()))
+        finally:
+            self._lock.release()
+
+    def _new_connection(self, scheme, host, port):
+        try:
+            connection_class = CONNECTION_CLASSES[scheme]
+        except KeyError:
+            raise ValueError('Unsupported URL scheme: %s' % scheme)
+        return connection_class(host, port)
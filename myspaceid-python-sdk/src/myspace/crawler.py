@@ -0,0 +1,294 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2007, 2008 MySpace Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Breadth first crawling of the MySpace friend graph.
+
+      crawler = FriendGraphCrawler(ms, depth=2, checkpoint_path='crawl.ckpt')
+      out = open('edges.tsv', 'a')
+      write_edge_list(crawler.crawl([seed_id]), out)
+
+   crawl() yields (user_id, friend_id) edges as the friend lists come in.
+   With a checkpoint_path the progress is saved regularly and a crawl that
+   was interrupted carries on from the last checkpoint when crawl() is
+   called again; the edges of users expanded after that checkpoint are
+   yielded a second time. The checkpoint is removed once a crawl completes.
+"""
+
+import array
+import os
+import pickle
+
+from myspace.errors import MySpaceError
+from myspace.workers import WorkerPool
+
+__all__ = [
+    'FriendGraphCrawler',
+    'VisitedSet',
+    'write_edge_list',
+    ]
+
+DEFAULT_CRAWL_WORKERS = 8
+DEFAULT_CHECKPOINT_INTERVAL = 1000
+# friend ids checked per get_friendship call
+DEFAULT_FRIENDSHIP_BATCH = 50
+
+CHECKPOINT_VERSION = 1
+
+class VisitedSet(object):
+
+    """Set of non-negative integer user ids stored as a bitmap.
+
+       The bitmap is split in pages of PAGE_BITS ids allocated on first use,
+       so memory grows with the ranges of ids actually seen: one bit per id
+       within a touched page instead of a Python object per id.
+    """
+    PAGE_BITS = 1 << 16
+
+    def __init__(self):
+        self._pages = {}
+        self._count = 0
+
+    def _locate(self, user_id):
+        user_id = int(user_id)
+        if user_id < 0:
+            raise ValueError('user ids must be non-negative: %d' % user_id)
+        page, bit = divmod(user_id, self.PAGE_BITS)
+        return page, bit >> 3, 1 << (bit & 7)
+
+    def add(self, user_id):
+        """Adds user_id, returns False if it was already there."""
+        page, offset, mask = self._locate(user_id)
+        bits = self._pages.get(page)
+        if bits is None:
+            bits = self._pages[page] = array.array('B', [0]) * (self.PAGE_BITS >> 3)
+        if bits[offset] & mask:
+            return False
+        bits[offset] |= mask
+        self._count += 1
+        return True
+
+    def __contains__(self, user_id):
+        page, offset, mask = self._locate(user_id)
+        bits = self._pages.get(page)
+        return bits is not None and bool(bits[offset] & mask)
+
+    def __len__(self):
+        return self._count
+
+    def __getstate__(self):
+        return {'count': self._count, 'pages': dict([(page, bits.tostring()) for page, bits in self._pages.iteritems()])}
+
+    def __setstate__(self, state):
+        self._count = state['count']
+        self._pages = {}
+        for page, data in state['pages'].iteritems():
+            self._pages[page] = array.array('B', data)
+
+def write_edge_list(edges, out, separator='\t'):
+    """Writes (user_id, friend_id) edges to the file-like object out, one per
+       line, flushing every 1000 edges. Returns the number of edges written.
+    """
+    count = 0
+    for user_id, friend_id in edges:
+        out.write('%s%s%s\n' % (user_id, separator, friend_id))
+        count += 1
+        if count % 1000 == 0:
+            out.flush()
+    out.flush()
+    return count
+
+def _friend_ids(client, user_id, page_size):
+    return [int(friend['userId']) for friend in client.iter_friends(user_id, page_size=page_size, prefetch=False)]
+
+def _friendship_entries(response):
+    for key, value in response.iteritems():
+        if key.lower() == 'friendship':
+            return value or []
+    return []
+
+class FriendGraphCrawler(object):
+
+    """Breadth first expansion of the friend graph from a set of seed users.
+
+       client              - the MySpace instance used for the calls
+       depth               - number of hops: 1 yields the seeds' friends, 2 the
+                             friends of those as well, and so on
+       max_workers         - friend lists fetched concurrently, at most twice as
+                             many are queued (or use worker_pool)
+       page_size           - page size used to read the friend lists
+       checkpoint_path     - file the progress is saved to and resumed from
+       checkpoint_interval - number of expanded users between checkpoints
+
+       Users whose friend list can't be read (e.g. private profiles, or
+       malformed entries) are skipped and recorded in the errors list as
+       (user_id, exception).
+    """
+    def __init__(self, client, depth=2, max_workers=DEFAULT_CRAWL_WORKERS, page_size=100, checkpoint_path=None,
+                 checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL, worker_pool=None):
+        if depth < 1:
+            raise ValueError('depth must be at least 1')
+        self.client = client
+        self.depth = depth
+        self.max_workers = max_workers
+        self.page_size = page_size
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.worker_pool = worker_pool
+        self.visited = VisitedSet()
+        self.errors = []
+
+    def crawl(self, seeds):
+        """Generator yielding (user_id, friend_id) for every friend of every user
+           within depth - 1 hops of the seeds. seeds are ignored when resuming
+           from a checkpoint, which is removed once the crawl is complete.
+        """
+        state = self.load_checkpoint()
+        if state is None:
+            frontier = array.array('l')
+            for seed in seeds:
+                if self.visited.add(seed):
+                    frontier.append(int(seed))
+            level, position, next_frontier = 0, 0, array.array('l')
+        else:
+            level, position, frontier, next_frontier = state
+
+        pool = self.worker_pool or WorkerPool(self.max_workers)
+        try:
+            while level < self.depth and frontier:
+                expand = level + 1 < self.depth
+                for user_id, friend_ids in self._expand(pool, frontier, position):
+                    for friend_id in friend_ids:
+                        yield user_id, friend_id
+                    if expand:
+                        for friend_id in friend_ids:
+                            if self.visited.add(friend_id):
+                                next_frontier.append(friend_id)
+                    position += 1
+                    if self.checkpoint_interval and position % self.checkpoint_interval == 0:
+                        self.save_checkpoint(level, position, frontier, next_frontier)
+                level, position, frontier, next_frontier = level + 1, 0, next_frontier, array.array('l')
+                self.save_checkpoint(level, position, frontier, next_frontier)
+            # done, the next crawl starts afresh from its own seeds
+            self.remove_checkpoint()
+        finally:
+            if self.worker_pool is None:
+                pool.shutdown(wait=False)
+
+    def _expand(self, pool, frontier, position):
+        """Yields (user_id, friend ids) for the users of frontier from position
+           on, in frontier order.
+        """
+        window = max(1, self.max_workers * 2)
+        in_flight = []
+        users = iter(frontier[position:])
+        while True:
+            for user_id in users:
+                in_flight.append((user_id, pool.submit(_friend_ids, self.client, user_id, self.page_size)))
+                if len(in_flight) >= window:
+                    break
+            if not in_flight:
+                return
+            user_id, async_result = in_flight.pop(0)
+            try:
+                friend_ids = async_result.get()
+            except Exception, e:
+                # one bad friend list must not end the crawl
+                self.errors.append((user_id, e))
+                friend_ids = []
+            yield user_id, friend_ids
+
+    def check_friendships(self, user_id, friend_ids, batch_size=DEFAULT_FRIENDSHIP_BATCH):
+        """Yields (friend_id, are_friends) for each of friend_ids, checking
+           batch_size ids per get_friendship call and running max_workers calls
+           at a time. Batches that fail raise MySpaceError.
+        """
+        batches = []
+        batch = []
+        for friend_id in friend_ids:
+            batch.append(str(friend_id))
+            if len(batch) == batch_size:
+                batches.append(batch)
+                batch = []
+        if batch:
+            batches.append(batch)
+
+        step = max(1, self.max_workers)
+        for start in range(0, len(batches), step):
+            group = batches[start:start + step]
+            specs = [('get_friendship', {'user_id': user_id, 'friend_ids': ';'.join(ids)}) for ids in group]
+            for ids, response in zip(group, self.client.fetch_many(specs, self.max_workers, self.worker_pool)):
+                if isinstance(response, MySpaceError):
+                    raise response
+                are_friends = {}
+                for entry in _friendship_entries(response):
+                    values = dict([(key.lower(), value) for key, value in entry.iteritems()])
+                    are_friends[str(values.get('friendid'))] = bool(values.get('arefriends'))
+                for friend_id in ids:
+                    yield friend_id, are_friends.get(friend_id, False)
+
+    """Checkpointing
+    """
+    def save_checkpoint(self, level, position, frontier, next_frontier):
+        if not self.checkpoint_path:
+            return
+        state = {
+            'version': CHECKPOINT_VERSION,
+            'depth': self.depth,
+            'level': level,
+            'position': position,
+            'frontier': frontier.tostring(),
+            'next_frontier': next_frontier.tostring(),
+            'visited': self.visited,
+        }
+        # write to a temporary file first so that a crash never leaves a truncated checkpoint
+        temp_path = self.checkpoint_path + '.tmp'
+        f = open(temp_path, 'wb')
+        try:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        finally:
+            f.close()
+        try:
+            os.rename(temp_path, self.checkpoint_path)
+        except OSError:
+            # rename doesn't replace an existing file on Windows
+            os.remove(self.checkpoint_path)
+            os.rename(temp_path, self.checkpoint_path)
+
+    def remove_checkpoint(self):
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def load_checkpoint(self):
+        """Restores the state saved at checkpoint_path, if any. Returns (level,
+           position, frontier, next_frontier) or None.
+        """
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return None
+        f = open(self.checkpoint_path, 'rb')
+        try:
+            state = pickle.load(f)
+        finally:
+            f.close()
+        if state.get('version') != CHECKPOINT_VERSION:
+            raise ValueError('Unsupported checkpoint version in %s' % self.checkpoint_path)
+        if state['depth'] != self.depth:
+            raise ValueError('%s was saved by a crawl of depth %d, not %d' % (self.checkpoint_path, state['depth'], self.depth))
+        self.visited = state['visited']
+        frontier = array.array('l')
+        frontier.fromstring(state['frontier'])
+        next_frontier = array.array('l')
+        next_frontier.fromstring(state['next_frontier'])
+        return state['level'], state['position'], frontier, next_frontier
@@ -0,0 +1,270 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2007, 2008 MySpace Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Declarations of the MySpace REST API endpoints.
+
+   Each Endpoint carries its URL template, HTTP method, the arguments it takes
+   and their validators, all built once at import time. MySpace, AsyncMySpace
+   and MySpace.fetch_many are driven from the ENDPOINTS registry; adding an
+   endpoint is a matter of declaring it here (it is then available through
+   MySpace.call).
+"""
+
+import simplejson
+
+from myspace.errors import MySpaceError
+
+__all__ = [
+    'Endpoint',
+    'ENDPOINTS',
+    'ENDPOINT_NAMES',
+    'get_endpoint',
+    ]
+
+API_USERINFO_URL   = 'http://api.myspace.com/v1/user.json'
+API_ALBUMS_URL     = 'http://api.myspace.com/v1/users/%s/albums.json'
+API_ALBUM_URL      = 'http://api.myspace.com/v1/users/%s/albums/%s/photos.json'
+API_FRIENDS_URL    = 'http://api.myspace.com/v1/users/%s/friends.json'
+API_FRIENDSHIP_URL = 'http://api.myspace.com/v1/users/%s/friends/%s.json'
+API_MOOD_URL       = 'http://api.myspace.com/v1/users/%s/mood.json'
+API_MOODS_URL      = 'http://api.myspace.com/v1/users/%s/moods.json'
+API_PHOTOS_URL     = 'http://api.myspace.com/v1/users/%s/photos.json'
+API_PHOTO_URL      = 'http://api.myspace.com/v1/users/%s/photos/%s.json'
+API_PROFILE_URL    = 'http://api.myspace.com/v1/users/%s/profile.json'
+API_STATUS_URL     = 'http://api.myspace.com/v1/users/%s/status.json'
+API_VIDEOS_URL     = 'http://api.myspace.com/v1/users/%s/videos.json'
+API_VIDEO_URL      = 'http://api.myspace.com/v1/users/%s/videos/%s.json'
+API_ACTIVITIES_URL = "http://api.myspace.com/v1/users/%s/activities.atom"
+API_FRIENDSACTIVITIES_URL = "http://api.myspace.com/v1/users/%s/friends/activities.atom"
+API_UPDATE_STATUS_URL = "http://api.myspace.com/v1/users/%s/status";
+API_UPDATE_MOOD_URL   = "http://api.myspace.com/v1/users/%s/mood";
+API_CREATE_ALBUM_URL = 'http://api.myspace.com/v1/users/%s/albums.json'
+API_INDICATORS_URL = 'http://api.myspace.com/v1/users/%s/indicators.json'
+API_NOTIFICATIONS_URL = 'http://api.myspace.com/v1/applications/%s/notifications'
+
+INVALID_PARAM = 'Invalid Parameter Value. %s %s'
+
+"""Validators
+
+   A validator is called with the argument name and value and raises
+   MySpaceError if the value is not acceptable.
+"""
+def integer(name, value):
+    try:
+        int(value)
+    except (ValueError, TypeError):
+        raise MySpaceError(INVALID_PARAM % (name, ' must be an integer'))
+
+def non_negative(name, value):
+    if value is not None and value < 0:
+        raise MySpaceError(INVALID_PARAM % (name, ' cannot be negative'))
+
+def non_empty(name, value):
+    if value is None or len(value) == 0:
+        raise MySpaceError('%s must be set to a non-empty string' % name)
+
+def one_of(*valid_values):
+    valid = frozenset(valid_values)
+    message = 'Invalid Parameter Value. %%s must be one of %s' % str(list(valid_values))
+    def check(name, value):
+        if value is not None and value not in valid:
+            raise MySpaceError(message % name)
+    return check
+
+def combination_of(*valid_values):
+    """Value is one or more of valid_values separated by '|'."""
+    valid = frozenset(valid_values)
+    message = 'Invalid Parameter Value. %%s must be a combination of %s' % str(list(valid_values))
+    def check(name, value):
+        if value is not None:
+            for part in value.split('|'):
+                if part not in valid:
+                    raise MySpaceError(message % name)
+    return check
+
+# validators applied to these arguments wherever they appear
+COMMON_VALIDATORS = {
+    'user_id': (integer, non_negative),
+    'app_id': (integer,),
+    'page': (non_negative,),
+    'page_size': (non_negative,),
+    'album_id': (non_negative,),
+    'photo_id': (non_negative,),
+    'video_id': (non_negative,),
+    'mood': (non_negative,),
+}
+
+_MISSING = object()
+
+class Endpoint(object):
+
+    """A MySpace REST API endpoint.
+
+       name        - name of the MySpace method wrapping it
+       url         - URL template, filled in with the path arguments in order
+       path        - names of the arguments substituted into url
+       params      - request parameters: (argument name, API parameter name)
+                     pairs. Sent in the query string for GET and in the body for
+                     POST/PUT; arguments that are None are left out.
+       method      - 'GET', 'POST' or 'PUT'
+       required    - arguments besides the path ones that must be given
+       defaults    - values for arguments that are not given
+       validators  - {argument name: (validator, ...)} on top of COMMON_VALIDATORS
+       fixed       - parameters always sent with the request
+       builder     - optional callable(values) returning the request parameters,
+                     used instead of params when they can't be mapped one to one
+       raw         - return the response body instead of decoding it as JSON
+       result_key  - return only this member of the decoded response
+    """
+    def __init__(self, name, url, path=('user_id',), params=(), method='GET', required=(), defaults=None,
+                 validators=None, fixed=None, builder=None, raw=False, result_key=None):
+        self.name = name
+        self.url = url
+        self.path = tuple(path)
+        self.params = tuple(params)
+        self.method = method
+        self.required = self.path + tuple(required)
+        self.defaults = defaults or {}
+        self.fixed = fixed or {}
+        self.builder = builder
+        self.raw = raw
+        self.result_key = result_key
+        validators = validators or {}
+        # flatten the validators into (argument, validator) pairs once
+        checks = []
+        checked = set()
+        for arg in self.path + tuple([arg for arg, param in self.params]) + tuple(required):
+            if arg in checked:
+                continue
+            checked.add(arg)
+            for validator in COMMON_VALIDATORS.get(arg, ()) + tuple(validators.get(arg, ())):
+                checks.append((arg, validator))
+        self.checks = tuple(checks)
+        self.arguments = frozenset(list(checked) + self.defaults.keys() + validators.keys())
+
+    def prepare(self, values, strict=False):
+        """Validates the argument values and returns the (url, parameters) of
+           the request. With strict set, unknown arguments raise MySpaceError
+           instead of being ignored.
+        """
+        if strict:
+            unknown = [arg for arg in values if arg not in self.arguments]
+            if unknown:
+                raise MySpaceError('Invalid arguments for %s: %s' % (self.name, ', '.join(unknown)))
+        if self.defaults:
+            merged = self.defaults.copy()
+            merged.update(values)
+            values = merged
+        for arg in self.required:
+            if values.get(arg, _MISSING) is _MISSING:
+                raise MySpaceError('Missing argument for %s: %s' % (self.name, arg))
+        for arg, validator in self.checks:
+            validator(arg, values.get(arg))
+
+        url = self.path and self.url % tuple([values[arg] for arg in self.path]) or self.url
+        if self.builder is not None:
+            parameters = self.builder(values)
+        else:
+            parameters = {}
+            for arg, param in self.params:
+                value = values.get(arg)
+                if value is not None:
+                    parameters[param] = value
+        if self.fixed:
+            parameters.update(self.fixed)
+        return url, parameters
+
+"""send_notification builds its template parameters as JSON
+"""
+def recipient_list(recipients):
+    """recipients as the comma separated string expected by MySpace, given
+       either as such a string or as a sequence of user ids.
+    """
+    if isinstance(recipients, basestring):
+        return recipients
+    return ','.join([str(recipient) for recipient in recipients])
+
+def notification_template(values):
+    """The templateParameters JSON of a notification. It only depends on the
+       content and buttons, so it can be built once and sent to any number of
+       recipients.
+    """
+    template = {'content': values['content']}
+    for button in ('0', '1'):
+        label = values.get('btn%s_label' % button)
+        if label:
+            template['button%s_label' % button] = label
+            surface = values.get('btn%s_surface' % button)
+            if surface is not None:
+                template['button%s_surface' % button] = surface
+    return simplejson.dumps(template)
+
+def _notification_parameters(values):
+    params = {}
+    params['recipients'] = recipient_list(values['recipients'])
+    params['templateParameters'] = notification_template(values)
+
+    mediaitems = values.get('mediaitems')
+    if mediaitems:
+        # MySpace expects the item url as a JSON string in braces: {"http://..."}
+        params['mediaitems'] = '{' + simplejson.dumps(mediaitems) + '}'
+    return params
+
+PAGING = (('page', 'page'), ('page_size', 'page_size'))
+
+ENDPOINT_LIST = (
+    Endpoint('get_userid', API_USERINFO_URL, path=(), result_key='userId'),
+    Endpoint('get_albums', API_ALBUMS_URL, params=PAGING),
+    Endpoint('get_album', API_ALBUM_URL, path=('user_id', 'album_id')),
+    Endpoint('get_friends', API_FRIENDS_URL, params=PAGING + (('list', 'list'), ('show', 'show')),
+             validators={'list': (one_of('top', 'online', 'app'),), 'show': (combination_of('mood', 'status', 'online'),)}),
+    Endpoint('get_friendship', API_FRIENDSHIP_URL, path=('user_id', 'friend_ids')),
+    Endpoint('get_mood', API_MOOD_URL),
+    Endpoint('get_moods', API_MOODS_URL),
+    Endpoint('get_photos', API_PHOTOS_URL, params=PAGING),
+    Endpoint('get_photo', API_PHOTO_URL, path=('user_id', 'photo_id')),
+    Endpoint('get_profile', API_PROFILE_URL, params=(('type', 'detailtype'),), defaults={'type': 'full'},
+             validators={'type': (one_of('basic', 'full', 'extended'),)}),
+    Endpoint('get_profile_basic', API_PROFILE_URL, fixed={'detailtype': 'basic'}),
+    Endpoint('get_profile_full', API_PROFILE_URL, fixed={'detailtype': 'full'}),
+    Endpoint('get_profile_extended', API_PROFILE_URL, fixed={'detailtype': 'extended'}),
+    Endpoint('get_status', API_STATUS_URL),
+    Endpoint('get_videos', API_VIDEOS_URL),
+    Endpoint('get_video', API_VIDEO_URL, path=('user_id', 'video_id')),
+    Endpoint('get_activities_atom', API_ACTIVITIES_URL, raw=True),
+    Endpoint('get_friends_activities_atom', API_FRIENDSACTIVITIES_URL, raw=True),
+    # the status and mood updates return no data on success, hence raw
+    Endpoint('set_status', API_UPDATE_STATUS_URL, method='PUT', params=(('status', 'status'),), required=('status',),
+             validators={'status': (non_empty,)}, raw=True),
+    Endpoint('set_mood', API_UPDATE_MOOD_URL, method='PUT', params=(('mood', 'mood'),), required=('mood',), raw=True),
+    Endpoint('create_album', API_CREATE_ALBUM_URL, method='POST',
+             params=(('title', 'title'), ('privacy', 'privacy'), ('location', 'location')), required=('title',),
+             defaults={'privacy': 'Everyone'}, validators={'privacy': (one_of('Everyone', 'FriendsOnly', 'Me'),)}),
+    Endpoint('get_indicators', API_INDICATORS_URL),
+    Endpoint('send_notification', API_NOTIFICATIONS_URL, path=('app_id',), method='POST',
+             required=('recipients', 'content'),
+             defaults={'btn0_label': None, 'btn0_surface': None, 'btn1_label': None, 'btn1_surface': None, 'mediaitems': None},
+             validators={'recipients': (non_empty,), 'content': (non_empty,)}, builder=_notification_parameters),
+    )
+
+ENDPOINTS = dict([(endpoint.name, endpoint) for endpoint in ENDPOINT_LIST])
+ENDPOINT_NAMES = tuple([endpoint.name for endpoint in ENDPOINT_LIST])
+
+def get_endpoint(name):
+    try:
+        return ENDPOINTS[name]
+    except (KeyError, TypeError):
+        raise MySpaceError('Unknown MySpace API method: %s' % (name,))
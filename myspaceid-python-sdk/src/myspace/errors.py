@@ -0,0 +1,47 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2007, 2008 MySpace Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+__all__ = [
+    'MySpaceError',
+    'MySpaceTransportError',
+    'MySpaceTimeoutError',
+    'CircuitOpenError',
+    ]
+
+class MySpaceError(Exception):
+    def __init__(self, message, http_response=None):
+        Exception.__init__(self, message)
+        self.http_response = http_response
+
+class MySpaceTransportError(MySpaceError):
+    """The request could not be completed at the network level (connection refused,
+       reset, DNS failure...). There is no http_response; the original exception
+       is available as cause.
+    """
+    def __init__(self, message, cause=None):
+        MySpaceError.__init__(self, message)
+        self.cause = cause
+
+class MySpaceTimeoutError(MySpaceTransportError):
+    """A connect or read timeout expired, or the call ran out of time (see
+       MySpace timeout and with_deadline). cause is the socket exception if
+       there was one.
+    """
+    pass
+
+class CircuitOpenError(MySpaceError):
+    """Raised without contacting the host while its circuit breaker is open."""
+    pass
@@ -0,0 +1,246 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2007, 2008 MySpace Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Instrumentation of the MySpace client.
+
+   Pass an Observer to MySpace (observer=...) to be handed a CallRecord after
+   every API call:
+
+      stats = HistogramObserver()
+      ms = MySpace(CONSUMER_KEY, CONSUMER_SECRET, token.key, token.secret, observer=stats)
+      ...
+      print stats.snapshot()['get_profile']['total']['p99']
+
+   Without an observer the client doesn't take any timings.
+"""
+
+import math
+import threading
+
+__all__ = [
+    'CallRecord',
+    'Histogram',
+    'HistogramObserver',
+    'Observer',
+    'PHASES',
+    ]
+
+"""Phases timed for each call, in seconds:
+
+      throttle - waiting for the RequestScheduler
+      sign     - building and signing the request
+      connect  - opening the connection (PooledUrlFetcher, new connections only)
+      ttfb     - from sending the request to receiving the response headers
+                 (includes connecting for UrlFetcher)
+      read     - reading the response body
+      decode   - decoding the JSON response
+      total    - the whole call, retries and backoff included
+
+   Phases repeated by retries add up.
+"""
+PHASES = ('throttle', 'sign', 'connect', 'ttfb', 'read', 'decode', 'total')
+
+class CallRecord(object):
+
+    """What happened during one MySpace API call.
+
+       endpoint        - the endpoint name, e.g. 'get_profile'
+       status          - HTTP status of the last response, None if there was none
+       attempts        - number of requests sent, retries included
+       bytes_sent      - request body bytes
+       bytes_received  - response body bytes, as transferred
+       bytes_decoded   - response body bytes after decompression
+       cached          - True if served from the ResponseCache without a request
+       error           - the exception the call failed with, or None
+       timings         - {phase: seconds} for the phases that took place
+    """
+    __slots__ = ('endpoint', 'method', 'url', 'status', 'attempts', 'bytes_sent', 'bytes_received', 'bytes_decoded',
+                 'cached', 'error', 'timings')
+
+    def __init__(self, endpoint, method='GET', url=None):
+        self.endpoint = endpoint
+        self.method = method
+        self.url = url
+        self.status = None
+        self.attempts = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.bytes_decoded = 0
+        self.cached = False
+        self.error = None
+        self.timings = {}
+
+    def add_time(self, phase, seconds):
+        self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+
+    def add_timings(self, timings):
+        if timings:
+            for phase, seconds in timings.iteritems():
+                self.add_time(phase, seconds)
+
+    def retries(self):
+        return max(0, self.attempts - 1)
+
+    def __repr__(self):
+        return '<CallRecord %s %s status %s, %d attempts>' % (self.method, self.endpoint, self.status, self.attempts)
+
+class Observer(object):
+
+    """Base class of the MySpace observers; it ignores everything. Override
+       call_finished to receive the CallRecord of every call. It is called on
+       the thread that made the call, so it must be thread safe and quick.
+    """
+    def call_finished(self, record):
+        pass
+
+class Histogram(object):
+
+    """Histogram of positive values with logarithmic buckets.
+
+       Bucket boundaries grow by a factor of growth starting at minimum, so a
+       percentile is accurate to within (growth - 1) of its value while the
+       memory used only depends on the range of values seen.
+    """
+    def __init__(self, minimum=1e-6, growth=1.05):
+        self.minimum = minimum
+        self.growth = growth
+        self._log_growth = math.log(growth)
+        self.buckets = {}
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        if value < self.minimum:
+            bucket = 0
+        else:
+            bucket = int(math.log(value / self.minimum) / self._log_growth) + 1
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        """Upper bound of the bucket holding the given percentile, None if empty."""
+        if not self.count:
+            return None
+        rank = max(1, int(math.ceil(self.count * percent / 100.0)))
+        seen = 0
+        keys = self.buckets.keys()
+        keys.sort()
+        for bucket in keys:
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                if bucket == 0:
+                    return min(self.minimum, self.max)
+                return min(self.minimum * self.growth ** bucket, self.max)
+        return self.max
+
+    def snapshot(self, percentiles=(50, 90, 99)):
+        result = {
+            'count': self.count,
+            'mean': self.count and self.sum / self.count or 0.0,
+            'min': self.min,
+            'max': self.max,
+        }
+        for percent in percentiles:
+            result['p%s' % percent] = self.percentile(percent)
+        return result
+
+class _EndpointStats(object):
+
+    def __init__(self):
+        self.phases = {}
+        self.statuses = {}
+        self.calls = 0
+        self.errors = 0
+        self.cached = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.bytes_decoded = 0
+
+class HistogramObserver(Observer):
+
+    """Observer aggregating the calls per endpoint: a Histogram per phase,
+       counts per HTTP status, retries, errors and bytes transferred.
+    """
+    def __init__(self, percentiles=(50, 90, 99)):
+        self.percentiles = percentiles
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def call_finished(self, record):
+        self._lock.acquire()
+        try:
+            stats = self._endpoints.get(record.endpoint)
+            if stats is None:
+                stats = self._endpoints[record.endpoint] = _EndpointStats()
+            stats.calls += 1
+            stats.retries += record.retries()
+            stats.bytes_sent += record.bytes_sent
+            stats.bytes_received += record.bytes_received
+            stats.bytes_decoded += record.bytes_decoded
+            if record.error is not None:
+                stats.errors += 1
+            if record.cached:
+                stats.cached += 1
+            if record.status is not None:
+                stats.statuses[record.status] = stats.statuses.get(record.status, 0) + 1
+            for phase, seconds in record.timings.iteritems():
+                histogram = stats.phases.get(phase)
+                if histogram is None:
+                    histogram = stats.phases[phase] = Histogram()
+                histogram.add(seconds)
+        finally:
+            self._lock.release()
+
+    def snapshot(self):
+        """Returns {endpoint: {'calls', 'errors', 'cached', 'retries', 'bytes_sent',
+           'bytes_received', 'bytes_decoded', 'statuses': {status: count}, phase: histogram
+           snapshot, ...}}.
+        """
+        self._lock.acquire()
+        try:
+            result = {}
+            for endpoint, stats in self._endpoints.iteritems():
+                summary = {
+                    'calls': stats.calls,
+                    'errors': stats.errors,
+                    'cached': stats.cached,
+                    'retries': stats.retries,
+                    'bytes_sent': stats.bytes_sent,
+                    'bytes_received': stats.bytes_received,
+                    'bytes_decoded': stats.bytes_decoded,
+                    'statuses': stats.statuses.copy(),
+                }
+                for phase, histogram in stats.phases.iteritems():
+                    summary[phase] = histogram.snapshot(self.percentiles)
+                result[endpoint] = summary
+            return result
+        finally:
+            self._lock.release()
+
+    def reset(self):
+        self._lock.acquire()
+        try:
+            self._endpoints = {}
+        finally:
+            self._lock.release()
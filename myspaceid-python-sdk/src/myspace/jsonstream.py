@@ -0,0 +1,158 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2007, 2008 MySpace Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Incremental extraction of array entries from a JSON document.
+
+   MySpace list responses look like {"count": 1234, "Friends": [{...}, {...}]}.
+   iter_array_items reads such a document from a file-like object chunk by
+   chunk and yields the entries of one array as they are completed, so only
+   the entry being decoded (plus one read chunk) is held in memory.
+"""
+
+import re
+import simplejson
+
+__all__ = [
+    'TruncatedStreamError',
+    'iter_array_items',
+    ]
+
+DEFAULT_CHUNK_SIZE = 8192
+
+_STRUCTURAL = re.compile(r'["\[\]{},:]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+class TruncatedStreamError(ValueError):
+    """The stream ended before the end of the array (or of a string in it)."""
+    pass
+
+class _Scanner(object):
+
+    """Tokenizer returning the structural characters of a JSON stream.
+
+       Strings are returned as a whole so that brackets and commas inside them
+       are ignored. Everything before min(pos, mark) is dropped from the buffer
+       when more data is read; callers set mark to keep the text of the entry
+       they are collecting.
+    """
+    def __init__(self, stream, chunk_size):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.mark = None
+
+    def _fill(self):
+        data = self.stream.read(self.chunk_size)
+        if not data:
+            return False
+        keep = self.pos
+        if self.mark is not None and self.mark < keep:
+            keep = self.mark
+        self.buf = self.buf[keep:] + data
+        self.pos -= keep
+        if self.mark is not None:
+            self.mark -= keep
+        return True
+
+    def next_token(self):
+        """Returns (char, start, end) for the next structural character, or None
+           at the end of the stream. For strings char is '"' and buf[start:end]
+           is the whole string literal.
+        """
+        while True:
+            match = _STRUCTURAL.search(self.buf, self.pos)
+            if match is not None:
+                break
+            self.pos = len(self.buf)
+            if not self._fill():
+                return None
+        start = match.start()
+        ch = self.buf[start]
+        if ch != '"':
+            self.pos = start + 1
+            return ch, start, start + 1
+
+        # keep the opening quote in the buffer while looking for the closing one
+        self.pos = start
+        i = start + 1
+        while True:
+            match = _STRING_SPECIAL.search(self.buf, i)
+            if match is None or (match.group() == '\\' and match.start() + 1 >= len(self.buf)):
+                consumed = i - self.pos
+                if not self._fill():
+                    raise TruncatedStreamError('Unterminated string in JSON stream')
+                i = self.pos + consumed
+                continue
+            if match.group() == '\\':
+                i = match.start() + 2
+                continue
+            # reads may have shifted the buffer, the string still starts at pos
+            start, end = self.pos, match.end()
+            self.pos = end
+            return ch, start, end
+
+def iter_array_items(stream, key, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yields the decoded entries of the array stored under key (compared case
+       insensitively) in the top level object read from stream. Nothing is
+       yielded if the key is missing.
+    """
+    scanner = _Scanner(stream, chunk_size)
+    key = key.lower()
+    depth = 0
+    last_string = None
+
+    # find the array
+    while True:
+        token = scanner.next_token()
+        if token is None:
+            return
+        ch, start, end = token
+        if ch == '"':
+            last_string = depth == 1 and scanner.buf[start:end] or None
+            continue
+        if ch == ':':
+            continue
+        if ch == '[' and depth == 1 and last_string is not None and simplejson.loads(last_string).lower() == key:
+            break
+        if ch in '{[':
+            depth += 1
+        elif ch in '}]':
+            depth -= 1
+        last_string = None
+
+    # collect its entries, one at a time
+    scanner.mark = scanner.pos
+    nesting = 0
+    while True:
+        token = scanner.next_token()
+        if token is None:
+            raise TruncatedStreamError('Truncated JSON stream')
+        ch, start, end = token
+        if ch in '{[':
+            nesting += 1
+        elif ch in '}]':
+            if nesting == 0:
+                text = scanner.buf[scanner.mark:start].strip()
+                scanner.mark = None
+                if text:
+                    yield simplejson.loads(text)
+                return
+            nesting -= 1
+        elif ch == ',' and nesting == 0:
+            text = scanner.buf[scanner.mark:start]
+            scanner.mark = scanner.pos
+            yield simplejson.loads(text)
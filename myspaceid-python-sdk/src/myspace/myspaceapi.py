@@ -19,48 +19,58 @@ __author__ = 'cnanga@myspace.com (Chak Nanga)'
 import httplib
 import sys
 import urllib2
-import string
 import exceptions
 import simplejson
 import urlparse
 import cgi
+import socket
+import urllib
+import StringIO
+import copy
+import threading
+import time
 from oauthlib import oauth
+from myspace.connpool import ConnectionPool
+from myspace.compression import ACCEPT_ENCODING, DecodingReader, decode_body, is_compressed
+from myspace import atom
+from myspace.cache import endpoint_name
+from myspace.endpoints import ENDPOINT_NAMES, get_endpoint
+from myspace import jsonstream
+from myspace.errors import MySpaceError, MySpaceTransportError, MySpaceTimeoutError, CircuitOpenError
+from myspace.singleflight import SingleFlight
+from myspace.instrument import CallRecord
+from myspace.notifications import ChunkResult, FanoutReport, iter_recipient_chunks, DEFAULT_RECIPIENTS_PER_CALL
+from myspace.workers import ResultTimeout, WorkerPool
 
 __all__ = [
     'MySpace',
+    'AsyncMySpace',
+    'MySpaceApp',
     'MySpaceError',
+    'MySpaceTransportError',
+    'MySpaceTimeoutError',
+    'CircuitOpenError',
+    'UrlFetcher',
+    'PooledUrlFetcher',
     ]
 
 OAUTH_REQUEST_TOKEN_URL = 'http://api.myspace.com/request_token'
 OAUTH_AUTHORIZATION_URL = 'http://api.myspace.com/authorize'
 OAUTH_ACCESS_TOKEN_URL  = 'http://api.myspace.com/access_token'
 
-API_USERINFO_URL   = 'http://api.myspace.com/v1/user.json'
-API_ALBUMS_URL     = 'http://api.myspace.com/v1/users/%s/albums.json'
-API_ALBUM_URL      = 'http://api.myspace.com/v1/users/%s/albums/%s/photos.json'
-API_FRIENDS_URL    = 'http://api.myspace.com/v1/users/%s/friends.json'
-API_FRIENDSHIP_URL = 'http://api.myspace.com/v1/users/%s/friends/%s.json'
-API_MOOD_URL       = 'http://api.myspace.com/v1/users/%s/mood.json'
-API_MOODS_URL      = 'http://api.myspace.com/v1/users/%s/moods.json'
-API_PHOTOS_URL     = 'http://api.myspace.com/v1/users/%s/photos.json'
-API_PHOTO_URL      = 'http://api.myspace.com/v1/users/%s/photos/%s.json'
-API_PROFILE_URL    = 'http://api.myspace.com/v1/users/%s/profile.json'
-API_STATUS_URL     = 'http://api.myspace.com/v1/users/%s/status.json'
-API_VIDEOS_URL     = 'http://api.myspace.com/v1/users/%s/videos.json'
-API_VIDEO_URL      = 'http://api.myspace.com/v1/users/%s/videos/%s.json'
-API_ACTIVITIES_URL = "http://api.myspace.com/v1/users/%s/activities.atom"
-API_FRIENDSACTIVITIES_URL = "http://api.myspace.com/v1/users/%s/friends/activities.atom"
-API_UPDATE_STATUS_URL = "http://api.myspace.com/v1/users/%s/status";
-API_UPDATE_MOOD_URL   = "http://api.myspace.com/v1/users/%s/mood";
-API_CREATE_ALBUM_URL = 'http://api.myspace.com/v1/users/%s/albums.json'
-API_INDICATORS_URL = 'http://api.myspace.com/v1/users/%s/indicators.json'
-API_NOTIFICATIONS_URL = 'http://api.myspace.com/v1/applications/%s/notifications'
-
-class MySpaceError(Exception):
-    def __init__(self, message, http_response=None):
-        Exception.__init__(self, message)
-        self.http_response = http_response
-    
+# the REST API URLs are declared in myspace.endpoints, imported here for compatibility
+from myspace.endpoints import API_USERINFO_URL, API_ALBUMS_URL, API_ALBUM_URL, API_FRIENDS_URL, \
+     API_FRIENDSHIP_URL, API_MOOD_URL, API_MOODS_URL, API_PHOTOS_URL, API_PHOTO_URL, API_PROFILE_URL, \
+     API_STATUS_URL, API_VIDEOS_URL, API_VIDEO_URL, API_ACTIVITIES_URL, API_FRIENDSACTIVITIES_URL, \
+     API_UPDATE_STATUS_URL, API_UPDATE_MOOD_URL, API_CREATE_ALBUM_URL, API_INDICATORS_URL, API_NOTIFICATIONS_URL
+
+# where the oauth parameters of REST API requests are sent
+AUTH_QUERY = 'query'
+AUTH_HEADER = 'header'
+
+DEFAULT_BATCH_WORKERS = 8
+DEFAULT_ITER_PAGE_SIZE = 100
+
 class MySpace():
 
     """Constructor can be invoked with or without the oauth token key/secret.
@@ -71,15 +81,101 @@ class MySpace():
           
        Invoke it with the token for:
           - MySpace ID application calls
+
+       url_fetcher can be used to inject the HTTP fetcher. Pass the same
+       PooledUrlFetcher to every MySpace instance (one per user token) to
+       share its keep-alive connections between them.
+
+       cache is an optional myspace.cache.ResponseCache for GET responses, and
+       scheduler an optional myspace.ratelimit.RequestScheduler that throttles
+       the requests sent. retry_policy (myspace.retry.RetryPolicy) and
+       circuit_breaker (myspace.retry.CircuitBreaker) control how failed
+       requests are retried; without them errors are raised right away.
+
+       auth_mode selects where the oauth parameters of REST API calls go:
+       AUTH_QUERY (the default) sends them in the query string, AUTH_HEADER in
+       an Authorization header.
+
+       Identical GET calls made concurrently from several threads are sent only
+       once and all the callers get the same response (or error). The response
+       objects are shared between those callers and must not be modified. A
+       caller whose shared call timed out because of another caller's limits
+       sends the request again itself, within its own. Pass a
+       myspace.singleflight.SingleFlight as single_flight to coalesce calls
+       across MySpace instances, or False to turn this off.
+
+       observer is an optional myspace.instrument.Observer (e.g. a
+       HistogramObserver) called with the timings, status and size of every
+       call.
+
+       connect_timeout and read_timeout (seconds) bound opening a connection
+       and every read from it; timeout bounds each call as a whole, retries,
+       backoff and rate limit waits included. A call running out of time raises
+       MySpaceTimeoutError. By default there is no limit. With any of them set
+       the url_fetcher must accept connect_timeout/read_timeout keyword
+       arguments, as UrlFetcher and PooledUrlFetcher do.
     """
-    def __init__(self, consumer_key, consumer_secret, oauth_token_key=None, oauth_token_secret=None):
+    def __init__(self, consumer_key, consumer_secret, oauth_token_key=None, oauth_token_secret=None, url_fetcher=None, cache=None, scheduler=None,
+                 retry_policy=None, circuit_breaker=None, auth_mode=AUTH_QUERY, single_flight=True,
+                 observer=None, timeout=None, connect_timeout=None, read_timeout=None):
+      if auth_mode not in (AUTH_QUERY, AUTH_HEADER):
+          raise ValueError('auth_mode must be %r or %r' % (AUTH_QUERY, AUTH_HEADER))
       self.consumer = oauth.OAuthConsumer(consumer_key, consumer_secret)
       self.signature_method = oauth.OAuthSignatureMethod_HMAC_SHA1()
       if oauth_token_key and oauth_token_secret:
           self.token = oauth.OAuthConsumer(oauth_token_key, oauth_token_secret)
       else:
           self.token = None          
-      self.url_fetcher = UrlFetcher()
+      self.url_fetcher = url_fetcher or UrlFetcher()
+      self.cache = cache
+      self.scheduler = scheduler
+      self.retry_policy = retry_policy
+      self.circuit_breaker = circuit_breaker
+      self.auth_mode = auth_mode
+      if single_flight is True:
+          single_flight = SingleFlight()
+      self.single_flight = single_flight or None
+      self.observer = observer
+      self.timeout = timeout
+      self.connect_timeout = connect_timeout
+      self.read_timeout = read_timeout
+      # absolute time.time() by which every call must be done, see with_deadline
+      self.deadline = None
+
+    """Timeouts
+
+        with_timeouts and with_deadline return views of the client sharing
+        everything but their limits, for single calls or groups of calls:
+
+        profile = ms.with_timeouts(timeout=2).get_profile(user_id)
+
+        bounded = ms.with_deadline(30)
+        for friend in bounded.iter_friends(user_id):
+            ...
+    """
+    def with_timeouts(self, timeout=None, connect_timeout=None, read_timeout=None):
+        """A view of this client with the given limits instead of its own; the
+           ones left to None are kept.
+        """
+        view = copy.copy(self)
+        if timeout is not None:
+            view.timeout = timeout
+        if connect_timeout is not None:
+            view.connect_timeout = connect_timeout
+        if read_timeout is not None:
+            view.read_timeout = read_timeout
+        return view
+
+    def with_deadline(self, seconds):
+        """A view of this client whose calls must all be done within seconds
+           from now. Calls started or still running after that raise
+           MySpaceTimeoutError. An earlier deadline of this client is kept.
+        """
+        view = copy.copy(self)
+        deadline = time.time() + seconds
+        if self.deadline is None or deadline < self.deadline:
+            view.deadline = deadline
+        return view
 
     """OAuth Related functions 
     """  
@@ -101,179 +197,82 @@ class MySpace():
         return token
 
     """MySpace REST API wrapper functions 
+
+       The URLs, parameters and validation rules of the endpoints are declared
+       in myspace.endpoints
     """  
     def get_userid(self):
-        user_info = self.__call_myspace_api(API_USERINFO_URL)
-        return user_info['userId']
+        return self.__call_endpoint('get_userid', {})
 
     def get_albums(self, user_id, page=None, page_size=None):
-        self.__validate_params(locals())
-        albums_request_url = API_ALBUMS_URL % user_id
-        #set up extra params, if any
-        params = {}
-        if page is not None:
-            params['page'] = page
-        if page_size is not None:
-            params['page_size'] = page_size
-        return self.__call_myspace_api(albums_request_url, parameters=params)
+        return self.__call_endpoint('get_albums', {'user_id': user_id, 'page': page, 'page_size': page_size})
     
     def get_album(self, user_id, album_id):
-        self.__validate_params(locals())
-        album_request_url = API_ALBUM_URL % (user_id, album_id)
-        return self.__call_myspace_api(album_request_url)
+        return self.__call_endpoint('get_album', {'user_id': user_id, 'album_id': album_id})
     
     def get_friends(self, user_id, page=None, page_size=None, list=None, show=None):
-        # validate common parameters
-        self.__validate_params(locals())
-        #validate the list param - it can be one of 'top', 'online' or 'app'
-        valid_list_values = ['top', 'online', 'app']
-        if list is not None:
-            if list not in valid_list_values:
-                raise MySpaceError('Invalid Parameter Value. list must be one of %s' % str(valid_list_values))
-                return
-        #validate show parameter. show can be a combination of 'mood', 'status', 'online' separated by '|'
-        valid_show_values = ['mood', 'status', 'online']
-        if show is not None:
-            given_show = string.split(show, '|')
-            for s in given_show:
-                if s not in valid_show_values:
-                    raise MySpaceError('Invalid Parameter Value. show must be a combination of %s' % str(valid_show_values))
-                    return
-        # Proceed to making the request
-        friends_request_url = API_FRIENDS_URL % user_id       
-        #set up extra params, if any
-        params = {}
-        if page is not None:
-            params['page'] = page
-        if page_size is not None:
-            params['page_size'] = page_size
-        if list is not None:
-            params['list'] = list
-        if show is not None:
-            params['show'] = show             
-        return self.__call_myspace_api(friends_request_url, parameters=params)
+        """list can be one of 'top', 'online' or 'app'; show a combination of 'mood',
+           'status' and 'online' separated by '|'
+        """
+        return self.__call_endpoint('get_friends', {'user_id': user_id, 'page': page, 'page_size': page_size,
+                                                    'list': list, 'show': show})
 
     def get_friendship(self, user_id, friend_ids):
-        self.__validate_params(locals())
-        friendship_request_url = API_FRIENDSHIP_URL % (user_id, friend_ids)
-        return self.__call_myspace_api(friendship_request_url)
+        return self.__call_endpoint('get_friendship', {'user_id': user_id, 'friend_ids': friend_ids})
 
     def get_mood(self, user_id):
-        self.__validate_params(locals())
-        mood_request_url = API_MOOD_URL % user_id
-        return self.__call_myspace_api(mood_request_url)
+        return self.__call_endpoint('get_mood', {'user_id': user_id})
 
     def get_moods(self, user_id):
-        self.__validate_params(locals())
-        moods_request_url = API_MOODS_URL % user_id
-        return self.__call_myspace_api(moods_request_url)
+        return self.__call_endpoint('get_moods', {'user_id': user_id})
 
     def get_photos(self, user_id, page=None, page_size=None):
-        self.__validate_params(locals())
-        photos_request_url = API_PHOTOS_URL % user_id       
-        #set up extra params, if any
-        params = {}
-        if page is not None:
-            params['page'] = page
-        if page_size is not None:
-            params['page_size'] = page_size            
-        return self.__call_myspace_api(photos_request_url, parameters=params)
+        return self.__call_endpoint('get_photos', {'user_id': user_id, 'page': page, 'page_size': page_size})
 
     def get_photo(self, user_id, photo_id):
-        self.__validate_params(locals())
-        photo_request_url = API_PHOTO_URL % (user_id, photo_id)
-        return self.__call_myspace_api(photo_request_url)
+        return self.__call_endpoint('get_photo', {'user_id': user_id, 'photo_id': photo_id})
     
     def get_profile(self, user_id, type='full'):        
-        self.__validate_params(locals())
-        #validate the type param - it can be one of 'basic', 'full' or 'extended'
-        valid_type_values = ['basic', 'full', 'extended']
-        if type is not None:
-            if type not in valid_type_values:
-                raise MySpaceError('Invalid Parameter Value. list must be one of %s' % str(valid_list_values))
-                return
-     
-        params = {}
-        params['detailtype'] = type
-        
-        profile_request_url = API_PROFILE_URL % user_id
-        return self.__call_myspace_api(profile_request_url, parameters=params)
+        """type can be one of 'basic', 'full' or 'extended'"""
+        return self.__call_endpoint('get_profile', {'user_id': user_id, 'type': type})
 
     def get_profile_basic(self, user_id):
-        return self.get_profile(user_id, type='basic')
+        return self.__call_endpoint('get_profile_basic', {'user_id': user_id})
 
     def get_profile_full(self, user_id):
-        return self.get_profile(user_id, type='full')
+        return self.__call_endpoint('get_profile_full', {'user_id': user_id})
 
     def get_profile_extended(self, user_id):
-        return self.get_profile(user_id, type='extended')
+        return self.__call_endpoint('get_profile_extended', {'user_id': user_id})
     
     def get_status(self, user_id):
-        self.__validate_params(locals())
-        status_request_url = API_STATUS_URL % user_id
-        return self.__call_myspace_api(status_request_url)
+        return self.__call_endpoint('get_status', {'user_id': user_id})
 
     def get_videos(self, user_id):
-        self.__validate_params(locals())
-        videos_request_url = API_VIDEOS_URL % user_id
-        return self.__call_myspace_api(videos_request_url)
+        return self.__call_endpoint('get_videos', {'user_id': user_id})
 
     def get_video(self, user_id, video_id):
-        self.__validate_params(locals())
-        video_request_url = API_VIDEO_URL % (user_id, video_id)
-        return self.__call_myspace_api(video_request_url)
+        return self.__call_endpoint('get_video', {'user_id': user_id, 'video_id': video_id})
 
     def get_activities_atom(self, user_id):
-        self.__validate_params(locals())
-        activities_request_url = API_ACTIVITIES_URL % user_id
-        return self.__call_myspace_api(activities_request_url, get_raw_response=True)
+        return self.__call_endpoint('get_activities_atom', {'user_id': user_id})
 
     def get_friends_activities_atom(self, user_id):
-        self.__validate_params(locals())
-        activities_request_url = API_FRIENDSACTIVITIES_URL % user_id
-        return self.__call_myspace_api(activities_request_url, get_raw_response=True)
+        return self.__call_endpoint('get_friends_activities_atom', {'user_id': user_id})
 
     def set_status(self, user_id, status):
-        self.__validate_params(locals())
-        if len(status) == 0:
-            raise MySpaceError('status must be set to a non-empty string')
-            return
-        params = {}
-        params['status'] = status
-        update_status_url = API_UPDATE_STATUS_URL % user_id
-        # setting get_raw_status=True since the REST API does not return any data on success
-        return self.__call_myspace_api(update_status_url, method='PUT', parameters=params, get_raw_response=True)
+        return self.__call_endpoint('set_status', {'user_id': user_id, 'status': status})
 
     def set_mood(self, user_id, mood):
-        self.__validate_params(locals())
-        params = {}
-        params['mood'] = mood
-        update_mood_url = API_UPDATE_MOOD_URL % user_id
-        # setting get_raw_status=True since the REST API does not return any data on success
-        return self.__call_myspace_api(update_mood_url, method='PUT', parameters=params, get_raw_response=True)
+        return self.__call_endpoint('set_mood', {'user_id': user_id, 'mood': mood})
 
     def create_album(self, user_id, title, location=None, privacy='Everyone'):
-        self.__validate_params(locals())
-        #validate the privacy param - it can be one of 'Everyone', 'FriendsOnly' or 'Me'
-        valid_privacy_values = ['Everyone', 'FriendsOnly', 'Me']
-        if privacy is not None:
-            if privacy not in valid_privacy_values:
-                raise MySpaceError('Invalid Parameter Value. list must be one of %s' % str(valid_privacy_values))
-                return
-        album_create_url = API_CREATE_ALBUM_URL % user_id
-        # set up album location, title etc.
-        params = {}
-        params['title'] = title
-        if privacy is not None:
-            params['privacy'] = privacy
-        if location is not None:
-            params['location'] = location
-        return self.__call_myspace_api(album_create_url, method='POST', parameters=params)
+        """privacy can be one of 'Everyone', 'FriendsOnly' or 'Me'"""
+        return self.__call_endpoint('create_album', {'user_id': user_id, 'title': title, 'location': location,
+                                                     'privacy': privacy})
 
     def get_indicators(self, user_id):
-        self.__validate_params(locals())
-        get_indicators_url = API_INDICATORS_URL % user_id
-        return self.__call_myspace_api(get_indicators_url)
+        return self.__call_endpoint('get_indicators', {'user_id': user_id})
 
     """
         send_notification Usage:
@@ -285,125 +284,905 @@ class MySpace():
                                                  mediaitems="http://api.myspace.com/v1/users/296768296")  
     """
     def send_notification(self, app_id, recipients, content, btn0_label=None, btn0_surface=None, btn1_label=None, btn1_surface=None, mediaitems=None):
-        self.__validate_params(locals())
-        if len(recipients) == 0:
-           raise MySpaceError('recipients must be set to a non-empty string')
-           return
-        if len(content) == 0:
-           raise MySpaceError('content must be set to a non-empty string')
-           return
-
-        params = {}
-        params['recipients'] = recipients
-
-        templateParameters = '{"content":"' + content + '"'
-        if btn0_label is not None:
-          if len(btn0_label) != 0:
-             templateParameters += ',"button0_label":"' + btn0_label + '"' + ',"button0_surface":"' + btn0_surface + '"'
-        if btn1_label is not None:
-          if len(btn1_label) != 0:
-             templateParameters += ',"button1_label":"' + btn1_label + '"' + ',"button1_surface":"' + btn1_surface + '"'
-        templateParameters += '}'
-        params['templateParameters'] = templateParameters
-
-        if mediaitems is not None:
-          if len(mediaitems) != 0:
-             params['mediaitems'] = '{"' + mediaitems + '"}'     
+        return self.__call_endpoint('send_notification', {'app_id': app_id, 'recipients': recipients, 'content': content,
+                                                          'btn0_label': btn0_label, 'btn0_surface': btn0_surface,
+                                                          'btn1_label': btn1_label, 'btn1_surface': btn1_surface,
+                                                          'mediaitems': mediaitems})
+
+    def call(self, name, **kwargs):
+        """Calls the endpoint registered as name in myspace.endpoints with keyword
+           arguments, e.g. ms.call('get_profile', user_id=user_id, type='basic')
+        """
+        return self.__call_endpoint(name, kwargs, strict=True)
+
+    def call_url(self, api_url, method='GET', parameters=None, raw=False):
+        """Signs and sends a request to any MySpace API url, e.g. one not declared
+           in myspace.endpoints. Returns the decoded JSON response, or the
+           response body with raw set.
+        """
+        if method not in ('GET', 'POST', 'PUT'):
+            raise MySpaceError('Unsupported HTTP method: %s' % method)
+        return self.__call_myspace_api(api_url, method, parameters or {}, get_raw_response=raw)
+
+    """Paging iterators
+    
+        Usage:
         
-        send_notification_url = API_NOTIFICATIONS_URL % app_id
-        return self.__call_myspace_api(send_notification_url, method='POST', parameters=params)      
+        for friend in ms.iter_friends(user_id):
+            ...
+
+        With timeout set, all the pages must be fetched within timeout seconds
+        of the start of the iteration.
+    """
+    def iter_albums(self, user_id, page_size=DEFAULT_ITER_PAGE_SIZE, prefetch=True, worker_pool=None, timeout=None):
+        return self.__iter_pages('albums', 'get_albums', (user_id,), {}, page_size, prefetch, worker_pool, timeout)
+
+    def iter_friends(self, user_id, page_size=DEFAULT_ITER_PAGE_SIZE, list=None, show=None, prefetch=True, worker_pool=None,
+                     timeout=None):
+        kwargs = {'list': list, 'show': show}
+        return self.__iter_pages('friends', 'get_friends', (user_id,), kwargs, page_size, prefetch, worker_pool, timeout)
+
+    def iter_photos(self, user_id, page_size=DEFAULT_ITER_PAGE_SIZE, prefetch=True, worker_pool=None, timeout=None):
+        return self.__iter_pages('photos', 'get_photos', (user_id,), {}, page_size, prefetch, worker_pool, timeout)
+
+    def __iter_pages(self, items_key, method_name, args, kwargs, page_size, prefetch, worker_pool, timeout):
+        """Generator yielding the entries of a paged API one at a time.
+
+           Pages are fetched lazily; with prefetch on, page N+1 is requested on a
+           background worker while the caller consumes page N, so at most two pages
+           are held in memory. With prefetch off, page N+1 is only requested once
+           the caller asks for the item after the last one of page N.
+
+           Iteration stops once the server reported "count" has been reached, or
+           at the first empty or short page if it reports none.
+        """
+        client = self
+        if timeout is not None:
+            client = self.with_deadline(timeout)
+        get_page = getattr(client, method_name)
+        if prefetch:
+            pool = worker_pool or WorkerPool(1)
+            fetch = lambda page: pool.submit(get_page, page=page, page_size=page_size, *args, **kwargs)
+        else:
+            pool = None
+            fetch = lambda page: _DeferredCall(get_page, page=page, page_size=page_size, *args, **kwargs)
+        try:
+            page = 1
+            pending = fetch(page)
+            seen = 0
+            while pending is not None:
+                response = pending.get()
+                items = _get_page_items(response, items_key)
+                seen += len(items)
+                total = response.get('count')
+                if total is not None:
+                    more = len(items) > 0 and seen < int(total)
+                else:
+                    more = len(items) >= page_size
+                if more:
+                    page += 1
+                    pending = fetch(page)
+                else:
+                    pending = None
+                for item in items:
+                    yield item
+                # drop the reference so only the prefetched page stays alive
+                items = response = None
+        finally:
+            if pool is not None and worker_pool is None:
+                pool.shutdown(wait=False)
+
+    """Streaming variants
     
-    """Miscellaneous utility functions 
+        These yield entries one at a time while the response is read from the
+        socket, so memory use is bounded by one entry instead of the whole page
+        or feed. stream_friends/stream_photos take the same parameters as
+        get_friends/get_photos.
+
+        iter_activities/iter_friends_activities parse the Atom feeds returned by
+        get_activities_atom/get_friends_activities_atom into ActivityEntry objects.
+        Pass the id (since_id) or updated date (since_updated) of the newest entry
+        handled by the previous poll to stop at the entries already seen:
+
+        for entry in ms.iter_friends_activities(user_id, since_id=last_seen_id):
+            ...
     """
-    def __validate_params(self, params):
-        invalid_param = 'Invalid Parameter Value. %s %s'
-        # Non empty/None param check
-        non_empty_params = ['user_id', 'app_id']
-        for param, value in params.items():
-            if param in non_empty_params:
-                try:
-                    user_id = int(value)
-                except (ValueError, TypeError):
-                    message =  invalid_param % (param, ' must be an integer')
-                    raise MySpaceError(message)
-                    return
-        #Non-negative param check
-        positive_params = ['page', 'page_size', 'user_id', 'video_id', 'photo_id', 'album_id', 'mood']
-        for param, value in params.items():
-            if param in positive_params and value is not None:
-                if value < 0:
-                    message = invalid_param % (param, ' cannot be negative')
-                    raise MySpaceError(message)
-                    return
+    def stream_friends(self, user_id, page=None, page_size=None, list=None, show=None):
+        request = self.__prepare('get_friends', {'user_id': user_id, 'page': page, 'page_size': page_size, 'list': list, 'show': show})
+        return self.__stream_items(request, 'friends')
+
+    def stream_photos(self, user_id, page=None, page_size=None):
+        request = self.__prepare('get_photos', {'user_id': user_id, 'page': page, 'page_size': page_size})
+        return self.__stream_items(request, 'photos')
+
+    def iter_activities(self, user_id, since_id=None, since_updated=None):
+        request = self.__prepare('get_activities_atom', {'user_id': user_id})
+        return self.__stream_activities(request, since_id, since_updated)
+
+    def iter_friends_activities(self, user_id, since_id=None, since_updated=None):
+        request = self.__prepare('get_friends_activities_atom', {'user_id': user_id})
+        return self.__stream_activities(request, since_id, since_updated)
+
+    def __stream_items(self, request, items_key):
+        def parse_stream(resp):
+            for item in jsonstream.iter_array_items(resp, items_key):
+                yield item
+            # drain the end of the document so that a pooled connection can be reused
+            while resp.read(jsonstream.DEFAULT_CHUNK_SIZE):
+                pass
+        return self.__stream_api_request(request, parse_stream, lambda value: _get_page_items(value, items_key))
+
+    def __stream_activities(self, request, since_id, since_updated):
+        def parse_stream(resp):
+            return atom.iter_entries(resp, since_id, since_updated)
+        def parse_cached(raw):
+            return atom.iter_entries(StringIO.StringIO(raw), since_id, since_updated)
+        return self.__stream_api_request(request, parse_stream, parse_cached)
+
+    def __stream_api_request(self, request, parse_stream, parse_cached):
+        """Generator sending request and yielding the items parse_stream(response)
+           reads off the streaming response. Responses served from the cache are
+           parsed with parse_cached(value) instead.
+        """
+        record = None
+        if self.observer is not None:
+            record = self.__start_record(request)
+            started = time.time() - request.sign_time
+        try:
+            for item in self.__stream_response(request, parse_stream, parse_cached, record, self.__call_deadline()):
+                yield item
+        except GeneratorExit:
+            # the caller stopped iterating, not an error
+            raise
+        except:
+            if record is not None:
+                record.error = sys.exc_info()[1]
+            raise
+        finally:
+            if record is not None:
+                self.__record_call(record, started)
+
+    def __stream_response(self, request, parse_stream, parse_cached, record, deadline):
+        cache_entry = request.cache_entry
+        if cache_entry is not None and cache_entry.is_fresh():
+            if record is not None:
+                record.cached = True
+            for item in parse_cached(cache_entry.value):
+                yield item
+            return
+        resp = self.__fetch(request.url, request.api_url, headers=request.headers, stream=True, record=record,
+                            deadline=deadline)
+        try:
+            if resp.status == 304 and cache_entry is not None:
+                entry = self.cache.revalidated(request.cache_key, request.api_url, cache_entry, resp.headers)
+                for item in parse_cached(entry.value):
+                    yield item
+                return
+            if resp.status > 201:
+                resp.body = resp.read()
+                raise MySpaceError('MySpace REST API returned an error', resp)
+            try:
+                for item in parse_stream(resp):
+                    if deadline is not None and time.time() > deadline:
+                        raise MySpaceTimeoutError('MySpace API call deadline exceeded while streaming the response')
+                    yield item
+            except (socket.error, httplib.HTTPException, jsonstream.TruncatedStreamError), why:
+                # the connection failed after the headers, report it like __fetch does
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.record_failure(request.url)
+                if _is_timeout(why):
+                    raise MySpaceTimeoutError('MySpace API request timed out: %s' % why, why)
+                raise MySpaceTransportError('MySpace API response could not be read: %s' % why, why)
+            except (ValueError, atom.ParseError), why:
+                # a malformed entry or feed, reported like a buffered response that can't be decoded
+                raise MySpaceError('MySpace REST API returned an invalid response: %s' % why, resp)
+        finally:
+            resp.close()
+            if record is not None:
+                record.bytes_received += resp.wire_bytes
+                record.bytes_decoded += resp.decoded_bytes
+
+    """Batch execution
+    
+        fetch_many Usage:
         
+        ms = MySpace(ckeynsecret.CONSUMER_KEY, ckeynsecret.CONSUMER_SECRET, token.key, token.secret)
+        profile, status, mood = ms.fetch_many([('get_profile', {'user_id': user_id}),
+                                               ('get_status', {'user_id': user_id}),
+                                               ('get_mood', {'user_id': user_id})])
+    """
+    def fetch_many(self, specs, max_workers=DEFAULT_BATCH_WORKERS, worker_pool=None, timeout=None):
+        """Runs a list of (method name, kwargs) calls concurrently.
+
+           All requests are validated and signed up front, then sent on a bounded
+           pool of max_workers threads (or on worker_pool if one is given). The
+           return value has one entry per spec, in input order: the API response,
+           or the MySpaceError instance the call failed with. With timeout set the
+           calls not done within timeout seconds fail with MySpaceTimeoutError.
+        """
+        client = self
+        if timeout is not None:
+            client = self.with_deadline(timeout)
+        results = [None] * len(specs)
+        pending = []
+        calls = []
+        for i, spec in enumerate(specs):
+            name, kwargs = spec
+            try:
+                endpoint = get_endpoint(name)
+                url, parameters = endpoint.prepare(kwargs or {}, strict=True)
+            except MySpaceError, e:
+                results[i] = e
+                continue
+            pending.append(i)
+            calls.append((endpoint, url, parameters))
+        if not pending:
+            return results
+        for i, request in zip(pending, self.__build_endpoint_requests(calls)):
+            results[i] = request
+
+        pool = worker_pool or WorkerPool(min(max_workers, len(pending)))
+        try:
+            async_results = [(i, pool.submit(client.__execute_api_request, results[i])) for i in pending]
+            for i, async_result in async_results:
+                try:
+                    results[i] = async_result.get()
+                except MySpaceError, e:
+                    results[i] = e
+                except Exception, e:
+                    results[i] = MySpaceError('MySpace REST API request failed: %s' % e)
+        finally:
+            if worker_pool is None:
+                pool.shutdown(wait=False)
+        return results
+
+    def send_notifications(self, app_id, recipients, content, btn0_label=None, btn0_surface=None, btn1_label=None,
+                           btn1_surface=None, mediaitems=None, chunk_size=DEFAULT_RECIPIENTS_PER_CALL,
+                           max_workers=DEFAULT_BATCH_WORKERS, worker_pool=None, timeout=None):
+        """Sends a notification to any number of recipients.
+
+           recipients is an iterable of user ids; it is consumed lazily and split
+           into send_notification calls of at most chunk_size recipients each.
+           The notification is validated and its template built once, then the
+           calls are sent on max_workers threads (or on worker_pool), with at most
+           twice that many chunks in flight. They go through the scheduler like
+           any other call, so a RequestScheduler limit on the 'notifications'
+           family throttles the fan-out.
+
+           Returns a myspace.notifications.FanoutReport holding the outcome of
+           every chunk; failed chunks do not stop the others. With timeout set
+           the chunks not sent within timeout seconds fail with
+           MySpaceTimeoutError.
+        """
+        client = self
+        if timeout is not None:
+            client = self.with_deadline(timeout)
+        chunks = iter_recipient_chunks(recipients, chunk_size)
+        report = FanoutReport()
+        try:
+            first = chunks.next()
+        except StopIteration:
+            return report
+        endpoint = get_endpoint('send_notification')
+        api_url, parameters = endpoint.prepare({'app_id': app_id, 'recipients': first, 'content': content,
+                                                'btn0_label': btn0_label, 'btn0_surface': btn0_surface,
+                                                'btn1_label': btn1_label, 'btn1_surface': btn1_surface,
+                                                'mediaitems': mediaitems})
+
+        pool = worker_pool or WorkerPool(max_workers)
+        window = max(1, max_workers * 2)
+        in_flight = []
+        def collect(index, recipients, async_result):
+            try:
+                report.add(ChunkResult(index, recipients, response=async_result.get()))
+            except MySpaceError, e:
+                report.add(ChunkResult(index, recipients, error=e))
+            except Exception, e:
+                report.add(ChunkResult(index, recipients, error=MySpaceError('MySpace REST API request failed: %s' % e)))
+        try:
+            index = 0
+            chunk = first
+            while chunk is not None:
+                chunk_parameters = parameters.copy()
+                chunk_parameters['recipients'] = ','.join(chunk)
+                in_flight.append((index, chunk, pool.submit(client.__send_notification_chunk, api_url, endpoint,
+                                                              chunk_parameters)))
+                if len(in_flight) >= window:
+                    collect(*in_flight.pop(0))
+                index += 1
+                try:
+                    chunk = chunks.next()
+                except StopIteration:
+                    chunk = None
+            while in_flight:
+                collect(*in_flight.pop(0))
+        finally:
+            if worker_pool is None:
+                pool.shutdown(wait=False)
+        return report
+
+    """Miscellaneous utility functions 
+    """
     def __call_oauth_api(self, oauth_url, token=None, debug=False):
-        oauth_request = oauth.OAuthRequest.from_consumer_and_token(
-            self.consumer, token=token, http_url=oauth_url
-        )
-        oauth_request.sign_request(self.signature_method, self.consumer, token)
-        resp = self.url_fetcher.fetch(oauth_request.to_url())
-        if resp.status != 200:
-            raise MySpaceError('MySpace OAuth API returned an error', resp)
-        return resp.body 
+        record = None
+        if self.observer is not None:
+            record = CallRecord('oauth/' + oauth_url.split('/')[-1], 'GET', oauth_url)
+            started = time.time()
+        deadline = self.__call_deadline()
+        attempt = 1
+        try:
+            while True:
+                # (re)sign on every attempt so that each one gets a fresh nonce and timestamp
+                if record is not None:
+                    signing = time.time()
+                oauth_request = oauth.OAuthRequest.from_consumer_and_token(
+                    self.consumer, token=token, http_url=oauth_url
+                )
+                oauth_request.sign_request(self.signature_method, self.consumer, token)
+                request_url = oauth_request.to_url()
+                if record is not None:
+                    record.add_time('sign', time.time() - signing)
+                try:
+                    resp = self.__fetch(request_url, oauth_url, record=record, deadline=deadline)
+                    if resp.status != 200:
+                        raise MySpaceError('MySpace OAuth API returned an error', resp)
+                    return resp.body 
+                except MySpaceError, e:
+                    if not self.__wait_for_retry('GET', attempt, e, deadline):
+                        raise
+                    attempt += 1
+        except:
+            if record is not None:
+                record.error = sys.exc_info()[1]
+            raise
+        finally:
+            if record is not None:
+                self.__record_call(record, started)
       
+    def __call_endpoint(self, name, values, strict=False):
+        endpoint = get_endpoint(name)
+        url, parameters = endpoint.prepare(values, strict)
+        if self.single_flight is not None and endpoint.method == 'GET':
+            # identical concurrent GETs share one signed request, fetch and decode
+            key = (endpoint.name, url, tuple(sorted(parameters.items())), self.consumer.key, self.token and self.token.key)
+            deadline = self.__call_deadline()
+            sent = []
+            def send():
+                sent.append(True)
+                return self.__send_endpoint_call(endpoint, url, parameters)
+            try:
+                if deadline is None:
+                    return self.single_flight.do(key, send)
+                # don't wait for another caller's request past our own deadline
+                return self.single_flight.do_within(max(0, deadline - time.time()), key, send)
+            except ResultTimeout:
+                raise MySpaceTimeoutError('MySpace API call deadline exceeded')
+            except MySpaceTimeoutError:
+                # another caller's request ran out of its time, not necessarily of ours
+                if sent or (deadline is not None and time.time() >= deadline):
+                    raise
+        return self.__send_endpoint_call(endpoint, url, parameters)
+
+    def __send_endpoint_call(self, endpoint, url, parameters):
+        return self.__execute_api_request(self.__build_endpoint_request(endpoint, url, parameters))
+
+    def __prepare(self, name, values, strict=False):
+        """Validates and signs a call to the endpoint called name, without sending it."""
+        endpoint = get_endpoint(name)
+        url, parameters = endpoint.prepare(values, strict)
+        return self.__build_endpoint_request(endpoint, url, parameters)
+
+    def __build_endpoint_request(self, endpoint, url, parameters):
+        request = self.__build_api_request(url, endpoint.method, parameters, endpoint.raw)
+        request.endpoint = endpoint.name
+        request.result_key = endpoint.result_key
+        return request
+
+    def __build_endpoint_requests(self, calls):
+        """Signs a list of (endpoint, url, parameters) calls at once with
+           oauth.sign_requests. With a cache they are built one by one instead,
+           so that the ones served from the cache aren't signed at all.
+        """
+        if self.cache is not None or len(calls) < 2:
+            return [self.__build_endpoint_request(endpoint, url, parameters) for endpoint, url, parameters in calls]
+        if self.observer is not None:
+            signing = time.time()
+        signed = oauth.sign_requests(self.signature_method, self.consumer, self.token,
+                                     [(_signed_http_method(endpoint.method), url, parameters)
+                                      for endpoint, url, parameters in calls])
+        if self.observer is not None:
+            sign_time = (time.time() - signing) / len(calls)
+        requests = []
+        for (endpoint, url, parameters), oauth_request in zip(calls, signed):
+            request = self.__build_api_request(url, endpoint.method, parameters, endpoint.raw, oauth_request)
+            request.endpoint = endpoint.name
+            request.result_key = endpoint.result_key
+            if self.observer is not None:
+                request.sign_time += sign_time
+            requests.append(request)
+        return requests
+
+    def __send_notification_chunk(self, api_url, endpoint, parameters):
+        return self.__execute_api_request(self.__build_endpoint_request(endpoint, api_url, parameters))
+
     def __call_myspace_api(self, api_url, method='GET', parameters=None, debug=False, get_raw_response=False):      
-        access_token = self.token
-        
-        # Use POST for PUT as well. Set up http_method correctly for base string generation + signing
-        http_method = 'POST' if (method == 'POST' or method == 'PUT') else method
-        oauth_request = oauth.OAuthRequest.from_consumer_and_token(
-            self.consumer, token=access_token, http_method=http_method, http_url=api_url, parameters=parameters
-        )
-        oauth_request.sign_request(self.signature_method, self.consumer, access_token)
+        request = self.__build_api_request(api_url, method, parameters, get_raw_response)
+        return self.__execute_api_request(request)
+
+    def __execute_api_request(self, request):
+        """Sends request, retrying it as allowed by the retry policy. Every retry is
+           built and signed again so that it carries a fresh nonce and timestamp.
+        """
+        record = None
+        if self.observer is not None:
+            record = self.__start_record(request)
+            started = time.time() - request.sign_time
+        deadline = self.__call_deadline()
+        attempt = 1
+        try:
+            while True:
+                try:
+                    api_response = self.__send_api_request(request, record, deadline)
+                    if request.result_key is not None:
+                        return api_response[request.result_key]
+                    return api_response
+                except MySpaceError, e:
+                    if not self.__wait_for_retry(request.method, attempt, e, deadline):
+                        raise
+                    attempt += 1
+                    retry = self.__build_api_request(request.api_url, request.method, request.parameters, request.get_raw_response)
+                    retry.endpoint = request.endpoint
+                    retry.result_key = request.result_key
+                    request = retry
+                    if record is not None:
+                        record.add_time('sign', request.sign_time)
+        except:
+            if record is not None:
+                record.error = sys.exc_info()[1]
+            raise
+        finally:
+            if record is not None:
+                self.__record_call(record, started)
+
+    def __wait_for_retry(self, method, attempt, error, deadline):
+        """Waits before retrying a failed call. Returns False without waiting if
+           the retry policy gives up or the retry would start past deadline.
+        """
+        policy = self.retry_policy
+        if policy is None or not policy.should_retry(method, attempt, error):
+            return False
+        if deadline is None:
+            policy.wait(attempt, error.http_response)
+            return True
+        delay = policy.delay(attempt, error.http_response)
+        if time.time() + delay >= deadline:
+            return False
+        if delay > 0:
+            policy.sleep(delay)
+        return True
+
+    def __call_deadline(self):
+        """The time by which a call starting now must be done, None if unbounded."""
+        deadline = self.deadline
+        if self.timeout is not None:
+            call_deadline = time.time() + self.timeout
+            if deadline is None or call_deadline < deadline:
+                deadline = call_deadline
+        return deadline
+
+    def __fetch_timeouts(self, deadline):
+        """Keyword arguments setting the fetcher timeouts, capped to the time left
+           before deadline.
+        """
+        connect_timeout = self.connect_timeout
+        read_timeout = self.read_timeout
+        if deadline is not None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise MySpaceTimeoutError('MySpace API call deadline exceeded')
+            if connect_timeout is None or connect_timeout > remaining:
+                connect_timeout = remaining
+            if read_timeout is None or read_timeout > remaining:
+                read_timeout = remaining
+        timeouts = {}
+        if connect_timeout is not None:
+            timeouts['connect_timeout'] = connect_timeout
+        if read_timeout is not None:
+            timeouts['read_timeout'] = read_timeout
+        return timeouts
+
+    def __start_record(self, request):
+        record = CallRecord(request.endpoint or endpoint_name(request.api_url), request.method, request.api_url)
+        if request.sign_time:
+            record.add_time('sign', request.sign_time)
+        return record
+
+    def __record_call(self, record, started):
+        record.add_time('total', time.time() - started)
+        self.observer.call_finished(record)
+
+    def __build_api_request(self, api_url, method, parameters, get_raw_response, oauth_request=None):
+        """Builds the ApiRequest of a call, signing it unless oauth_request is
+           already signed.
+        """
+        cache_key = cache_entry = None
+        if self.cache is not None and method == 'GET':
+            cache_key = self.cache.make_key(api_url, parameters, self.token, get_raw_response)
+            cache_entry = self.cache.get(cache_key)
+            if cache_entry is not None and cache_entry.is_fresh():
+                # served from the cache, no need to sign anything
+                return ApiRequest(method, api_url, get_raw_response=get_raw_response, parameters=parameters,
+                                  cache_key=cache_key, cache_entry=cache_entry)
+
+        if self.observer is not None:
+            signing = time.time()
+        if oauth_request is None:
+            access_token = self.token
+            oauth_request = oauth.OAuthRequest.from_consumer_and_token(
+                self.consumer, token=access_token, http_method=_signed_http_method(method), http_url=api_url,
+                parameters=parameters
+            )
+            oauth_request.sign_request(self.signature_method, self.consumer, access_token)
 
         headers = {}
         body = None
         if (method == 'PUT'):
-            headers['X-HTTP-Method-Override'] = 'PUT'           
-        # Generate POST/PUT body
+            headers['X-HTTP-Method-Override'] = 'PUT'
+
+        """Serialize the signed parameters once, split into the oauth ones and the
+           request specific ones. The oauth parameters go in the query string (or the
+           Authorization header). The request specific ones go in the query string for
+           GET and into the POST/PUT body - this is due to the way MySpace implements
+           it's oauth
+        """
+        oauth_qs, params_qs = oauth_request.to_split_postdata()
+        query = []
+        if self.auth_mode == AUTH_HEADER:
+            headers.update(oauth_request.to_header())
+        else:
+            query.append(oauth_qs)
         if (method == 'PUT' or method == 'POST'):
-            body = '&'.join('%s=%s' % (oauth.escape(str(k)), oauth.escape(str(v))) for k, v in parameters.iteritems())           
-            
-        """Get the request URL. For GET it's oauth_request.to_url(). For POST/PUT the URL should have just the oauth
-           related params in the query string. Any request specific params go into the POST body - this is due to the
-           way MySpace implements it's oauth
-        """       
-        request_url = oauth_request.to_url()
-        if (method == 'POST' or method == 'PUT'):
-            qs = urlparse.urlparse(oauth_request.to_url())[4]
-            qparams = oauth_request._split_url_string(qs)
-            for k, v in parameters.iteritems(): # nuke all non-oauth params and build a query string with only oauth related params
-                del qparams[k]
-            qs = '&'.join('%s=%s' % (oauth.escape(str(k)), oauth.escape(str(v))) for k, v in qparams.iteritems())
-            request_url = oauth_request.get_normalized_http_url() + '?' + qs
-        resp = self.url_fetcher.fetch(request_url, body=body, headers=headers)
+            body = params_qs
+        elif params_qs:
+            query.append(params_qs)
+        request_url = oauth_request.get_normalized_http_url()
+        if query:
+            request_url += '?' + '&'.join(query)
+        if cache_entry is not None and cache_entry.can_revalidate():
+            headers.update(cache_entry.conditional_headers())
+        request = ApiRequest(method, request_url, body, headers, get_raw_response,
+                             api_url=api_url, parameters=parameters, cache_key=cache_key, cache_entry=cache_entry)
+        if self.observer is not None:
+            request.sign_time = time.time() - signing
+        return request
+
+    def __send_api_request(self, request, record=None, deadline=None):
+        cache_entry = request.cache_entry
+        if cache_entry is not None and cache_entry.is_fresh():
+            if record is not None:
+                record.cached = True
+            return cache_entry.value
+        try:
+            resp = self.__fetch(request.url, request.api_url, body=request.body, headers=request.headers, record=record,
+                                deadline=deadline)
+        finally:
+            if self.cache is not None and request.method != 'GET':
+                self.cache.invalidate_url(request.api_url)
+        if resp.status == 304 and cache_entry is not None:
+            return self.cache.revalidated(request.cache_key, request.api_url, cache_entry, resp.headers).value
         if resp.status > 201:
             raise MySpaceError('MySpace REST API returned an error', resp)
-        api_response = resp.body if get_raw_response else simplejson.loads(resp.body)        
+        if request.get_raw_response:
+            api_response = resp.body
+        else:
+            decoding = time.time()
+            try:
+                api_response = simplejson.loads(resp.body)
+            except ValueError, why:
+                raise MySpaceError('MySpace REST API returned an invalid response: %s' % why, resp)
+            if record is not None:
+                record.add_time('decode', time.time() - decoding)
+        if request.cache_key is not None:
+            self.cache.store(request.cache_key, request.api_url, api_response, resp.headers)
         return api_response
 
+    def __fetch(self, url, api_url, body=None, headers=None, stream=False, record=None, deadline=None):
+        """Fetches a signed url, applying the scheduler and circuit breaker, if any.
+           api_url is the unsigned url, used to pick the rate limit. With stream
+           set the response is a StreamingHTTPResponse from url_fetcher.open().
+           The timings, status and size of the response are added to record.
+           The fetch must be done by deadline (an absolute time), if given.
+        """
+        if self.scheduler is not None:
+            if deadline is None:
+                waited = self.scheduler.acquire(self.consumer.key, api_url)
+            else:
+                # shed the call now rather than wait for a turn past the deadline
+                waited = self.scheduler.acquire(self.consumer.key, api_url, max(0, deadline - time.time()))
+            if record is not None and waited:
+                record.add_time('throttle', waited)
+        timeouts = self.__fetch_timeouts(deadline)
+        if record is not None:
+            record.attempts += 1
+            if body:
+                record.bytes_sent += len(body)
+        breaker = self.circuit_breaker
+        if breaker is not None:
+            breaker.before_request(url)
+        try:
+            if stream:
+                resp = self.url_fetcher.open(url, body=body, headers=headers, **timeouts)
+            else:
+                resp = self.url_fetcher.fetch(url, body=body, headers=headers, **timeouts)
+        except (urllib2.URLError, httplib.HTTPException, socket.error), why:
+            if breaker is not None:
+                breaker.record_failure(url)
+            if _is_timeout(why):
+                raise MySpaceTimeoutError('MySpace API request timed out: %s' % why, why)
+            raise MySpaceTransportError('MySpace API request failed: %s' % why, why)
+        except:
+            # end a half-open trial whatever went wrong, or the circuit would never close again
+            if breaker is not None:
+                breaker.record_failure(url)
+            raise
+        if breaker is not None:
+            breaker.record_response(url, resp.status)
+        if record is not None:
+            record.status = resp.status
+            record.add_timings(resp.timings)
+            if not stream and resp.body:
+                if resp.wire_bytes is not None:
+                    record.bytes_received += resp.wire_bytes
+                else:
+                    record.bytes_received += len(resp.body)
+                record.bytes_decoded += len(resp.body)
+        return resp
+
+def _signed_http_method(method):
+    # Use POST for PUT as well. Set up http_method correctly for base string generation + signing
+    return 'POST' if (method == 'POST' or method == 'PUT') else method
+
+def _is_timeout(error):
+    # urllib2 reports connect timeouts as a URLError wrapping the socket.timeout
+    return isinstance(error, socket.timeout) or isinstance(getattr(error, 'reason', None), socket.timeout)
+
+def _get_page_items(response, items_key):
+    # the friends API returns its entries as "Friends", the others in lower case
+    for key, value in response.iteritems():
+        if key.lower() == items_key:
+            return value or []
+    return []
+
+class _DeferredCall(object):
+    """Runs a call in the calling thread when its result is first asked for,
+       mimicking the AsyncResult interface.
+    """
+    def __init__(self, func, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def get(self):
+        if self.func is not None:
+            self.value = self.func(*self.args, **self.kwargs)
+            self.func = self.args = self.kwargs = None
+        return self.value
+
+class ApiRequest(object):
+
+    """A signed MySpace REST API request, ready to be sent. api_url and parameters
+       are the unsigned URL and request parameters it was built from;
+       cache_key/cache_entry are set when a ResponseCache is used.
+    """
+    def __init__(self, method, url, body=None, headers=None, get_raw_response=False, api_url=None, parameters=None, cache_key=None, cache_entry=None):
+        self.method = method
+        self.url = url
+        self.body = body
+        self.headers = headers or {}
+        self.get_raw_response = get_raw_response
+        self.api_url = api_url or url
+        self.parameters = parameters
+        self.endpoint = None
+        self.result_key = None
+        self.sign_time = 0.0
+        self.cache_key = cache_key
+        self.cache_entry = cache_entry
+
+    def __repr__(self):
+        return '<ApiRequest %s %s>' % (self.method, self.url)
+
+"""REST API wrappers mirrored by AsyncMySpace: one per endpoint
+"""
+ASYNC_METHODS = ENDPOINT_NAMES
+
+DEFAULT_ASYNC_WORKERS = 100
+
+_default_worker_pool = None
+_default_pooled_fetcher = None
+# so that threads making their first async calls together create a single pool
+_defaults_lock = threading.Lock()
+
+def _get_default_worker_pool():
+    global _default_worker_pool
+    _defaults_lock.acquire()
+    try:
+        if _default_worker_pool is None:
+            _default_worker_pool = WorkerPool(DEFAULT_ASYNC_WORKERS)
+        return _default_worker_pool
+    finally:
+        _defaults_lock.release()
+
+def _get_default_pooled_fetcher():
+    global _default_pooled_fetcher
+    _defaults_lock.acquire()
+    try:
+        if _default_pooled_fetcher is None:
+            _default_pooled_fetcher = PooledUrlFetcher(ConnectionPool(max_size=DEFAULT_ASYNC_WORKERS))
+        return _default_pooled_fetcher
+    finally:
+        _defaults_lock.release()
+
+class AsyncMySpace(object):
+
+    """Non-blocking counterpart of MySpace.
+
+       Every REST wrapper of MySpace (get_userid, get_albums ... send_notification) is
+       available with the same arguments but returns an AsyncResult immediately
+       instead of blocking. The call itself - parameter validation, signing and
+       the HTTP request - runs on a worker thread, over keep-alive connections
+       taken from a shared PooledUrlFetcher:
+
+          ams = AsyncMySpace(CONSUMER_KEY, CONSUMER_SECRET, token.key, token.secret)
+          pending = [ams.get_profile(user_id) for user_id in user_ids]
+          profiles = [p.get() for p in pending]
+
+       Errors, including MySpaceError for invalid parameters, are raised by
+       AsyncResult.get(). By default all AsyncMySpace instances share one worker
+       pool and one fetcher, so the number of requests in flight in the process
+       is bounded by DEFAULT_ASYNC_WORKERS; pass worker_pool/url_fetcher to change that.
+    """
+    def __init__(self, consumer_key, consumer_secret, oauth_token_key=None, oauth_token_secret=None, url_fetcher=None, worker_pool=None, **options):
+        # options are passed on to MySpace (cache, scheduler, retry_policy...)
+        self.client = MySpace(consumer_key, consumer_secret, oauth_token_key, oauth_token_secret,
+                              url_fetcher=url_fetcher or _get_default_pooled_fetcher(), **options)
+        self.worker_pool = worker_pool or _get_default_worker_pool()
+
+    def wrap(cls, client, worker_pool=None):
+        """Returns an AsyncMySpace running its calls with the existing MySpace client."""
+        ams = cls.__new__(cls)
+        ams.client = client
+        ams.worker_pool = worker_pool or _get_default_worker_pool()
+        return ams
+    wrap = classmethod(wrap)
+
+def _make_async_method(name):
+    def async_method(self, *args, **kwargs):
+        return self.worker_pool.submit(getattr(self.client, name), *args, **kwargs)
+    async_method.__name__ = name
+    async_method.__doc__ = 'Asynchronous version of MySpace.%s, returns an AsyncResult.' % name
+    return async_method
+
+for _name in ASYNC_METHODS:
+    setattr(AsyncMySpace, _name, _make_async_method(_name))
+del _name
+
+class MySpaceApp(object):
+
+    """Application wide MySpace client, to be created once per process and
+       shared by all requests:
+
+          app = MySpaceApp(CONSUMER_KEY, CONSUMER_SECRET, cache=ResponseCache())
+          ...
+          ms = app.for_token(token.key, token.secret)
+          profile = ms.get_profile(user_id)
+
+       The consumer, signature method, fetcher (a PooledUrlFetcher unless
+       url_fetcher is given) and all the options accepted by MySpace (cache,
+       scheduler, retry_policy, observer...) are set up once. for_token hands
+       out MySpace views sharing all of it, so creating one per request only
+       costs the view itself and its token.
+    """
+    def __init__(self, consumer_key, consumer_secret, url_fetcher=None, **options):
+        self._prototype = MySpace(consumer_key, consumer_secret, url_fetcher=url_fetcher or PooledUrlFetcher(), **options)
+
+    def for_token(self, oauth_token_key, oauth_token_secret):
+        """A MySpace client for the given access token."""
+        view = copy.copy(self._prototype)
+        view.token = oauth.OAuthConsumer(oauth_token_key, oauth_token_secret)
+        return view
+
+    def onsite(self):
+        """A MySpace client without token, for the oauth calls and onsite applications."""
+        return copy.copy(self._prototype)
+
+    def async_for_token(self, oauth_token_key, oauth_token_secret, worker_pool=None):
+        """An AsyncMySpace for the given access token, see for_token."""
+        return AsyncMySpace.wrap(self.for_token(oauth_token_key, oauth_token_secret), worker_pool)
+
+    def _get_consumer(self):
+        return self._prototype.consumer
+
+    def _get_url_fetcher(self):
+        return self._prototype.url_fetcher
+
+    consumer = property(_get_consumer)
+    url_fetcher = property(_get_url_fetcher)
+
 class UrlFetcher(object):
-      def fetch(self, url, body=None, headers=None):
-        if headers is None:
-           headers = {}
+
+      """Fetcher based on urllib2.
+
+         Requests ask for a gzip or deflate compressed response (set
+         accept_encoding to None not to) and compressed bodies are decoded
+         transparently. wire_bytes and decoded_bytes on the response tell the
+         size of the body as transferred and after decoding.
+
+         urllib2 has a single timeout for connecting and reading, so when both
+         connect_timeout and read_timeout are given the larger one is used.
+      """
+      accept_encoding = ACCEPT_ENCODING
+
+      def fetch(self, url, body=None, headers=None, connect_timeout=None, read_timeout=None):
+        headers = self._request_headers(headers)
         req = urllib2.Request(url, data=body, headers=headers)
+        started = time.time()
         try:
-            f = urllib2.urlopen(req)
+            f = self._urlopen(req, connect_timeout, read_timeout)
             try:
-                return self._makeResponse(f)
+                return self._makeResponse(f, started)
             finally:
                 f.close()
         except urllib2.HTTPError, why:
             try:
-                return self._makeResponse(why)
+                return self._makeResponse(why, started)
             finally:
                 why.close()
 
-      def _makeResponse(self, urllib2_response):
+      def open(self, url, body=None, headers=None, connect_timeout=None, read_timeout=None):
+        """Like fetch but returns a StreamingHTTPResponse whose body is read
+           from the socket on demand. The caller must close() it.
+        """
+        req = urllib2.Request(url, data=body, headers=self._request_headers(headers))
+        started = time.time()
+        try:
+            f = self._urlopen(req, connect_timeout, read_timeout)
+        except urllib2.HTTPError, why:
+            f = why
+        response_headers = dict(f.info().items())
+        fp = f
+        if is_compressed(response_headers):
+            fp = DecodingReader(f, response_headers)
+        resp = StreamingHTTPResponse(f.geturl(), getattr(f, 'code', 200), response_headers, fp, f.close)
+        resp.timings = {'ttfb': time.time() - started}
+        return resp
+
+      def _urlopen(self, req, connect_timeout, read_timeout):
+        timeout = max(connect_timeout, read_timeout)
+        if timeout is None:
+            # leave the socket default timeout alone
+            return urllib2.urlopen(req)
+        return urllib2.urlopen(req, timeout=timeout)
+
+      def _request_headers(self, headers):
+        request_headers = {}
+        if headers:
+            request_headers.update(headers)
+        if self.accept_encoding and 'Accept-Encoding' not in request_headers:
+            request_headers['Accept-Encoding'] = self.accept_encoding
+        return request_headers
+
+      def _makeResponse(self, urllib2_response, started=None):
         resp = HTTPResponse()
-        resp.body = urllib2_response.read()
+        # urlopen returns once the headers are in, connecting included
+        reading = time.time()
+        raw_body = urllib2_response.read()
         resp.final_url = urllib2_response.geturl()
         resp.headers = dict(urllib2_response.info().items())
+        resp.body = decode_body(raw_body, resp.headers)
+        if started is not None:
+            resp.timings = {'ttfb': reading - started, 'read': time.time() - reading}
+        resp.wire_bytes = len(raw_body)
+        resp.decoded_bytes = len(resp.body)
     
         if hasattr(urllib2_response, 'code'):
             resp.status = urllib2_response.code
@@ -411,11 +1190,106 @@ class UrlFetcher(object):
             resp.status = 200   
         return resp
 
+class PooledUrlFetcher(UrlFetcher):
+
+      """Fetcher that talks HTTP/1.1 over persistent connections taken from a
+         ConnectionPool instead of opening a new connection per request.
+         Redirects are not followed; the response is returned as is.
+
+         connect_timeout bounds opening a new connection, read_timeout every
+         read from it (sending included).
+      """
+      def __init__(self, pool=None):
+          self.pool = pool or ConnectionPool()
+
+      def fetch(self, url, body=None, headers=None, connect_timeout=None, read_timeout=None):
+        resp = self.open(url, body, headers, connect_timeout, read_timeout)
+        try:
+            reading = time.time()
+            data = resp.read()
+            resp.timings['read'] = time.time() - reading
+        finally:
+            resp.close()
+        result = HTTPResponse(url, resp.status, resp.headers, data)
+        result.timings = resp.timings
+        result.wire_bytes = resp.wire_bytes
+        result.decoded_bytes = len(data)
+        return result
+
+      def open(self, url, body=None, headers=None, connect_timeout=None, read_timeout=None):
+        scheme, netloc, path, params, query, fragment = urlparse.urlparse(url)
+        host, port = urllib.splitport(netloc)
+        if port is not None:
+            port = int(port)
+        selector = path or '/'
+        if query:
+            selector += '?' + query
+        request_headers = self._request_headers(headers)
+        if body is not None:
+            method = 'POST'
+            if 'Content-Type' not in request_headers:
+                request_headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        else:
+            method = 'GET'
+
+        while True:
+            conn, reused = self.pool.get(scheme, host, port)
+            timings = {}
+            sent = False
+            try:
+                if not reused:
+                    if connect_timeout is not None:
+                        conn.timeout = connect_timeout
+                    connecting = time.time()
+                    conn.connect()
+                    timings['connect'] = time.time() - connecting
+                # set on every request since pooled sockets keep the timeout of the previous one
+                if read_timeout is not None:
+                    conn.sock.settimeout(read_timeout)
+                else:
+                    conn.sock.settimeout(socket.getdefaulttimeout())
+                sending = time.time()
+                conn.request(method, selector, body, request_headers)
+                sent = True
+                http_response = conn.getresponse()
+                timings['ttfb'] = time.time() - sending
+            except socket.timeout:
+                # not a stale connection, the server is too slow
+                conn.close()
+                raise
+            except (httplib.HTTPException, socket.error):
+                conn.close()
+                # the server may have dropped a pooled connection while it was idle - try the next one,
+                # unless a POST went out: the server may have acted on it, sending it again could repeat it
+                if reused and (not sent or method == 'GET'):
+                    continue
+                raise
+            release = lambda: self._release(scheme, host, port, conn, http_response)
+            response_headers = dict(http_response.getheaders())
+            fp = http_response
+            if is_compressed(response_headers):
+                fp = DecodingReader(http_response, response_headers)
+            resp = StreamingHTTPResponse(url, http_response.status, response_headers, fp, release)
+            resp.timings = timings
+            return resp
+
+      def _release(self, scheme, host, port, conn, http_response):
+        # the connection can only be reused once its response has been read completely
+        if http_response.isclosed() and not http_response.will_close:
+            self.pool.put(scheme, host, port, conn)
+        else:
+            conn.close()
+
 class HTTPResponse(object):
       headers = None
       status = None
       body = None
       final_url = None
+      # {phase: seconds} measured by the fetcher, see myspace.instrument.PHASES
+      timings = None
+      # size of the body as transferred and once decoded, if the fetcher reports them
+      wire_bytes = None
+      decoded_bytes = None
     
       def __init__(self, final_url=None, status=None, headers=None, body=None):
           self.final_url = final_url
@@ -425,3 +1299,39 @@ class HTTPResponse(object):
     
       def __repr__(self):
           return "[HTTP Status Code: %r --- Request URL: %s --- Response: %s" % (self.status, self.final_url, self.body)
+
+class StreamingHTTPResponse(HTTPResponse):
+
+      """HTTPResponse returned by UrlFetcher.open. The body is not buffered;
+         read it with read() and close() the response when done.
+      """
+      def __init__(self, final_url=None, status=None, headers=None, fp=None, close_callback=None):
+          HTTPResponse.__init__(self, final_url, status, headers)
+          self.fp = fp
+          self._close_callback = close_callback
+          self.bytes_read = 0
+
+      def read(self, size=-1):
+          if self.fp is None:
+              return ''
+          if size is None or size < 0:
+              data = self.fp.read()
+          else:
+              data = self.fp.read(size)
+          self.bytes_read += len(data)
+          return data
+
+      def _get_wire_bytes(self):
+          return getattr(self.fp, 'wire_bytes', self.bytes_read)
+
+      def _get_decoded_bytes(self):
+          return self.bytes_read
+
+      # bytes read so far
+      wire_bytes = property(_get_wire_bytes)
+      decoded_bytes = property(_get_decoded_bytes)
+
+      def close(self):
+          if self._close_callback is not None:
+              callback, self._close_callback = self._close_callback, None
+              callback()
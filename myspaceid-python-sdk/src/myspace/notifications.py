@@ -0,0 +1,99 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2007, 2008 MySpace Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Support for sending one notification to a large number of recipients.
+
+   MySpace.send_notifications splits the recipients into chunks of at most
+   chunk_size ids (iter_recipient_chunks), sends one send_notification call
+   per chunk and returns a FanoutReport with the outcome of every chunk.
+"""
+
+__all__ = [
+    'ChunkResult',
+    'FanoutReport',
+    'iter_recipient_chunks',
+    ]
+
+# recipients accepted by a single send_notification call
+DEFAULT_RECIPIENTS_PER_CALL = 100
+
+def iter_recipient_chunks(recipients, chunk_size=DEFAULT_RECIPIENTS_PER_CALL):
+    """Yields lists of at most chunk_size recipient ids (as strings) taken from
+       the iterable recipients, which is only read as the chunks are needed.
+    """
+    if chunk_size < 1:
+        raise ValueError('chunk_size must be at least 1')
+    chunk = []
+    for recipient in recipients:
+        chunk.append(str(recipient))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+class ChunkResult(object):
+
+    """Outcome of the send_notification call for one chunk of recipients:
+       response is the API response if it succeeded, error the MySpaceError it
+       failed with otherwise.
+    """
+    __slots__ = ('index', 'recipients', 'response', 'error')
+
+    def __init__(self, index, recipients, response=None, error=None):
+        self.index = index
+        self.recipients = recipients
+        self.response = response
+        self.error = error
+
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return '<ChunkResult %d: %d recipients, %s>' % (self.index, len(self.recipients),
+                                                        self.error is None and 'ok' or 'failed: %s' % self.error)
+
+class FanoutReport(object):
+
+    """Per chunk results of MySpace.send_notifications, in chunk order."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def add(self, result):
+        self.chunks.append(result)
+
+    def succeeded(self):
+        return [chunk for chunk in self.chunks if chunk.error is None]
+
+    def failed(self):
+        return [chunk for chunk in self.chunks if chunk.error is not None]
+
+    def failed_recipients(self):
+        """Ids of the recipients whose chunk failed, e.g. to send to them again."""
+        recipients = []
+        for chunk in self.failed():
+            recipients.extend(chunk.recipients)
+        return recipients
+
+    def recipient_count(self):
+        return sum([len(chunk.recipients) for chunk in self.chunks])
+
+    def ok(self):
+        return not self.failed()
+
+    def __repr__(self):
+        return '<FanoutReport %d chunks, %d failed>' % (len(self.chunks), len(self.failed()))
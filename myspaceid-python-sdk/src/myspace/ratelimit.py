@@ -0,0 +1,200 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2007, 2008 MySpace Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+from myspace.cache import endpoint_name
+from myspace.errors import MySpaceTimeoutError
+
+__all__ = [
+    'RequestScheduler',
+    'TokenBucket',
+    'endpoint_family',
+    ]
+
+def endpoint_family(url):
+    """Groups MySpace API urls into the families rate limits are configured
+       for: 'notifications', 'friends', 'photos' or 'default'.
+    """
+    name = endpoint_name(url)
+    if 'notifications' in name:
+        return 'notifications'
+    if 'friend' in name:
+        return 'friends'
+    if 'photo' in name or 'album' in name:
+        return 'photos'
+    return 'default'
+
+class TokenBucket(object):
+
+    """Token bucket allowing rate requests per second on average, in bursts
+       of up to capacity requests.
+
+       reserve() never refuses a request: it takes a token, letting the bucket
+       go into debt when it is empty, and returns how long the caller has to
+       wait for that token. Callers sleeping for the returned time are thus
+       served in arrival order at the configured rate. With max_wait given, a
+       caller that would have to wait longer gets None and no token instead.
+    """
+    def __init__(self, rate, capacity=None, clock=time.time):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.clock = clock
+        self._tokens = self.capacity
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait=None):
+        self._lock.acquire()
+        try:
+            now = self.clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if max_wait is not None and (1 - self._tokens) / self.rate > max_wait:
+                return None
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+        finally:
+            self._lock.release()
+
+class _FamilyStats(object):
+
+    def __init__(self):
+        self.requests = 0
+        self.delayed = 0
+        self.timed_out = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'delayed': self.delayed,
+            'timed_out': self.timed_out,
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'total_wait': self.total_wait,
+            'max_wait': self.max_wait,
+            'mean_wait': self.requests and self.total_wait / self.requests or 0.0,
+        }
+
+class RequestScheduler(object):
+
+    """Client side rate limiting for MySpace API calls:
+
+          scheduler = RequestScheduler({'friends': (10, 20), 'notifications': (2, 5)},
+                                       default_limit=(50, 100))
+          ms = MySpace(CONSUMER_KEY, CONSUMER_SECRET, token.key, token.secret, scheduler=scheduler)
+
+       limits maps an endpoint family (see endpoint_family) or a
+       (consumer_key, family) tuple to a (requests per second, burst) pair.
+       Every consumer key gets its own token buckets. Families without a limit
+       use default_limit, or are not limited at all if that is None.
+
+       Requests over the limit are not failed: acquire() blocks the calling
+       thread until its turn comes, unless that is more than its timeout away.
+       stats() reports, per (consumer_key, family), the number of requests, how
+       many had to wait, how many timed out instead, the current and maximum
+       number of waiting requests and the total, maximum and mean wait time.
+    """
+    def __init__(self, limits=None, default_limit=None, clock=time.time, sleep=time.sleep):
+        self.limits = limits or {}
+        self.default_limit = default_limit
+        self.clock = clock
+        self.sleep = sleep
+        self._buckets = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, consumer_key, url, timeout=None):
+        """Waits until a request to url may be sent, returns the time waited.
+           Raises MySpaceTimeoutError right away, without using up the request's
+           turn, if it would have to wait for more than timeout seconds.
+        """
+        family = endpoint_family(url)
+        key = (consumer_key, family)
+        self._lock.acquire()
+        try:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = self._make_bucket(consumer_key, family)
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _FamilyStats()
+            stats.requests += 1
+        finally:
+            self._lock.release()
+        if bucket is None:
+            return 0.0
+
+        wait = bucket.reserve(timeout)
+        if wait is None:
+            self._lock.acquire()
+            try:
+                stats.timed_out += 1
+            finally:
+                self._lock.release()
+            raise MySpaceTimeoutError('MySpace API call deadline exceeded waiting for the %s rate limit' % family)
+        if wait <= 0:
+            return 0.0
+        self._lock.acquire()
+        try:
+            stats.delayed += 1
+            stats.queue_depth += 1
+            stats.max_queue_depth = max(stats.max_queue_depth, stats.queue_depth)
+        finally:
+            self._lock.release()
+        try:
+            self.sleep(wait)
+        finally:
+            self._lock.acquire()
+            try:
+                stats.queue_depth -= 1
+                stats.total_wait += wait
+                stats.max_wait = max(stats.max_wait, wait)
+            finally:
+                self._lock.release()
+        return wait
+
+    def queue_depth(self, consumer_key=None, family=None):
+        """Number of requests currently waiting, optionally for one consumer key and/or family."""
+        self._lock.acquire()
+        try:
+            return sum([stats.queue_depth for (key, fam), stats in self._stats.iteritems()
+                        if (consumer_key is None or key == consumer_key) and (family is None or fam == family)])
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        self._lock.acquire()
+        try:
+            return dict([(key, stats.as_dict()) for key, stats in self._stats.iteritems()])
+        finally:
+            self._lock.release()
+
+    def _make_bucket(self, consumer_key, family):
+        limit = self.limits.get((consumer_key, family)) or self.limits.get(family) or self.default_limit
+        if limit is None:
+            return None
+        rate, burst = limit
+        return TokenBucket(rate, burst, self.clock)
@@ -0,0 +1,362 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2007, 2008 MySpace Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Recording and replay of HTTP traffic, for load testing without the API.
+
+   Capture a workload once by wrapping the fetcher of a MySpace client (or an
+   openid.fetchers fetcher) in a RecordingFetcher:
+
+      log = TrafficLog('workload.log')
+      ms = MySpace(CONSUMER_KEY, CONSUMER_SECRET, token.key, token.secret,
+                   url_fetcher=RecordingFetcher(PooledUrlFetcher(), log))
+
+   then serve it back with a ReplayFetcher, or drive a client through the
+   whole recording and measure what it costs:
+
+      exchanges = list(read_log('workload.log'))
+      ms = MySpace(CONSUMER_KEY, CONSUMER_SECRET, token.key, token.secret,
+                   url_fetcher=ReplayFetcher(exchanges))
+      report = replay(exchanges, ms, concurrency=8)
+      print report.cpu_per_request()
+
+   The oauth_nonce, oauth_timestamp and oauth_signature parameters are not
+   recorded, and oauth parameters are ignored when replayed requests are
+   matched to the recorded ones, so a replay signs its requests afresh with
+   any credentials.
+"""
+
+import StringIO
+import cgi
+import os
+import threading
+import time
+import simplejson
+
+from myspace.instrument import Histogram
+from myspace.myspaceapi import HTTPResponse, StreamingHTTPResponse
+from myspace.workers import WorkerPool
+
+__all__ = [
+    'Exchange',
+    'RecordingFetcher',
+    'ReplayFetcher',
+    'ReplayMissError',
+    'ReplayReport',
+    'TrafficLog',
+    'read_log',
+    'replay',
+    ]
+
+# parameters that change with every signature, never recorded
+VOLATILE_PARAMS = ('oauth_nonce', 'oauth_timestamp', 'oauth_signature')
+
+# response headers that describe the body as transferred; the recorded body is decoded
+TRANSFER_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding', 'connection', 'keep-alive')
+
+class ReplayMissError(LookupError):
+    """A ReplayFetcher was asked for a request that isn't in the recording."""
+    pass
+
+def _param_name(piece):
+    return piece.split('=', 1)[0]
+
+def strip_params(qs, names=VOLATILE_PARAMS):
+    """Removes the parameters called names from a query string or form body,
+       leaving the rest exactly as it was.
+    """
+    if not qs:
+        return qs
+    return '&'.join([piece for piece in qs.split('&') if _param_name(piece) not in names])
+
+def strip_url(url, names=VOLATILE_PARAMS):
+    if '?' not in url:
+        return url
+    base, query = url.split('?', 1)
+    query = strip_params(query, names)
+    return query and base + '?' + query or base
+
+def _match_params(qs):
+    # oauth parameters differ between a recording and its replay
+    if not qs:
+        return ()
+    pieces = [piece for piece in qs.split('&') if piece and not _param_name(piece).startswith('oauth_')]
+    pieces.sort()
+    return tuple(pieces)
+
+def request_method(body, headers):
+    if headers and headers.get('X-HTTP-Method-Override'):
+        return headers['X-HTTP-Method-Override']
+    return body is not None and 'POST' or 'GET'
+
+def match_key(method, url, body):
+    """Key identifying a request regardless of its oauth parameters and of the
+       order of its parameters.
+    """
+    base, query = (url.split('?', 1) + [''])[:2]
+    return (method, base, _match_params(query), _match_params(body))
+
+# bodies are bytes; they are stored as latin-1 text, which maps every byte to a character
+def _text(value):
+    if isinstance(value, str):
+        return value.decode('latin-1')
+    return value
+
+def _bytes(value):
+    if isinstance(value, unicode):
+        return value.encode('latin-1')
+    return value
+
+class Exchange(object):
+
+    """One recorded request and its response.
+
+       method, url and body describe the request, without the VOLATILE_PARAMS;
+       status, headers and response_body the response, whose body is stored
+       decoded. started is when the request was sent (time.time()) and elapsed
+       the seconds it took.
+    """
+    __slots__ = ('method', 'url', 'body', 'status', 'headers', 'response_body', 'started', 'elapsed')
+
+    def __init__(self, method, url, body, status, headers, response_body, started=0.0, elapsed=0.0):
+        self.method = method
+        self.url = url
+        self.body = body
+        self.status = status
+        self.headers = headers
+        self.response_body = response_body
+        self.started = started
+        self.elapsed = elapsed
+
+    def from_response(cls, url, body, headers, response, started, elapsed):
+        response_headers = {}
+        for name, value in (response.headers or {}).iteritems():
+            if name.lower() not in TRANSFER_HEADERS:
+                response_headers[name] = value
+        return cls(request_method(body, headers), strip_url(url), strip_params(body), response.status,
+                   response_headers, response.body or '', started, elapsed)
+    from_response = classmethod(from_response)
+
+    def key(self):
+        return match_key(self.method, self.url, self.body)
+
+    def response(self, response_class=HTTPResponse):
+        resp = response_class(self.url, self.status, dict(self.headers), self.response_body)
+        resp.wire_bytes = resp.decoded_bytes = len(self.response_body)
+        return resp
+
+    def to_dict(self):
+        headers = dict([(name, _text(value)) for name, value in self.headers.iteritems()])
+        return {'method': self.method, 'url': _text(self.url), 'body': _text(self.body), 'status': self.status,
+                'headers': headers, 'response': _text(self.response_body),
+                'started': self.started, 'elapsed': self.elapsed}
+
+    def from_dict(cls, values):
+        headers = dict([(str(name), _bytes(value)) for name, value in values['headers'].iteritems()])
+        return cls(str(values['method']), _bytes(values['url']), _bytes(values.get('body')), values['status'], headers,
+                   _bytes(values['response']), values['started'], values['elapsed'])
+    from_dict = classmethod(from_dict)
+
+    def __repr__(self):
+        return '<Exchange %s %s: %s>' % (self.method, self.url, self.status)
+
+class TrafficLog(object):
+
+    """Append-only log of Exchanges, one JSON object per line. Recording into
+       an existing file adds to it. Thread safe.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'ab')
+        self._lock = threading.Lock()
+
+    def append(self, exchange):
+        line = simplejson.dumps(exchange.to_dict(), sort_keys=True) + '\n'
+        self._lock.acquire()
+        try:
+            self._file.write(line)
+            self._file.flush()
+        finally:
+            self._lock.release()
+
+    def close(self):
+        self._lock.acquire()
+        try:
+            self._file.close()
+        finally:
+            self._lock.release()
+
+def read_log(path):
+    """Generator yielding the Exchanges of a TrafficLog file in recording order."""
+    f = open(path, 'rb')
+    try:
+        for line in f:
+            if line.strip():
+                yield Exchange.from_dict(simplejson.loads(line))
+    finally:
+        f.close()
+
+class RecordingFetcher(object):
+
+    """Fetcher passing the requests on to fetcher and appending every request
+       and response to log. fetcher can be a MySpace url fetcher or an
+       openid.fetchers fetcher; requests that fail without a response aren't
+       recorded. open() reads the whole response before returning it.
+    """
+    def __init__(self, fetcher, log):
+        self.fetcher = fetcher
+        self.log = log
+
+    def fetch(self, url, body=None, headers=None, **kwargs):
+        started = time.time()
+        resp = self.fetcher.fetch(url, body, headers, **kwargs)
+        self.log.append(Exchange.from_response(url, body, headers, resp, started, time.time() - started))
+        return resp
+
+    def open(self, url, body=None, headers=None, **kwargs):
+        resp = self.fetch(url, body, headers, **kwargs)
+        streaming = StreamingHTTPResponse(resp.final_url, resp.status, resp.headers, StringIO.StringIO(resp.body or ''))
+        streaming.timings = getattr(resp, 'timings', None)
+        return streaming
+
+class ReplayFetcher(object):
+
+    """Fetcher answering requests with the recorded responses, without any I/O.
+
+       A request is matched to the recorded ones by method, URL and parameters,
+       ignoring oauth parameters and parameter order. Requests recorded several
+       times get their responses in recording order, starting over once all
+       were served. Unknown requests raise ReplayMissError.
+
+       speed - None to answer right away, otherwise wait for the recorded
+               response time divided by speed (1.0 is real time)
+       response_class - class of the responses returned; pass
+               openid.fetchers.HTTPResponse when replaying for openid
+    """
+    def __init__(self, exchanges, speed=None, response_class=HTTPResponse):
+        self.speed = speed
+        self.response_class = response_class
+        self._exchanges = {}
+        self._served = {}
+        self._lock = threading.Lock()
+        for exchange in exchanges:
+            self._exchanges.setdefault(exchange.key(), []).append(exchange)
+
+    def _lookup(self, url, body, headers):
+        key = match_key(request_method(body, headers), url, body)
+        self._lock.acquire()
+        try:
+            recorded = self._exchanges.get(key)
+            if not recorded:
+                raise ReplayMissError('No recorded response for %s %s' % (key[0], strip_url(url)))
+            served = self._served.get(key, 0)
+            self._served[key] = served + 1
+            return recorded[served % len(recorded)]
+        finally:
+            self._lock.release()
+
+    def fetch(self, url, body=None, headers=None, **kwargs):
+        exchange = self._lookup(url, body, headers)
+        if self.speed:
+            time.sleep(exchange.elapsed / self.speed)
+        return exchange.response(self.response_class)
+
+    def open(self, url, body=None, headers=None, **kwargs):
+        resp = self.fetch(url, body, headers)
+        return StreamingHTTPResponse(resp.final_url, resp.status, resp.headers, StringIO.StringIO(resp.body))
+
+def _cpu_time():
+    times = os.times()
+    return times[0] + times[1]
+
+class ReplayReport(object):
+
+    """Outcome of replay(): the number of requests, those that failed as
+       (exchange, exception) pairs, the wall clock and CPU seconds (of the whole
+       process) spent and a Histogram of the request latencies.
+    """
+    def __init__(self):
+        self.requests = 0
+        self.errors = []
+        self.seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.latency = Histogram()
+
+    def cpu_per_request(self):
+        return self.requests and self.cpu_seconds / self.requests or 0.0
+
+    def summary(self, percentiles=(50, 90, 99)):
+        return {
+            'requests': self.requests,
+            'errors': len(self.errors),
+            'seconds': self.seconds,
+            'cpu_seconds': self.cpu_seconds,
+            'cpu_per_request': self.cpu_per_request(),
+            'latency': self.latency.snapshot(percentiles),
+        }
+
+def _send(client, exchange):
+    api_url, query = (exchange.url.split('?', 1) + [''])[:2]
+    parameters = dict(cgi.parse_qsl(query, keep_blank_values=True))
+    if exchange.body:
+        parameters.update(dict(cgi.parse_qsl(exchange.body, keep_blank_values=True)))
+    for name in parameters.keys():
+        if name.startswith('oauth_'):
+            del parameters[name]
+    content_type = exchange.headers.get('content-type') or exchange.headers.get('Content-Type') or ''
+    started = time.time()
+    client.call_url(api_url, exchange.method, parameters, raw='json' not in content_type)
+    return time.time() - started
+
+def replay(exchanges, client, concurrency=1, speed=None):
+    """Sends the recorded requests again, through client.call_url, and returns a
+       ReplayReport. Give the client a ReplayFetcher over the same exchanges to
+       replay without any network traffic.
+
+       concurrency - number of requests sent at the same time
+       speed       - None to send them as fast as possible, otherwise at the
+                     pace they were recorded at times speed
+    """
+    report = ReplayReport()
+    pool = WorkerPool(concurrency)
+    window = max(1, concurrency * 2)
+    in_flight = []
+    def collect(exchange, async_result):
+        report.requests += 1
+        try:
+            report.latency.add(async_result.get())
+        except Exception, e:
+            report.errors.append((exchange, e))
+    started = time.time()
+    cpu_started = _cpu_time()
+    try:
+        first = None
+        for exchange in exchanges:
+            if speed:
+                if first is None:
+                    first = exchange.started
+                delay = started + (exchange.started - first) / speed - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            in_flight.append((exchange, pool.submit(_send, client, exchange)))
+            if len(in_flight) >= window:
+                collect(*in_flight.pop(0))
+        while in_flight:
+            collect(*in_flight.pop(0))
+    finally:
+        pool.shutdown(wait=False)
+    report.seconds = time.time() - started
+    report.cpu_seconds = _cpu_time() - cpu_started
+    return report
@@ -0,0 +1,177 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2007, 2008 MySpace Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+import rfc822
+import threading
+import time
+import urlparse
+
+from myspace.errors import CircuitOpenError, MySpaceTransportError
+
+__all__ = [
+    'CircuitBreaker',
+    'RetryPolicy',
+    ]
+
+DEFAULT_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class RetryPolicy(object):
+
+    """Decides whether a failed MySpace API call is tried again and how long
+       to wait before doing so.
+
+       max_attempts     - total number of attempts, including the first one
+       backoff          - base delay (seconds); attempt n waits up to backoff * 2 ** (n - 1)
+       max_backoff      - upper bound for any single delay, including Retry-After
+       jitter           - pick the delay uniformly between 0 and the exponential
+                          bound ("full jitter") instead of using the bound itself
+       retry_statuses   - HTTP status codes that are retried
+       retry_methods    - HTTP methods that are retried. Only GET by default since
+                          repeating a POST/PUT may apply it twice.
+
+       Transport errors (MySpaceTransportError) are retried as well. A
+       Retry-After header on the failed response overrides the computed delay.
+    """
+    def __init__(self, max_attempts=3, backoff=0.5, max_backoff=30.0, jitter=True,
+                 retry_statuses=DEFAULT_RETRY_STATUSES, retry_methods=('GET',), sleep=time.sleep):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_statuses = retry_statuses
+        self.retry_methods = retry_methods
+        self.sleep = sleep
+
+    def should_retry(self, method, attempt, error):
+        if attempt >= self.max_attempts or method not in self.retry_methods:
+            return False
+        if isinstance(error, CircuitOpenError):
+            return False
+        if isinstance(error, MySpaceTransportError):
+            return True
+        resp = getattr(error, 'http_response', None)
+        return resp is not None and resp.status in self.retry_statuses
+
+    def delay(self, attempt, http_response=None):
+        retry_after = parse_retry_after(http_response)
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        bound = min(self.max_backoff, self.backoff * (2 ** (attempt - 1)))
+        if self.jitter:
+            return random.uniform(0, bound)
+        return bound
+
+    def wait(self, attempt, http_response=None):
+        delay = self.delay(attempt, http_response)
+        if delay > 0:
+            self.sleep(delay)
+        return delay
+
+def parse_retry_after(http_response):
+    """Returns the delay in seconds requested by a Retry-After header, given
+       either as a number of seconds or as an HTTP date, or None.
+    """
+    headers = http_response is not None and http_response.headers or None
+    if not headers:
+        return None
+    value = headers.get('retry-after') or headers.get('Retry-After')
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    parsed = rfc822.parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(0.0, rfc822.mktime_tz(parsed) - time.time())
+
+class _Circuit(object):
+
+    def __init__(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+
+class CircuitBreaker(object):
+
+    """Per host circuit breaker.
+
+       After failure_threshold consecutive failures (transport errors or 5xx
+       responses) to a host the circuit opens and requests to that host fail
+       immediately with CircuitOpenError. Once reset_timeout seconds have
+       passed a single trial request is let through: if it succeeds the
+       circuit closes again, if it fails it stays open for another
+       reset_timeout. Share one breaker between clients so they all see the
+       state of the host.
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.time):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def before_request(self, url):
+        host = _host(url)
+        self._lock.acquire()
+        try:
+            circuit = self._circuits.get(host)
+            if circuit is None or circuit.opened_at is None:
+                return
+            if circuit.trial_in_progress or self.clock() - circuit.opened_at < self.reset_timeout:
+                raise CircuitOpenError('Circuit open for %s after %d consecutive failures' % (host, circuit.failures))
+            circuit.trial_in_progress = True
+        finally:
+            self._lock.release()
+
+    def record_success(self, url):
+        self._lock.acquire()
+        try:
+            self._circuits.pop(_host(url), None)
+        finally:
+            self._lock.release()
+
+    def record_failure(self, url):
+        host = _host(url)
+        self._lock.acquire()
+        try:
+            circuit = self._circuits.get(host)
+            if circuit is None:
+                circuit = self._circuits[host] = _Circuit()
+            circuit.failures += 1
+            circuit.trial_in_progress = False
+            if circuit.opened_at is not None or circuit.failures >= self.failure_threshold:
+                circuit.opened_at = self.clock()
+        finally:
+            self._lock.release()
+
+    def record_response(self, url, status):
+        if status >= 500:
+            self.record_failure(url)
+        else:
+            self.record_success(url)
+
+    def is_open(self, url):
+        self._lock.acquire()
+        try:
+            circuit = self._circuits.get(_host(url))
+            return circuit is not None and circuit.opened_at is not None
+        finally:
+            self._lock.release()
+
+def _host(url):
+    return urlparse.urlparse(url)[1].lower()
@@ -0,0 +1,90 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2007, 2008 MySpace Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import threading
+
+from myspace.workers import AsyncResult
+
+__all__ = [
+    'SingleFlight',
+    ]
+
+class SingleFlight(object):
+
+    """Coalesces identical concurrent calls.
+
+       do(key, func, ...) runs func unless a call with the same key is already
+       running, in which case it waits for that call and returns its result
+       (or raises its exception) instead. Once a call finishes the key is
+       forgotten: results are shared between concurrent callers only, never
+       cached.
+
+       MySpace uses one to send identical concurrent GET requests only once;
+       share an instance between MySpace objects to coalesce across them.
+
+       do_within(timeout, key, func, ...) is the same, except that a caller
+       waiting for another one's call gives up after timeout seconds with
+       myspace.workers.ResultTimeout.
+    """
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, func, *args, **kwargs):
+        return self.do_within(None, key, func, *args, **kwargs)
+
+    def do_within(self, timeout, key, func, *args, **kwargs):
+        self._lock.acquire()
+        try:
+            result = self._calls.get(key)
+            leader = result is None
+            if leader:
+                result = self._calls[key] = AsyncResult()
+                self.calls += 1
+            else:
+                self.shared += 1
+        finally:
+            self._lock.release()
+        if not leader:
+            return result.get(timeout)
+
+        try:
+            value = func(*args, **kwargs)
+        except:
+            exc_info = sys.exc_info()
+            self._forget(key)
+            result.set_exception(exc_info)
+            raise exc_info[0], exc_info[1], exc_info[2]
+        self._forget(key)
+        result.set_result(value)
+        return value
+
+    def _forget(self, key):
+        self._lock.acquire()
+        try:
+            del self._calls[key]
+        finally:
+            self._lock.release()
+
+    def in_flight(self):
+        self._lock.acquire()
+        try:
+            return len(self._calls)
+        finally:
+            self._lock.release()
@@ -0,0 +1,170 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2007, 2008 MySpace Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import Queue
+import sys
+import threading
+
+__all__ = [
+    'AsyncResult',
+    'ResultTimeout',
+    'WorkerPool',
+    ]
+
+DEFAULT_MAX_WORKERS = 8
+
+class ResultTimeout(Exception):
+    pass
+
+class AsyncResult(object):
+
+    """Handle for a call running on a WorkerPool.
+
+       get() blocks until the call finishes and returns its value or re-raises
+       the exception it raised. Callbacks registered with add_callback are
+       invoked with the AsyncResult once it is done (immediately if it already is).
+    """
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._value = None
+        self._exc_info = None
+
+    def ready(self):
+        return self._event.isSet()
+
+    def successful(self):
+        return self.ready() and self._exc_info is None
+
+    def wait(self, timeout=None):
+        self._event.wait(timeout)
+        return self.ready()
+
+    def get(self, timeout=None):
+        if not self.wait(timeout):
+            raise ResultTimeout('Result not available after %s seconds' % timeout)
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._value
+
+    def exception(self, timeout=None):
+        """Returns the exception raised by the call, or None if it succeeded."""
+        if not self.wait(timeout):
+            raise ResultTimeout('Result not available after %s seconds' % timeout)
+        if self._exc_info is not None:
+            return self._exc_info[1]
+        return None
+
+    def add_callback(self, callback):
+        self._lock.acquire()
+        try:
+            if not self.ready():
+                self._callbacks.append(callback)
+                return
+        finally:
+            self._lock.release()
+        callback(self)
+
+    def set_result(self, value):
+        self._value = value
+        self._finish()
+
+    def set_exception(self, exc_info):
+        self._exc_info = exc_info
+        self._finish()
+
+    def _finish(self):
+        self._lock.acquire()
+        try:
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        finally:
+            self._lock.release()
+        for callback in callbacks:
+            callback(self)
+
+class WorkerPool(object):
+
+    """Bounded pool of daemon threads executing submitted calls.
+
+       Threads are started lazily whenever more calls are queued than there
+       are idle workers, up to max_workers; after that calls wait in the queue
+       until a worker is free.
+    """
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+        if max_workers < 1:
+            raise ValueError('max_workers must be at least 1')
+        self.max_workers = max_workers
+        self._queue = Queue.Queue()
+        self._threads = []
+        self._idle = 0
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def submit(self, func, *args, **kwargs):
+        if self._shutdown:
+            raise RuntimeError('WorkerPool has been shut down')
+        result = AsyncResult()
+        self._queue.put((result, func, args, kwargs))
+        self._lock.acquire()
+        try:
+            if self._queue.qsize() > self._idle and len(self._threads) < self.max_workers:
+                thread = threading.Thread(target=self._work)
+                thread.setDaemon(True)
+                self._threads.append(thread)
+                thread.start()
+        finally:
+            self._lock.release()
+        return result
+
+    def map(self, func, iterable):
+        """Runs func over iterable concurrently and returns the AsyncResults
+           in input order.
+        """
+        return [self.submit(func, item) for item in iterable]
+
+    def shutdown(self, wait=True):
+        self._lock.acquire()
+        try:
+            self._shutdown = True
+            threads = list(self._threads)
+        finally:
+            self._lock.release()
+        for thread in threads:
+            self._queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _work(self):
+        while True:
+            self._lock.acquire()
+            self._idle += 1
+            self._lock.release()
+            job = self._queue.get()
+            self._lock.acquire()
+            self._idle -= 1
+            self._lock.release()
+            if job is None:
+                return
+            result, func, args, kwargs = job
+            try:
+                value = func(*args, **kwargs)
+            except:
+                result.set_exception(sys.exc_info())
+            else:
+                result.set_result(value)
@@ -1,10 +1,17 @@
 import cgi
+import re
 import urllib
 import time
-import random
+import os
+import threading
 import urlparse
 import hmac
 import base64
+try:
+    import hashlib # 2.5
+    sha1 = hashlib.sha1
+except ImportError:
+    import sha as sha1 # deprecated
 
 VERSION = '1.0' # Hi Blaine!
 HTTP_METHOD = 'GET'
@@ -19,9 +26,39 @@ class OAuthError(RuntimeError):
 def build_authenticate_header(realm=''):
     return {'WWW-Authenticate': 'OAuth realm="%s"' % realm}
 
+# strings made of unreserved characters only, which escape() leaves as they are
+_UNRESERVED_RE = re.compile(r'[A-Za-z0-9_.~-]*\Z')
+
+# number of escaped strings remembered by escape(), and the length of the
+# longest one; longer strings (status updates, notification bodies) are
+# rarely escaped twice
+ESCAPE_CACHE_SIZE = 4096
+ESCAPE_CACHE_MAX_LENGTH = 128
+_escaped = {}
+
 # url escape
+# the same names and values (parameter names, consumer key, urls...) are
+# escaped over and over, so the results of short strings are memoized; strings
+# that need no escaping, like nonces and timestamps, are returned right away
 def escape(s):
+    if _UNRESERVED_RE.match(s):
+        return s
+    if len(s) > ESCAPE_CACHE_MAX_LENGTH:
+        return urllib.quote(s, safe='~')
+    try:
+        return _escaped[s]
+    except KeyError:
+        pass
     # escape '/' too
+    escaped = urllib.quote(s, safe='~')
+    if len(_escaped) >= ESCAPE_CACHE_SIZE:
+        _escaped.clear()
+    _escaped[s] = escaped
+    return escaped
+
+# url escape without memoizing, for strings unlikely to be seen again and
+# for secrets, which must not linger in a process wide cache
+def _escape_once(s):
     return urllib.quote(s, safe='~')
 
 # util function: current timestamp
@@ -29,10 +66,109 @@ def escape(s):
 def generate_timestamp():
     return int(time.time())
 
+# ports left out of normalized urls
+DEFAULT_PORTS = {'http': '80', 'https': '443'}
+
+# number of urls whose normalized form is remembered by normalize_http_url()
+NORMALIZED_URL_CACHE_SIZE = 1024
+_normalized_urls = {}
+
+# rebuilds url as scheme://host[:port]/path, the form the signature base string
+# requires: scheme and host lower cased, default port, query and fragment left
+# out. Requests go to a small set of endpoint urls, so the results are memoized
+def normalize_http_url(url):
+    try:
+        return _normalized_urls[url]
+    except KeyError:
+        pass
+    # urlsplit, not urlparse: the path may contain ';' (e.g. a list of ids)
+    scheme, netloc, path = urlparse.urlsplit(url)[:3]
+    scheme = scheme.lower()
+    host, port = urllib.splitport(netloc)
+    host = host.lower()
+    if port and port != DEFAULT_PORTS.get(scheme):
+        host = '%s:%s' % (host, port)
+    normalized = '%s://%s%s' % (scheme, host, path or '/')
+    if len(_normalized_urls) >= NORMALIZED_URL_CACHE_SIZE:
+        _normalized_urls.clear()
+    _normalized_urls[url] = normalized
+    return normalized
+
+# characters per nonce; each carries 6 bits of entropy
+DEFAULT_NONCE_LENGTH = 16
+
+# NonceSource hands out nonces made of random url safe base64 characters,
+# which escape() leaves as they are. os.urandom is read buffer_size bytes at a
+# time rather than once per nonce. Thread safe; after a fork the child process
+# discards the buffer it inherited so that it doesn't repeat the parent's nonces.
+class NonceSource(object):
+
+    def __init__(self, length=DEFAULT_NONCE_LENGTH, buffer_size=12288):
+        self.length = length
+        # a multiple of 3 bytes encodes to base64 without padding
+        self.buffer_size = buffer_size - buffer_size % 3 or 3
+        self._chars = ''
+        self._position = 0
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _take(self, size):
+        # the caller holds the lock
+        pid = os.getpid()
+        if pid != self._pid:
+            self._chars, self._position, self._pid = '', 0, pid
+        chunks = []
+        while size > 0:
+            if self._position >= len(self._chars):
+                self._chars = base64.urlsafe_b64encode(os.urandom(self.buffer_size))
+                self._position = 0
+            chunk = self._chars[self._position:self._position + size]
+            self._position += len(chunk)
+            size -= len(chunk)
+            chunks.append(chunk)
+        return ''.join(chunks)
+
+    def nonce(self, length=None):
+        length = length or self.length
+        self._lock.acquire()
+        try:
+            return self._take(length)
+        finally:
+            self._lock.release()
+
+    def nonces(self, count, length=None):
+        length = length or self.length
+        self._lock.acquire()
+        try:
+            chars = self._take(count * length)
+        finally:
+            self._lock.release()
+        return [chars[i:i + length] for i in xrange(0, count * length, length)]
+
+# the NonceSource used by generate_nonce(s); replace it to change the
+# default length for every request
+nonce_source = NonceSource()
+
 # util function: nonce
-# pseudorandom number
-def generate_nonce(length=8):
-    return ''.join(str(random.randint(0, 9)) for i in range(length))
+# random string of length characters (nonce_source.length by default)
+def generate_nonce(length=None):
+    return nonce_source.nonce(length)
+
+# util function: count distinct nonces at once, for a batch of requests
+# sharing a timestamp
+def generate_nonces(count, length=None):
+    nonces = nonce_source.nonces(count, length)
+    if len(set(nonces)) == count:
+        return nonces
+    # only likely with very short nonces
+    seen = set()
+    unique = []
+    for nonce in nonces:
+        while nonce in seen:
+            nonce = nonce_source.nonce(length)
+        seen.add(nonce)
+        unique.append(nonce)
+    return unique
 
 # OAuthConsumer is a data type that represents the identity of the Consumer
 # via its shared secret with the Service Provider.
@@ -91,6 +227,9 @@ class OAuthRequest(object):
     http_method = HTTP_METHOD
     http_url = None
     version = VERSION
+    # http_url the normalized url was computed for, and the normalized url
+    _normalized_for = None
+    _normalized_url = None
 
     def __init__(self, http_method=HTTP_METHOD, http_url=None, parameters=None):
         self.http_method = http_method
@@ -119,18 +258,33 @@ class OAuthRequest(object):
         return parameters
 
     # serialize as a header for an HTTPAuth request
+    # only the oauth parameters belong in the header, the others stay in the query string or body
     def to_header(self, realm=''):
         auth_header = 'OAuth realm="%s"' % realm
         # add the oauth parameters
         if self.parameters:
             for k, v in self.parameters.iteritems():
-                auth_header += ', %s="%s"' % (k, escape(str(v)))
+                if k.startswith('oauth_'):
+                    auth_header += ', %s="%s"' % (k, escape(str(v)))
         return {'Authorization': auth_header}
 
     # serialize as post data for a POST request
     def to_postdata(self):
         return '&'.join('%s=%s' % (escape(str(k)), escape(str(v))) for k, v in self.parameters.iteritems())
 
+    # serialize in a single pass as (oauth parameters, other parameters), e.g. for
+    # providers expecting the oauth parameters in the query string and the others in the body
+    def to_split_postdata(self):
+        oauth_params = []
+        other_params = []
+        for k, v in self.parameters.iteritems():
+            pair = '%s=%s' % (escape(str(k)), escape(str(v)))
+            if k.startswith('oauth_'):
+                oauth_params.append(pair)
+            else:
+                other_params.append(pair)
+        return '&'.join(oauth_params), '&'.join(other_params)
+
     # serialize as a url for a GET request
     def to_url(self):
         return '%s?%s' % (self.get_normalized_http_url(), self.to_postdata())
@@ -154,10 +308,12 @@ class OAuthRequest(object):
         return self.http_method.upper()
 
     # parses the url and rebuilds it to be scheme://host/path
+    # computed once per request (again if http_url is changed), see normalize_http_url
     def get_normalized_http_url(self):
-        parts = urlparse.urlparse(self.http_url)
-        url_string = '%s://%s%s' % (parts[0], parts[1], parts[2]) # scheme, netloc, path
-        return url_string
+        if self._normalized_for is not self.http_url or self._normalized_url is None:
+            self._normalized_url = normalize_http_url(self.http_url)
+            self._normalized_for = self.http_url
+        return self._normalized_url
         
     # set the signature parameter to the result of build_signature
     def sign_request(self, signature_method, consumer, token):
@@ -261,6 +417,33 @@ class OAuthRequest(object):
         return parameters
 
 # OAuthServer is a worker to check a requests validity against a data store
+# signs a batch of requests made with the same consumer and token
+# requests is a sequence of (http_method, http_url, parameters) tuples; the
+# signed OAuthRequests are returned in the same order, ready for to_url,
+# to_postdata, to_split_postdata or to_header. The oauth parameters are set up
+# once for the whole batch, which shares a timestamp, and the nonces are
+# generated together
+def sign_requests(signature_method, consumer, token, requests):
+    nonces = generate_nonces(len(requests))
+    defaults = {
+        'oauth_consumer_key': consumer.key,
+        'oauth_timestamp': generate_timestamp(),
+        'oauth_version': OAuthRequest.version,
+        'oauth_signature_method': signature_method.get_name(),
+    }
+    signed = []
+    for (http_method, http_url, parameters), nonce in zip(requests, nonces):
+        request_parameters = defaults.copy()
+        request_parameters['oauth_nonce'] = nonce
+        if parameters:
+            request_parameters.update(parameters)
+        if token:
+            request_parameters['oauth_token'] = token.key
+        oauth_request = OAuthRequest(http_method, http_url, request_parameters)
+        request_parameters['oauth_signature'] = oauth_request.build_signature(signature_method, consumer, token)
+        signed.append(oauth_request)
+    return signed
+
 class OAuthServer(object):
     timestamp_threshold = 300 # in seconds, five minutes
     version = VERSION
@@ -476,33 +659,53 @@ class OAuthSignatureMethod(object):
 
 class OAuthSignatureMethod_HMAC_SHA1(OAuthSignatureMethod):
 
+    # number of (consumer secret, token secret) pairs whose keyed hmac is kept
+    max_cached_keys = 1024
+
+    def __init__(self):
+        # (consumer secret, token secret) -> hmac object that has only seen the key
+        self._keyed = {}
+
     def get_name(self):
         return 'HMAC-SHA1'
         
     def build_signature_base_string(self, oauth_request, consumer, token):
+        return self._build_key(consumer, token), self._build_raw(oauth_request)
+
+    def _build_key(self, consumer, token):
+        key = '%s&' % _escape_once(consumer.secret)
+        if token:
+            key += _escape_once(token.secret)
+        return key
+
+    def _build_raw(self, oauth_request):
         sig = (
             escape(oauth_request.get_normalized_http_method()),
             escape(oauth_request.get_normalized_http_url()),
-            escape(oauth_request.get_normalized_parameters()),
+            # different for every request, not worth remembering
+            _escape_once(oauth_request.get_normalized_parameters()),
         )
-
-        key = '%s&' % escape(consumer.secret)
-        if token:
-            key += escape(token.secret)
-        raw = '&'.join(sig)
-        return key, raw
+        return '&'.join(sig)
+
+    # hmac object with the inner and outer key pads of consumer and token already
+    # hashed; callers copy() it rather than keying a new one for every request
+    def _keyed_hmac(self, consumer, token):
+        cache_key = (consumer.secret, token and token.secret)
+        keyed = self._keyed.get(cache_key)
+        if keyed is None:
+            keyed = hmac.new(self._build_key(consumer, token), digestmod=sha1)
+            if len(self._keyed) >= self.max_cached_keys:
+                try:
+                    self._keyed.popitem()
+                except KeyError:
+                    pass
+            self._keyed[cache_key] = keyed
+        return keyed
 
     def build_signature(self, oauth_request, consumer, token):
+        hashed = self._keyed_hmac(consumer, token).copy()
         # build the base signature string
-        key, raw = self.build_signature_base_string(oauth_request, consumer, token)
-
-        # hmac object
-        try:
-            import hashlib # 2.5
-            hashed = hmac.new(key, raw, hashlib.sha1)
-        except:
-            import sha # deprecated
-            hashed = hmac.new(key, raw, sha)
+        hashed.update(self._build_raw(oauth_request))
 
         # calculate the digest base 64
         return base64.b64encode(hashed.digest())
@@ -514,9 +717,9 @@ class OAuthSignatureMethod_PLAINTEXT(OAuthSignatureMethod):
 
     def build_signature_base_string(self, oauth_request, consumer, token):
         # concatenate the consumer key and secret
-        sig = escape(consumer.secret) + '&'
+        sig = _escape_once(consumer.secret) + '&'
         if token:
-            sig = sig + escape(token.secret)
+            sig = sig + _escape_once(token.secret)
         return sig
 
     def build_signature(self, oauth_request, consumer, token):
@@ -11,6 +11,7 @@ import urllib2
 import time
 import cStringIO
 import sys
+import zlib
 
 import openid
 import openid.urinorm
@@ -31,6 +32,7 @@ except ImportError:
 
 USER_AGENT = "python-openid/%s (%s)" % (openid.__version__, sys.platform)
 MAX_RESPONSE_KB = 1024
+ACCEPT_ENCODING = 'gzip, deflate'
 
 def fetch(url, body=None, headers=None):
     """Invoke the fetch method on the default fetcher. Most users
@@ -96,11 +98,18 @@ def usingCurl():
     return isinstance(getDefaultFetcher(), CurlHTTPFetcher)
 
 class HTTPResponse(object):
-    """XXX document attributes"""
+    """XXX document attributes
+
+    @ivar wire_bytes: size of the body as transferred, when the fetcher
+        reports it (it differs from len(body) for compressed responses)
+    @ivar decoded_bytes: size of the body after decompression
+    """
     headers = None
     status = None
     body = None
     final_url = None
+    wire_bytes = None
+    decoded_bytes = None
 
     def __init__(self, final_url=None, status=None, headers=None, body=None):
         self.final_url = final_url
@@ -201,6 +210,7 @@ class Urllib2Fetcher(HTTPFetcher):
         headers.setdefault(
             'Range',
             '0-%s' % (1024*MAX_RESPONSE_KB,))
+        headers.setdefault('Accept-Encoding', ACCEPT_ENCODING)
 
         req = urllib2.Request(url, data=body, headers=headers)
         try:
@@ -217,9 +227,16 @@ class Urllib2Fetcher(HTTPFetcher):
 
     def _makeResponse(self, urllib2_response):
         resp = HTTPResponse()
-        resp.body = urllib2_response.read(MAX_RESPONSE_KB * 1024)
         resp.final_url = urllib2_response.geturl()
         resp.headers = dict(urllib2_response.info().items())
+        encoding = resp.headers.get('content-encoding', '').strip().lower()
+        if encoding in ('gzip', 'x-gzip', 'deflate'):
+            resp.wire_bytes, resp.body = _readCompressed(
+                urllib2_response, encoding, MAX_RESPONSE_KB * 1024)
+        else:
+            resp.body = urllib2_response.read(MAX_RESPONSE_KB * 1024)
+            resp.wire_bytes = len(resp.body)
+        resp.decoded_bytes = len(resp.body)
 
         if hasattr(urllib2_response, 'code'):
             resp.status = urllib2_response.code
@@ -228,6 +245,46 @@ class Urllib2Fetcher(HTTPFetcher):
 
         return resp
 
+def _readCompressed(response, encoding, max_length, chunk_size=8192):
+    """Read and decompress a gzip or deflate encoded body, chunk by
+    chunk, stopping once max_length decoded bytes have been read.
+
+    @returns: (number of compressed bytes read, decoded body)
+    @raises HTTPFetchingError: if the body can't be decoded
+    """
+    if encoding == 'deflate':
+        # zlib wrapped as specified, but some servers send raw deflate
+        wbits = None
+    else:
+        wbits = 16 + zlib.MAX_WBITS
+    decompressor = None
+    wire_bytes = 0
+    parts = []
+    decoded = 0
+    try:
+        while decoded < max_length:
+            data = response.read(chunk_size)
+            if not data:
+                break
+            wire_bytes += len(data)
+            if decompressor is None:
+                if wbits is None:
+                    if (len(data) > 1 and ord(data[0]) & 0x0f == 8
+                        and ((ord(data[0]) << 8) | ord(data[1])) % 31 == 0):
+                        wbits = zlib.MAX_WBITS
+                    else:
+                        wbits = -zlib.MAX_WBITS
+                decompressor = zlib.decompressobj(wbits)
+            part = decompressor.decompress(data, max_length - decoded)
+            parts.append(part)
+            decoded += len(part)
+        if decompressor is not None and decoded < max_length:
+            parts.append(decompressor.flush()[:max_length - decoded])
+    except zlib.error, why:
+        raise HTTPFetchingError(why='Invalid %s response body: %s' %
+                                (encoding, why))
+    return wire_bytes, ''.join(parts)
+
 class HTTPError(HTTPFetchingError):
     """
     This exception is raised by the C{L{CurlHTTPFetcher}} when it
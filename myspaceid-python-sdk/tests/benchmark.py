@@ -0,0 +1,174 @@
+#!/usr/bin/python
+
+"""Benchmarks of the MySpace client against the local FakeMySpaceServer.
+
+   Usage: benchmark.py [--iterations N] [--output FILE] [--only NAME,...]
+
+   Every benchmark reports its throughput and latency percentiles; the
+   results are written as JSON (to stdout by default) so that runs can be
+   compared to catch regressions.
+"""
+
+import optparse
+import platform
+import sys
+import time
+import simplejson
+from oauthlib import oauth
+from myspace.myspaceapi import MySpace, MySpaceApp
+from myspace.instrument import Histogram
+from fake_myspace import FakeMySpaceServer
+
+def bench_sign(env, iterations):
+    """OAuth signing of a GET request, without any I/O."""
+    consumer = oauth.OAuthConsumer('CONSUMER_KEY', 'CONSUMER_SECRET')
+    token = oauth.OAuthToken('TOKEN', 'SECRET')
+    method = oauth.OAuthSignatureMethod_HMAC_SHA1()
+    url = 'http://api.myspace.com/v1/users/1234/friends.json'
+    def sign():
+        request = oauth.OAuthRequest.from_consumer_and_token(consumer, token=token, http_url=url,
+                                                             parameters={'page': 1, 'page_size': 100})
+        request.sign_request(method, consumer, token)
+        request.to_url()
+    return sign, iterations * 10, 1
+
+def bench_sign_batch(env, iterations):
+    """OAuth signing of 100 GET requests with one sign_requests call; items are requests."""
+    consumer = oauth.OAuthConsumer('CONSUMER_KEY', 'CONSUMER_SECRET')
+    token = oauth.OAuthToken('TOKEN', 'SECRET')
+    method = oauth.OAuthSignatureMethod_HMAC_SHA1()
+    batch = [('GET', 'http://api.myspace.com/v1/users/%d/profile.json' % user_id, {'detailtype': 'basic'})
+             for user_id in range(1, 101)]
+    def sign():
+        for request in oauth.sign_requests(method, consumer, token, batch):
+            request.to_url()
+    return sign, max(1, iterations / 10), len(batch)
+
+def bench_new_client(env, iterations):
+    """Constructing a MySpace client per request."""
+    fetcher = env.fetcher
+    return lambda: MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=fetcher), iterations * 10, 1
+
+def bench_app_view(env, iterations):
+    """Getting a per token client from a shared MySpaceApp."""
+    app = MySpaceApp('CONSUMER_KEY', 'CONSUMER_SECRET', url_fetcher=env.fetcher)
+    return lambda: app.for_token('TOKEN', 'SECRET'), iterations * 10, 1
+
+def bench_get_profile(env, iterations):
+    """One get_profile call per operation."""
+    ms = env.client()
+    return lambda: ms.get_profile(1234), iterations, 1
+
+def bench_fetch_many(env, iterations):
+    """fetch_many of 20 profiles per operation."""
+    ms = env.client()
+    specs = [('get_profile', {'user_id': user_id}) for user_id in range(1, 21)]
+    return lambda: ms.fetch_many(specs, max_workers=8), max(1, iterations / 10), len(specs)
+
+def bench_iter_friends(env, iterations):
+    """Paging through the whole friend list with iter_friends; items are friends."""
+    ms = env.client()
+    def run():
+        for friend in ms.iter_friends(1234, page_size=100):
+            pass
+    return run, max(1, iterations / 50), env.server.friend_count
+
+def bench_stream_friends(env, iterations):
+    """Streaming one page of 1000 friends with stream_friends; items are friends."""
+    ms = env.client()
+    def run():
+        for friend in ms.stream_friends(1234, page=1, page_size=1000):
+            pass
+    return run, max(1, iterations / 10), min(1000, env.server.friend_count)
+
+def bench_iter_activities(env, iterations):
+    """Parsing the activities Atom feed incrementally; items are entries."""
+    ms = env.client()
+    def run():
+        for entry in ms.iter_activities(1234):
+            pass
+    return run, max(1, iterations / 10), env.server.activity_count
+
+BENCHMARKS = (
+    ('sign', bench_sign),
+    ('sign_batch', bench_sign_batch),
+    ('new_client', bench_new_client),
+    ('app_view', bench_app_view),
+    ('get_profile', bench_get_profile),
+    ('fetch_many', bench_fetch_many),
+    ('iter_friends', bench_iter_friends),
+    ('stream_friends', bench_stream_friends),
+    ('iter_activities', bench_iter_activities),
+)
+
+class Environment(object):
+
+    def __init__(self, server):
+        self.server = server
+        self.fetcher = server.fetcher()
+
+    def client(self):
+        return MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=self.fetcher)
+
+def run_benchmark(env, setup, iterations):
+    operation, count, items = setup(env, iterations)
+    # warm up connections and caches
+    operation()
+    histogram = Histogram()
+    started = time.time()
+    for i in xrange(count):
+        before = time.time()
+        operation()
+        histogram.add(time.time() - before)
+    elapsed = time.time() - started
+    latency = histogram.snapshot((50, 90, 99))
+    return {
+        'operations': count,
+        'items_per_operation': items,
+        'seconds': elapsed,
+        'operations_per_second': elapsed and count / elapsed or None,
+        'items_per_second': elapsed and count * items / elapsed or None,
+        'latency': latency,
+    }
+
+def run(iterations=200, only=None, friend_count=5000, photo_count=500, activity_count=200):
+    server = FakeMySpaceServer(friend_count=friend_count, photo_count=photo_count, activity_count=activity_count)
+    server.start()
+    try:
+        env = Environment(server)
+        results = {}
+        for name, setup in BENCHMARKS:
+            if only and name not in only:
+                continue
+            results[name] = run_benchmark(env, setup, iterations)
+        env.fetcher.pool.clear()
+    finally:
+        server.stop()
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'iterations': iterations,
+        'benchmarks': results,
+    }
+
+def main(argv):
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('-n', '--iterations', type='int', default=200, help='base number of operations per benchmark')
+    parser.add_option('-o', '--output', help='write the JSON results to this file instead of stdout')
+    parser.add_option('--only', help='comma separated names of the benchmarks to run: ' +
+                      ', '.join([name for name, setup in BENCHMARKS]))
+    options, args = parser.parse_args(argv)
+    only = options.only and options.only.split(',') or None
+    output = simplejson.dumps(run(options.iterations, only), sort_keys=True)
+    if options.output:
+        f = open(options.output, 'w')
+        try:
+            f.write(output + '\n')
+        finally:
+            f.close()
+    else:
+        print output
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
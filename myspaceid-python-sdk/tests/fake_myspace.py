@@ -0,0 +1,335 @@
+"""In-process stand-in for the MySpace REST and OAuth APIs.
+
+   server = FakeMySpaceServer(friend_count=5000)
+   server.start()
+   ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=server.fetcher())
+   ...
+   server.stop()
+
+   The server answers on 127.0.0.1 with generated but realistically shaped and
+   sized payloads (paged friend and photo lists, profiles, Atom activity
+   feeds) and keeps connections alive. Requests without an oauth signature
+   get a 401. server.requests counts the requests served per path. With
+   compress set, responses are gzipped for clients accepting it.
+"""
+
+import BaseHTTPServer
+import SocketServer
+import StringIO
+import cgi
+import gzip
+import re
+import socket
+import sys
+import threading
+import time
+import simplejson
+from myspace.myspaceapi import PooledUrlFetcher
+
+DEFAULT_PAGE_SIZE = 20
+
+def make_friend(user_id):
+    return {
+        'userId': user_id,
+        'name': 'Friend %d' % user_id,
+        'uri': 'http://api.myspace.com/v1/users/%d' % user_id,
+        'webUri': 'http://www.myspace.com/friend%d' % user_id,
+        'image': 'http://c1.ac-images.myspacecdn.com/images01/%d/s_%08x.jpg' % (user_id % 100, user_id),
+        'largeImage': 'http://c1.ac-images.myspacecdn.com/images01/%d/l_%08x.jpg' % (user_id % 100, user_id),
+        'onlineNow': user_id % 7 == 0,
+    }
+
+def make_photo(user_id, photo_id):
+    return {
+        'id': photo_id,
+        'uri': 'http://api.myspace.com/v1/users/%d/photos/%d' % (user_id, photo_id),
+        'imageUri': 'http://c2.ac-images.myspacecdn.com/images02/%d/l_%08x.jpg' % (photo_id % 100, photo_id),
+        'smallImageUri': 'http://c2.ac-images.myspacecdn.com/images02/%d/s_%08x.jpg' % (photo_id % 100, photo_id),
+        'caption': 'Photo number %d "with quotes", commas, [brackets] and {braces}' % photo_id,
+    }
+
+def make_profile(user_id):
+    return {
+        'basicprofile': {
+            'userId': user_id,
+            'name': 'User %d' % user_id,
+            'uri': 'http://api.myspace.com/v1/users/%d' % user_id,
+            'webUri': 'http://www.myspace.com/user%d' % user_id,
+            'image': 'http://c1.ac-images.myspacecdn.com/images01/%d/s_%08x.jpg' % (user_id % 100, user_id),
+            'lastUpdatedDate': '10/1/2008 1:00:00 AM',
+        },
+        'aboutme': 'About user %d. ' % user_id * 20,
+        'age': 20 + user_id % 40,
+        'city': 'Beverly Hills',
+        'country': 'US',
+        'gender': user_id % 2 and 'Male' or 'Female',
+        'interests': ', '.join(['interest %d' % i for i in range(30)]),
+    }
+
+def make_activities_feed(user_id, count):
+    entries = []
+    for i in range(count):
+        # newest first, one entry per hour
+        updated = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(1222819200 - i * 3600))
+        entries.append('''  <entry>
+    <id>tag:myspace.com,2008:activity/%d/%d</id>
+    <title type="text">User %d added a new photo</title>
+    <updated>%s</updated>
+    <published>%s</published>
+    <author><name>User %d</name><uri>http://www.myspace.com/user%d</uri></author>
+    <link rel="alternate" href="http://www.myspace.com/user%d/photos/%d"/>
+    <category term="PhotoAdd"/>
+    <content type="html">&lt;a href="http://www.myspace.com/user%d"&gt;User %d&lt;/a&gt; added a photo</content>
+  </entry>
+''' % (user_id, count - i, user_id, updated, updated, user_id, user_id, user_id, i, user_id, user_id))
+    return '''<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <id>tag:myspace.com,2008:activities/%d</id>
+  <title>Activities of user %d</title>
+  <updated>2008-10-01T00:00:00Z</updated>
+%s</feed>
+''' % (user_id, user_id, ''.join(entries))
+
+def gzip_payload(payload):
+    out = StringIO.StringIO()
+    f = gzip.GzipFile(fileobj=out, mode='wb')
+    f.write(payload)
+    f.close()
+    return out.getvalue()
+
+class _ThreadedHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, server_address, handler_class):
+        BaseHTTPServer.HTTPServer.__init__(self, server_address, handler_class)
+        # keep-alive connection -> thread serving it
+        self._connections = {}
+        self._connections_lock = threading.Lock()
+
+    def process_request_thread(self, request, client_address):
+        self._connections_lock.acquire()
+        try:
+            self._connections[request] = threading.currentThread()
+        finally:
+            self._connections_lock.release()
+        try:
+            SocketServer.ThreadingMixIn.process_request_thread(self, request, client_address)
+        finally:
+            self._connections_lock.acquire()
+            try:
+                self._connections.pop(request, None)
+            finally:
+                self._connections_lock.release()
+
+    def close_connections(self, timeout=5):
+        """Disconnects the keep-alive clients and waits for their threads to end."""
+        self._connections_lock.acquire()
+        try:
+            connections = self._connections.items()
+        finally:
+            self._connections_lock.release()
+        for request, thread in connections:
+            try:
+                request.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+        for request, thread in connections:
+            thread.join(timeout)
+
+    def handle_error(self, request, client_address):
+        # clients that timed out close their end before the response is written
+        if not isinstance(sys.exc_info()[1], socket.error):
+            BaseHTTPServer.HTTPServer.handle_error(self, request, client_address)
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # buffer the response so that it goes out in one write instead of one per
+    # header line, and send the last piece of large bodies right away instead
+    # of holding it back (Nagle) until the client's delayed ACK
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    routes = (
+        ('GET', re.compile(r'^/request_token$'), 'request_token'),
+        ('GET', re.compile(r'^/access_token$'), 'access_token'),
+        ('GET', re.compile(r'^/v1/user\.json$'), 'user'),
+        ('GET', re.compile(r'^/v1/users/(\d+)/profile\.json$'), 'profile'),
+        ('GET', re.compile(r'^/v1/users/(\d+)/friends\.json$'), 'friends'),
+        ('GET', re.compile(r'^/v1/users/(\d+)/friends/([\d;]+)\.json$'), 'friendship'),
+        ('GET', re.compile(r'^/v1/users/(\d+)/photos\.json$'), 'photos'),
+        ('GET', re.compile(r'^/v1/users/(\d+)/albums\.json$'), 'albums'),
+        ('GET', re.compile(r'^/v1/users/(\d+)/status\.json$'), 'status'),
+        ('GET', re.compile(r'^/v1/users/(\d+)/mood\.json$'), 'mood'),
+        ('GET', re.compile(r'^/v1/users/(\d+)/activities\.atom$'), 'activities'),
+        ('GET', re.compile(r'^/v1/users/(\d+)/friends/activities\.atom$'), 'activities'),
+        ('POST', re.compile(r'^/v1/users/(\d+)/albums\.json$'), 'create_album'),
+        ('POST', re.compile(r'^/v1/users/(\d+)/(status|mood)$'), 'update'),
+        ('POST', re.compile(r'^/v1/applications/(\d+)/notifications$'), 'notify'),
+    )
+
+    def do_GET(self):
+        self._dispatch('GET', None)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self._dispatch('POST', self.rfile.read(length))
+
+    def _dispatch(self, method, body):
+        server = self.server.fake
+        if server.latency:
+            time.sleep(server.latency)
+        path, query = (self.path.split('?', 1) + [''])[:2]
+        params = dict([(k, v[0]) for k, v in cgi.parse_qs(query).items()])
+        if body:
+            params.update(dict([(k, v[0]) for k, v in cgi.parse_qs(body).items()]))
+        server.count(path)
+        if 'oauth_signature' not in params and 'oauth_signature' not in (self.headers.get('Authorization') or ''):
+            return self._send(401, 'text/plain', 'Missing oauth signature')
+        for route_method, pattern, name in self.routes:
+            match = pattern.match(path)
+            if match and route_method == method:
+                status, content_type, payload = getattr(server, 'serve_' + name)(params, *match.groups())
+                return self._send(status, content_type, payload)
+        self._send(404, 'text/plain', 'Not found')
+
+    def _send(self, status, content_type, payload):
+        compress = self.server.fake.compress and 'gzip' in (self.headers.get('Accept-Encoding') or '')
+        if compress:
+            payload = gzip_payload(payload)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        if compress:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+class LocalFetcher(PooledUrlFetcher):
+    """Sends the requests for api.myspace.com to a local server instead."""
+
+    def __init__(self, base_url, pool=None):
+        PooledUrlFetcher.__init__(self, pool)
+        self.base_url = base_url
+
+    def open(self, url, body=None, headers=None, connect_timeout=None, read_timeout=None):
+        return PooledUrlFetcher.open(self, url.replace('http://api.myspace.com', self.base_url), body, headers,
+                                     connect_timeout, read_timeout)
+
+class FakeMySpaceServer(object):
+
+    def __init__(self, friend_count=1000, photo_count=200, activity_count=100, latency=0.0, compress=False):
+        self.friend_count = friend_count
+        self.photo_count = photo_count
+        self.activity_count = activity_count
+        self.latency = latency
+        self.compress = compress
+        self.requests = {}
+        self._lock = threading.Lock()
+        self._payloads = {}
+        self._httpd = None
+
+    def start(self):
+        self._httpd = _ThreadedHTTPServer(('127.0.0.1', 0), _Handler)
+        self._httpd.fake = self
+        thread = threading.Thread(target=self._httpd.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._httpd.close_connections()
+
+    def port(self):
+        return self._httpd.server_address[1]
+
+    def base_url(self):
+        return 'http://127.0.0.1:%d' % self.port()
+
+    def fetcher(self, pool=None):
+        return LocalFetcher(self.base_url(), pool)
+
+    def count(self, path):
+        self._lock.acquire()
+        try:
+            self.requests[path] = self.requests.get(path, 0) + 1
+        finally:
+            self._lock.release()
+
+    def total_requests(self):
+        return sum(self.requests.values())
+
+    """Payloads, returned as (status, content type, body)
+    """
+    def _json(self, value, status=200):
+        return status, 'application/json', simplejson.dumps(value)
+
+    def _cached(self, key, build):
+        # payloads are generated once so that the benchmarks measure the client, not this server
+        payload = self._payloads.get(key)
+        if payload is None:
+            payload = self._payloads[key] = build()
+        return payload
+
+    def _page(self, params):
+        page = int(params.get('page') or 1)
+        page_size = int(params.get('page_size') or DEFAULT_PAGE_SIZE)
+        return (page - 1) * page_size, page * page_size
+
+    def serve_request_token(self, params):
+        return 200, 'text/plain', 'oauth_token=REQUESTTOKEN&oauth_token_secret=REQUESTSECRET'
+
+    def serve_access_token(self, params):
+        return 200, 'text/plain', 'oauth_token=ACCESSTOKEN&oauth_token_secret=ACCESSSECRET'
+
+    def serve_user(self, params):
+        return self._json({'userId': 1234, 'userUri': 'http://api.myspace.com/v1/users/1234'})
+
+    def serve_profile(self, params, user_id):
+        return self._cached(('profile', user_id), lambda: self._json(make_profile(int(user_id))))
+
+    def serve_friends(self, params, user_id):
+        start, end = self._page(params)
+        def build():
+            friends = [make_friend(int(user_id) * 100000 + i) for i in range(start, min(end, self.friend_count))]
+            return self._json({'count': self.friend_count, 'Friends': friends,
+                               'user': {'userId': int(user_id), 'name': 'User %s' % user_id}})
+        return self._cached(('friends', user_id, start, end), build)
+
+    def serve_friendship(self, params, user_id, friend_ids):
+        entries = [{'friendId': int(i), 'areFriends': int(i) % 2 == 0} for i in friend_ids.split(';')]
+        return self._json({'friendship': entries})
+
+    def serve_photos(self, params, user_id):
+        start, end = self._page(params)
+        def build():
+            photos = [make_photo(int(user_id), i) for i in range(start, min(end, self.photo_count))]
+            return self._json({'count': self.photo_count, 'photos': photos})
+        return self._cached(('photos', user_id, start, end), build)
+
+    def serve_albums(self, params, user_id):
+        albums = [{'id': i, 'title': 'Album %d' % i, 'photoCount': 20, 'privacy': 'Everyone'} for i in range(10)]
+        return self._json({'count': len(albums), 'albums': albums})
+
+    def serve_status(self, params, user_id):
+        return self._json({'status': 'Benchmarking', 'moodName': 'excited'})
+
+    def serve_mood(self, params, user_id):
+        return self._json({'mood': 'excited', 'moodImageUrl': 'http://x.myspacecdn.com/images/blog/moods/iBrads/excited.gif'})
+
+    def serve_activities(self, params, user_id):
+        feed = self._cached(('activities', user_id), lambda: make_activities_feed(int(user_id), self.activity_count))
+        return 200, 'application/atom+xml', feed
+
+    def serve_create_album(self, params, user_id):
+        return self._json({'albumId': 42, 'title': params.get('title')}, 201)
+
+    def serve_update(self, params, user_id, field):
+        return 200, 'text/plain', ''
+
+    def serve_notify(self, params, app_id):
+        return self._json({'recipients': params.get('recipients', '').split(',')}, 201)
@@ -2,10 +2,24 @@
 
 import test_runner
 import test_myspace_api
+import test_cache
+import test_ratelimit
+import test_retry
+import test_jsonstream
+import test_atom
+import test_crawler
+import test_instrument
+import test_fake_server
+import test_compression
+import test_timeouts
+import test_replay
+import test_oauth
 
 def RunTests():
   runner = test_runner.TestRunner()
-  runner.modules_to_test = [test_myspace_api]
+  runner.modules_to_test = [test_myspace_api, test_cache, test_ratelimit, test_retry, test_jsonstream, test_atom, test_crawler,
+                            test_instrument, test_fake_server, test_compression,
+                            test_timeouts, test_replay, test_oauth]
   runner.RunTests()
 
 if __name__ == '__main__':
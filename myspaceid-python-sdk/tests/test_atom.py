@@ -0,0 +1,81 @@
+import StringIO
+import unittest
+from myspace.myspaceapi import MySpace, MySpaceError, StreamingHTTPResponse
+from myspace.errors import MySpaceTransportError
+from myspace.atom import iter_entries, parse_atom_date
+
+FEED = '''<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <title>Activities</title>
+  <id>tag:myspace.com,2008:/activities/1234</id>
+  <updated>2008-10-02T10:00:00Z</updated>
+  <entry>
+    <id>tag:myspace.com,2008:/activity/3</id>
+    <title>Tom posted a photo</title>
+    <updated>2008-10-02T10:00:00Z</updated>
+    <link rel="alternate" href="http://www.myspace.com/3"/>
+    <author><name>Tom</name><uri>http://www.myspace.com/tom</uri></author>
+    <category term="PhotoAdd"/>
+  </entry>
+  <entry>
+    <id>tag:myspace.com,2008:/activity/2</id>
+    <title>Tom updated his mood</title>
+    <updated>2008-10-02T01:00:00-07:00</updated>
+  </entry>
+  <entry>
+    <id>tag:myspace.com,2008:/activity/1</id>
+    <title>Tom joined a group</title>
+    <updated>2008-10-01T08:00:00Z</updated>
+  </entry>
+</feed>'''
+
+class FeedFetcher(object):
+
+  def __init__(self, feed=FEED):
+      self.feed = feed
+      self.urls = []
+
+  def open(self, url, body=None, headers=None):
+      self.urls.append(url)
+      fp = StringIO.StringIO(self.feed)
+      return StreamingHTTPResponse(url, 200, {}, fp, fp.close)
+
+class IterEntriesTest(unittest.TestCase):
+
+  def test_parses_entries(self):
+      entries = list(iter_entries(StringIO.StringIO(FEED)))
+      self.assertEqual([e.id[-1] for e in entries], ['3', '2', '1'])
+      self.assertEqual(entries[0].title, 'Tom posted a photo')
+      self.assertEqual(entries[0].link, 'http://www.myspace.com/3')
+      self.assertEqual(entries[0].author_name, 'Tom')
+      self.assertEqual(entries[0].categories, ['PhotoAdd'])
+
+  def test_stop_at_id(self):
+      entries = list(iter_entries(StringIO.StringIO(FEED), stop_at_id='tag:myspace.com,2008:/activity/2'))
+      self.assertEqual([e.id[-1] for e in entries], ['3'])
+
+  def test_stop_at_updated(self):
+      entries = list(iter_entries(StringIO.StringIO(FEED), stop_at_updated='2008-10-02T09:00:00Z'))
+      self.assertEqual([e.id[-1] for e in entries], ['3'])
+      entries = list(iter_entries(StringIO.StringIO(FEED), stop_at_updated='2008-10-02T07:59:59Z'))
+      self.assertEqual([e.id[-1] for e in entries], ['3', '2'])
+
+  def test_parse_atom_date(self):
+      self.assertEqual(parse_atom_date('2008-10-02T01:00:00-07:00'), parse_atom_date('2008-10-02T08:00:00Z'))
+      self.assertEqual(parse_atom_date('yesterday'), None)
+
+  def test_iter_friends_activities(self):
+      fetcher = FeedFetcher()
+      ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=fetcher)
+      entries = list(ms.iter_friends_activities(1234, since_id='tag:myspace.com,2008:/activity/1'))
+      self.assertEqual(len(entries), 2)
+      self.assert_('/v1/users/1234/friends/activities.atom?' in fetcher.urls[0])
+
+  def test_malformed_feed(self):
+      feed = FEED.replace('<title>Tom updated his mood</title>', '<title>Tom updated his mood</tilte>')
+      ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=FeedFetcher(feed))
+      try:
+          list(ms.iter_activities(1234))
+          self.fail('MySpaceError not raised')
+      except MySpaceError, e:
+          self.failIf(isinstance(e, MySpaceTransportError))
@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from myspace.myspaceapi import MySpace, HTTPResponse
+from myspace.cache import ResponseCache, MemoryCache, DiskCache, CacheEntry, endpoint_name
+
+class CountingFetcher(object):
+
+  def __init__(self, body='{"name": "Tom"}', headers=None):
+      self.body = body
+      self.headers = headers or {}
+      self.requests = []
+
+  def fetch(self, url, body=None, headers=None):
+      self.requests.append((url, body, headers))
+      if headers and headers.get('If-None-Match') == self.headers.get('etag'):
+          return HTTPResponse(url, 304, dict(self.headers), '')
+      return HTTPResponse(url, 200, dict(self.headers), self.body)
+
+class MemoryCacheTest(unittest.TestCase):
+
+  def test_lru_eviction(self):
+      cache = MemoryCache(max_entries=2)
+      cache.set('a', 1)
+      cache.set('b', 2)
+      cache.get('a')
+      cache.set('c', 3)
+      self.assertEqual(cache.get('a'), 1)
+      self.assertEqual(cache.get('b'), None)
+      self.assertEqual(cache.get('c'), 3)
+      self.assertEqual(len(cache), 2)
+
+class DiskCacheTest(unittest.TestCase):
+
+  def setUp(self):
+      self.directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+      shutil.rmtree(self.directory)
+
+  def test_roundtrip_and_prune(self):
+      cache = DiskCache(self.directory, max_entries=2, prune_interval=1)
+      cache.set('a', CacheEntry({'x': 1}, time.time() + 60))
+      self.assertEqual(cache.get('a').value, {'x': 1})
+      cache.set('b', 2)
+      cache.set('c', 3)
+      self.assertEqual(len(os.listdir(self.directory)), 2)
+
+  def test_corrupt_entry_is_a_miss(self):
+      cache = DiskCache(self.directory)
+      for data in ('not a pickle', 'cmyspace.no_such_module\nEntry\n.', ''):
+          f = open(cache._path('a'), 'wb')
+          f.write(data)
+          f.close()
+          self.assertEqual(cache.get('a'), None)
+          self.failIf(os.path.exists(cache._path('a')))
+      self.assertEqual(cache.get('missing'), None)
+
+class ResponseCacheTest(unittest.TestCase):
+
+  def setUp(self):
+      self.fetcher = CountingFetcher(headers={'etag': '"v1"'})
+      self.cache = ResponseCache()
+      self.ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=self.fetcher, cache=self.cache)
+
+  def test_endpoint_name(self):
+      self.assertEqual(endpoint_name('http://api.myspace.com/v1/users/1234/profile.json'), 'profile')
+      self.assertEqual(endpoint_name('http://api.myspace.com/v1/users/1234/albums/5/photos.json'), 'albums/photos')
+
+  def test_fresh_entries_are_served_from_cache(self):
+      self.assertEqual(self.ms.get_profile(1234), {'name': 'Tom'})
+      self.assertEqual(self.ms.get_profile(1234), {'name': 'Tom'})
+      self.assertEqual(len(self.fetcher.requests), 1)
+
+  def test_token_is_part_of_the_key(self):
+      other = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN2', 'SECRET2', url_fetcher=self.fetcher, cache=self.cache)
+      self.ms.get_profile(1234)
+      other.get_profile(1234)
+      self.assertEqual(len(self.fetcher.requests), 2)
+
+  def test_expired_entries_are_revalidated(self):
+      self.cache.ttls['profile'] = -1
+      self.ms.get_profile(1234)
+      self.assertEqual(self.ms.get_profile(1234), {'name': 'Tom'})
+      self.assertEqual(self.fetcher.requests[1][2]['If-None-Match'], '"v1"')
+
+  def test_writes_invalidate_the_user(self):
+      self.ms.get_status(1234)
+      self.ms.set_status(1234, 'busy')
+      self.ms.get_status(1234)
+      self.assertEqual(len(self.fetcher.requests), 3)
+
+  def test_generations_bounded(self):
+      cache = ResponseCache(max_generations=3)
+      self.ms.cache = cache
+      self.ms.get_status(1234)
+      for user_id in range(3):
+          cache.invalidate_user(user_id)
+      self.ms.get_status(1234)
+      self.assertEqual(len(self.fetcher.requests), 1)
+      cache.invalidate_user(99)
+      self.assertEqual(len(cache._generations), 1)
+      # entries cached before the generations were forgotten are not served
+      self.ms.get_status(1234)
+      self.assertEqual(len(self.fetcher.requests), 2)
@@ -0,0 +1,129 @@
+import unittest
+import zlib
+import StringIO
+from myspace.compression import DecodingError, DecodingReader, decode_body, is_compressed
+from myspace.errors import MySpaceTransportError
+from myspace.myspaceapi import MySpace, PooledUrlFetcher, StreamingHTTPResponse, UrlFetcher
+from myspace.instrument import HistogramObserver
+from openid import fetchers
+from fake_myspace import FakeMySpaceServer, gzip_payload
+
+BODY = '{"Friends": [%s]}' % ', '.join(['{"userId": %d}' % i for i in range(2000)])
+
+def raw_deflate(data):
+  compressor = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+  return compressor.compress(data) + compressor.flush()
+
+class SlowReader(object):
+  """File-like object returning at most 7 bytes per read."""
+
+  def __init__(self, data):
+      self.data = StringIO.StringIO(data)
+
+  def read(self, size=-1):
+      return self.data.read(min(7, size < 0 and 7 or size))
+
+class DecodeTest(unittest.TestCase):
+
+  def test_encodings(self):
+      self.assertEqual(decode_body(gzip_payload(BODY), {'content-encoding': 'gzip'}), BODY)
+      self.assertEqual(decode_body(zlib.compress(BODY), {'content-encoding': 'deflate'}), BODY)
+      self.assertEqual(decode_body(raw_deflate(BODY), {'content-encoding': 'deflate'}), BODY)
+      self.assertEqual(decode_body(BODY, {}), BODY)
+      self.failIf(is_compressed({'content-encoding': 'identity'}))
+
+  def test_corrupt_body(self):
+      self.assertRaises(DecodingError, decode_body, 'not gzip at all', {'content-encoding': 'gzip'})
+
+  def test_incremental_reader(self):
+      for encoded, encoding in ((gzip_payload(BODY), 'gzip'), (raw_deflate(BODY), 'deflate')):
+          reader = DecodingReader(SlowReader(encoded), {'content-encoding': encoding})
+          parts = []
+          while True:
+              part = reader.read(100)
+              if not part:
+                  break
+              self.assert_(len(part) <= 100)
+              parts.append(part)
+          self.assertEqual(''.join(parts), BODY)
+          self.assertEqual(reader.wire_bytes, len(encoded))
+          self.assertEqual(reader.decoded_bytes, len(BODY))
+
+class CorruptStreamFetcher(object):
+  """Streams a gzipped friends page whose compressed data is damaged past its start."""
+
+  def open(self, url, body=None, headers=None):
+      encoded = gzip_payload(BODY)
+      encoded = encoded[:200] + 'x' * 100 + encoded[300:]
+      headers = {'content-encoding': 'gzip'}
+      fp = DecodingReader(SlowReader(encoded), headers)
+      return StreamingHTTPResponse(url, 200, headers, fp, fp.close)
+
+class CorruptStreamTest(unittest.TestCase):
+
+  def test_stream_friends(self):
+      ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=CorruptStreamFetcher())
+      friends = []
+      try:
+          for friend in ms.stream_friends(1234):
+              friends.append(friend)
+          self.fail('MySpaceTransportError not raised')
+      except MySpaceTransportError, e:
+          self.failUnless(isinstance(e.cause, DecodingError))
+      self.failUnless(len(friends) < 2000)
+
+class CompressedFetchTest(unittest.TestCase):
+
+  def setUp(self):
+      self.server = FakeMySpaceServer(friend_count=500, compress=True).start()
+      self.fetcher = self.server.fetcher()
+
+  def tearDown(self):
+      self.fetcher.pool.clear()
+      self.server.stop()
+
+  def test_pooled_fetcher(self):
+      observer = HistogramObserver()
+      ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=self.fetcher, observer=observer)
+      self.assertEqual(len(ms.get_friends(1234, page_size=500)['Friends']), 500)
+      self.assertEqual(len(list(ms.stream_friends(1234, page_size=500))), 500)
+      self.assertEqual(self.fetcher.pool.idle_count(), 1)
+      # the streamed call is recorded under its endpoint too
+      stats = observer.snapshot()['get_friends']
+      self.assertEqual(stats['calls'], 2)
+      self.assert_(stats['bytes_received'] * 5 < stats['bytes_decoded'], stats)
+
+  def test_url_fetcher(self):
+      url = self.server.base_url() + '/v1/users/1234/friends.json?page_size=500&oauth_signature=x'
+      resp = UrlFetcher().fetch(url)
+      self.assertEqual(resp.decoded_bytes, len(resp.body))
+      self.assert_(resp.wire_bytes * 5 < resp.decoded_bytes)
+      streamed = UrlFetcher().open(url)
+      try:
+          self.assertEqual(streamed.read(), resp.body)
+          self.assertEqual(streamed.wire_bytes, resp.wire_bytes)
+      finally:
+          streamed.close()
+
+  def test_uncompressed_when_disabled(self):
+      fetcher = PooledUrlFetcher()
+      fetcher.accept_encoding = None
+      resp = fetcher.fetch(self.server.base_url() + '/v1/users/1234/profile.json?oauth_signature=x')
+      self.assertEqual(resp.wire_bytes, resp.decoded_bytes)
+      fetcher.pool.clear()
+
+  def test_openid_fetcher(self):
+      fetcher = fetchers.Urllib2Fetcher()
+      resp = fetcher.fetch(self.server.base_url() + '/v1/users/1234/friends.json?page_size=500&oauth_signature=x')
+      self.assertEqual(resp.status, 200)
+      self.assert_(resp.body.startswith('{'))
+      self.assert_(resp.wire_bytes * 5 < resp.decoded_bytes)
+
+class OpenIdReadCompressedTest(unittest.TestCase):
+
+  def test_limit(self):
+      wire_bytes, body = fetchers._readCompressed(StringIO.StringIO(gzip_payload(BODY)), 'gzip', 100)
+      self.assertEqual(body, BODY[:100])
+      wire_bytes, body = fetchers._readCompressed(StringIO.StringIO(zlib.compress(BODY)), 'deflate', 10 ** 6)
+      self.assertEqual(body, BODY)
+      self.assertRaises(fetchers.HTTPFetchingError, fetchers._readCompressed, StringIO.StringIO('junk'), 'gzip', 100)
@@ -0,0 +1,148 @@
+import os
+import re
+import shutil
+import tempfile
+import unittest
+import cgi
+import StringIO
+import simplejson
+from myspace.myspaceapi import MySpace, HTTPResponse
+from myspace.crawler import FriendGraphCrawler, VisitedSet, write_edge_list
+
+GRAPH = {
+    1: [2, 3],
+    2: [1, 4, 5],
+    3: [1, 5],
+    4: [2, 6],
+    5: [2, 3],
+    6: [4],
+}
+
+class GraphFetcher(object):
+  """Serves the friend lists and friendships of GRAPH, failing for the users in private and
+     adding an entry without userId to the lists of the users in malformed.
+  """
+
+  friends_re = re.compile(r'/v1/users/(\d+)/friends\.json')
+  friendship_re = re.compile(r'/v1/users/(\d+)/friends/([\d;]+)\.json')
+
+  def __init__(self, private=(), malformed=()):
+      self.private = private
+      self.malformed = malformed
+      self.friend_requests = []
+      self.friendship_requests = []
+
+  def fetch(self, url, body=None, headers=None):
+      path, query = url.replace('http://api.myspace.com', '').split('?', 1)
+      match = self.friends_re.match(path)
+      if match:
+          user_id = int(match.group(1))
+          self.friend_requests.append(user_id)
+          if user_id in self.private:
+              return HTTPResponse(url, 401, {}, '')
+          params = cgi.parse_qs(query)
+          page, page_size = int(params['page'][0]), int(params['page_size'][0])
+          friends = GRAPH.get(user_id, [])
+          page_ids = friends[(page - 1) * page_size:page * page_size]
+          response = {'count': len(friends), 'Friends': [{'userId': i} for i in page_ids]}
+          if user_id in self.malformed:
+              response['Friends'].append({'name': 'no id'})
+          return HTTPResponse(url, 200, {}, simplejson.dumps(response))
+      match = self.friendship_re.match(path)
+      user_id, friend_ids = int(match.group(1)), match.group(2).split(';')
+      self.friendship_requests.append(friend_ids)
+      entries = [{'friendId': int(i), 'areFriends': int(i) in GRAPH.get(user_id, [])} for i in friend_ids]
+      return HTTPResponse(url, 200, {}, simplejson.dumps({'friendship': entries}))
+
+class VisitedSetTest(unittest.TestCase):
+
+  def test_add_and_contains(self):
+      visited = VisitedSet()
+      self.assert_(visited.add(5))
+      self.failIf(visited.add(5))
+      self.assert_(visited.add(10 ** 9))
+      self.assert_(5 in visited)
+      self.assert_(10 ** 9 in visited)
+      self.failIf(6 in visited)
+      self.assertEqual(len(visited), 2)
+      self.assertRaises(ValueError, visited.add, -1)
+
+class FriendGraphCrawlerTest(unittest.TestCase):
+
+  def setUp(self):
+      self.directory = tempfile.mkdtemp()
+      self.fetcher = GraphFetcher()
+      self.ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=self.fetcher)
+
+  def tearDown(self):
+      shutil.rmtree(self.directory)
+
+  def test_breadth_first(self):
+      crawler = FriendGraphCrawler(self.ms, depth=2, max_workers=2, page_size=2)
+      edges = list(crawler.crawl([1]))
+      self.assertEqual(edges, [(1, 2), (1, 3), (2, 1), (2, 4), (2, 5), (3, 1), (3, 5)])
+      self.assertEqual(self.fetcher.friend_requests.count(2), 2)
+
+  def test_each_user_expanded_once(self):
+      crawler = FriendGraphCrawler(self.ms, depth=4, max_workers=3)
+      edges = list(crawler.crawl([1, 2]))
+      self.assertEqual(sorted(self.fetcher.friend_requests), [1, 2, 3, 4, 5, 6])
+      self.assertEqual(len(edges), sum([len(friends) for friends in GRAPH.values()]))
+
+  def test_errors_are_skipped(self):
+      self.fetcher.private = (2,)
+      crawler = FriendGraphCrawler(self.ms, depth=2)
+      edges = list(crawler.crawl([1]))
+      self.assertEqual(edges, [(1, 2), (1, 3), (3, 1), (3, 5)])
+      self.assertEqual([user_id for user_id, error in crawler.errors], [2])
+
+  def test_malformed_lists_are_skipped(self):
+      self.fetcher.malformed = (2,)
+      crawler = FriendGraphCrawler(self.ms, depth=2)
+      edges = list(crawler.crawl([1]))
+      self.assertEqual(edges, [(1, 2), (1, 3), (3, 1), (3, 5)])
+      self.assertEqual([user_id for user_id, error in crawler.errors], [2])
+      self.failUnless(isinstance(crawler.errors[0][1], KeyError))
+
+  def test_resume_from_checkpoint(self):
+      path = os.path.join(self.directory, 'crawl.ckpt')
+      crawler = FriendGraphCrawler(self.ms, depth=3, checkpoint_path=path, checkpoint_interval=1)
+      crawl = crawler.crawl([1])
+      first = [crawl.next() for i in range(4)]
+      crawl.close()
+      self.assertEqual(first, [(1, 2), (1, 3), (2, 1), (2, 4)])
+
+      resumed = FriendGraphCrawler(self.ms, depth=3, checkpoint_path=path)
+      rest = list(resumed.crawl([]))
+      # user 2 was not fully written out when the crawl stopped, its edges come again
+      self.assertEqual(rest[:3], [(2, 1), (2, 4), (2, 5)])
+      complete = list(FriendGraphCrawler(self.ms, depth=3).crawl([1]))
+      self.assertEqual(first[:2] + rest, complete)
+
+  def test_checkpoint_removed_when_done(self):
+      path = os.path.join(self.directory, 'crawl.ckpt')
+      crawler = FriendGraphCrawler(self.ms, depth=2, checkpoint_path=path, checkpoint_interval=1)
+      self.assertEqual(list(crawler.crawl([1])), [(1, 2), (1, 3), (2, 1), (2, 4), (2, 5), (3, 1), (3, 5)])
+      self.failIf(os.path.exists(path))
+      crawler = FriendGraphCrawler(self.ms, depth=2, checkpoint_path=path, checkpoint_interval=1)
+      self.assertEqual(list(crawler.crawl([6])), [(6, 4), (4, 2), (4, 6)])
+
+  def test_checkpoint_of_other_depth(self):
+      path = os.path.join(self.directory, 'crawl.ckpt')
+      crawl = FriendGraphCrawler(self.ms, depth=3, checkpoint_path=path, checkpoint_interval=1).crawl([1])
+      for i in range(3):
+          crawl.next()
+      crawl.close()
+      self.failUnless(os.path.exists(path))
+      self.assertRaises(ValueError, list, FriendGraphCrawler(self.ms, depth=2, checkpoint_path=path).crawl([1]))
+
+  def test_check_friendships(self):
+      crawler = FriendGraphCrawler(self.ms, max_workers=2)
+      result = list(crawler.check_friendships(2, [1, 3, 4, 5, 6], batch_size=2))
+      self.assertEqual(result, [('1', True), ('3', False), ('4', True), ('5', True), ('6', False)])
+      self.assertEqual(self.fetcher.friendship_requests, [['1', '3'], ['4', '5'], ['6']])
+
+  def test_write_edge_list(self):
+      out = StringIO.StringIO()
+      self.assertEqual(write_edge_list([(1, 2), (2, 3)], out), 2)
+      self.assertEqual(out.getvalue(), '1\t2\n2\t3\n')
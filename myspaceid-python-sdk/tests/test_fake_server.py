@@ -0,0 +1,56 @@
+import unittest
+from myspace.myspaceapi import MySpace, MySpaceError
+import benchmark
+from fake_myspace import FakeMySpaceServer
+
+class FakeServerTest(unittest.TestCase):
+  """End to end tests of the client against the local stand-in server."""
+
+  def setUp(self):
+      self.server = FakeMySpaceServer(friend_count=250, photo_count=45, activity_count=30).start()
+      self.fetcher = self.server.fetcher()
+      self.ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=self.fetcher)
+
+  def tearDown(self):
+      self.fetcher.pool.clear()
+      self.server.stop()
+
+  def test_oauth_flow(self):
+      ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', url_fetcher=self.fetcher)
+      request_token = ms.get_request_token()
+      self.assertEqual(request_token.key, 'REQUESTTOKEN')
+      access_token = ms.get_access_token(request_token)
+      self.assertEqual(access_token.secret, 'ACCESSSECRET')
+
+  def test_rest_calls(self):
+      self.assertEqual(self.ms.get_userid(), 1234)
+      self.assertEqual(self.ms.get_profile(1234)['basicprofile']['userId'], 1234)
+      self.assertEqual(self.ms.set_status(1234, 'hello'), '')
+      self.assertEqual(self.ms.create_album(1234, 'title')['albumId'], 42)
+      self.assertRaises(MySpaceError, self.ms.get_video, 1234, 5)
+
+  def test_paging_and_streaming(self):
+      self.assertEqual(len(list(self.ms.iter_friends(1234, page_size=100))), 250)
+      self.assertEqual(len(list(self.ms.iter_photos(1234, page_size=20))), 45)
+      self.assertEqual(len(list(self.ms.stream_friends(1234, page=1, page_size=100))), 100)
+      self.assertEqual(len(list(self.ms.iter_activities(1234))), 30)
+
+  def test_batch_and_fan_out(self):
+      results = self.ms.fetch_many([('get_profile', {'user_id': i}) for i in range(1, 11)])
+      self.assertEqual([r['basicprofile']['userId'] for r in results], range(1, 11))
+      report = self.ms.send_notifications(1, xrange(250), 'content', chunk_size=100)
+      self.assert_(report.ok())
+      self.assertEqual(self.server.requests['/v1/applications/1/notifications'], 3)
+
+  def test_header_auth(self):
+      ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=self.fetcher, auth_mode='header')
+      self.assertEqual(ms.get_userid(), 1234)
+
+class BenchmarkTest(unittest.TestCase):
+
+  def test_results(self):
+      results = benchmark.run(iterations=10, friend_count=200, photo_count=20, activity_count=10)
+      self.assertEqual(sorted(results['benchmarks'].keys()), sorted([name for name, setup in benchmark.BENCHMARKS]))
+      for name, result in results['benchmarks'].iteritems():
+          self.assert_(result['operations'] > 0, name)
+          self.assert_(result['latency']['p99'] >= result['latency']['p50'], name)
@@ -0,0 +1,91 @@
+import unittest
+from myspace.myspaceapi import MySpace, MySpaceError, HTTPResponse
+from myspace.instrument import Histogram, HistogramObserver, Observer
+from myspace.retry import RetryPolicy
+
+class ScriptedFetcher(object):
+  """Returns the scripted statuses in order, with fetcher timings."""
+
+  def __init__(self, statuses, body='{"name": "Tom"}'):
+      self.statuses = list(statuses)
+      self.body = body
+
+  def fetch(self, url, body=None, headers=None):
+      resp = HTTPResponse(url, self.statuses.pop(0), {}, self.body)
+      resp.timings = {'connect': 0.01, 'ttfb': 0.02, 'read': 0.001}
+      return resp
+
+class RecordingObserver(Observer):
+
+  def __init__(self):
+      self.records = []
+
+  def call_finished(self, record):
+      self.records.append(record)
+
+class HistogramTest(unittest.TestCase):
+
+  def test_percentiles(self):
+      histogram = Histogram()
+      for i in range(1, 101):
+          histogram.add(i / 1000.0)
+      self.assertEqual(histogram.count, 100)
+      self.assertAlmostEqual(histogram.snapshot()['mean'], 0.0505)
+      for percent in (50, 90, 99):
+          value = histogram.percentile(percent)
+          self.assert_(abs(value - percent / 1000.0) <= percent / 1000.0 * 0.05, (percent, value))
+      self.assertEqual(histogram.percentile(100), 0.1)
+
+  def test_empty(self):
+      self.assertEqual(Histogram().percentile(50), None)
+      histogram = Histogram()
+      histogram.add(0)
+      self.assertEqual(histogram.percentile(50), 0)
+
+class ObserverTest(unittest.TestCase):
+
+  def test_call_record(self):
+      observer = RecordingObserver()
+      ms = MySpace('KEY', 'SECRET', 'TOKEN', 'SECRET', url_fetcher=ScriptedFetcher([200]), observer=observer)
+      ms.get_profile(1234)
+      record = observer.records[0]
+      self.assertEqual(record.endpoint, 'get_profile')
+      self.assertEqual(record.status, 200)
+      self.assertEqual(record.attempts, 1)
+      self.assertEqual(record.bytes_received, len('{"name": "Tom"}'))
+      self.assertEqual(record.error, None)
+      for phase in ('sign', 'connect', 'ttfb', 'read', 'decode', 'total'):
+          self.assert_(phase in record.timings, phase)
+      self.assert_(record.timings['total'] >= record.timings['sign'])
+
+  def test_retries_and_errors(self):
+      observer = RecordingObserver()
+      policy = RetryPolicy(max_attempts=2, jitter=False, sleep=lambda seconds: None)
+      ms = MySpace('KEY', 'SECRET', 'TOKEN', 'SECRET', url_fetcher=ScriptedFetcher([503, 503]), retry_policy=policy,
+                   observer=observer)
+      self.assertRaises(MySpaceError, ms.get_profile, 1234)
+      record = observer.records[0]
+      self.assertEqual(record.retries(), 1)
+      self.assertEqual(record.status, 503)
+      self.assert_(isinstance(record.error, MySpaceError))
+      self.assertAlmostEqual(record.timings['ttfb'], 0.04)
+
+  def test_histogram_observer(self):
+      observer = HistogramObserver()
+      ms = MySpace('KEY', 'SECRET', 'TOKEN', 'SECRET', url_fetcher=ScriptedFetcher([200, 200, 404]), observer=observer)
+      ms.get_profile(1234)
+      ms.get_status(1234)
+      self.assertRaises(MySpaceError, ms.get_profile, 1234)
+      snapshot = observer.snapshot()
+      self.assertEqual(snapshot['get_profile']['calls'], 2)
+      self.assertEqual(snapshot['get_profile']['errors'], 1)
+      self.assertEqual(snapshot['get_profile']['statuses'], {200: 1, 404: 1})
+      self.assertEqual(snapshot['get_profile']['ttfb']['count'], 2)
+      self.assert_(snapshot['get_status']['total']['p99'] is not None)
+      observer.reset()
+      self.assertEqual(observer.snapshot(), {})
+
+  def test_no_observer(self):
+      ms = MySpace('KEY', 'SECRET', 'TOKEN', 'SECRET', url_fetcher=ScriptedFetcher([200]))
+      self.assertEqual(ms.observer, None)
+      self.assertEqual(ms.get_profile(1234), {'name': 'Tom'})
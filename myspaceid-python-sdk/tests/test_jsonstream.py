@@ -0,0 +1,28 @@
+import StringIO
+import unittest
+import simplejson
+from myspace.jsonstream import TruncatedStreamError, iter_array_items
+
+class IterArrayItemsTest(unittest.TestCase):
+
+  def setUp(self):
+      self.doc = simplejson.dumps({'count': 4,
+                                   'user': {'Friends': ['nested, not top level']},
+                                   'note': 'tricky "[" , "]" \\ text',
+                                   'Friends': [{'name': 'a,b]"', 'photos': [1, {'y': 2}]}, 7, 'str', {'mood': u'é'}]})
+
+  def test_yields_entries_for_any_chunk_size(self):
+      expected = simplejson.loads(self.doc)['Friends']
+      for chunk_size in (1, 2, 3, 7, 64, 8192):
+          items = list(iter_array_items(StringIO.StringIO(self.doc), 'friends', chunk_size))
+          self.assertEqual(items, expected)
+
+  def test_empty_and_missing_arrays(self):
+      self.assertEqual(list(iter_array_items(StringIO.StringIO('{"photos": []}'), 'photos')), [])
+      self.assertEqual(list(iter_array_items(StringIO.StringIO('{"albums": [1]}'), 'photos')), [])
+
+  def test_truncated_stream(self):
+      stream = StringIO.StringIO('{"photos": [{"id": 1}, {"id": ')
+      self.assertRaises(TruncatedStreamError, list, iter_array_items(stream, 'photos', 4))
+      stream = StringIO.StringIO('{"photos": [{"id": "unterminated')
+      self.assertRaises(TruncatedStreamError, list, iter_array_items(stream, 'photos', 4))
@@ -1,5 +1,83 @@
 import unittest
-from myspace.myspaceapi import MySpace, MySpaceError
+import cgi
+import errno
+import httplib
+import socket
+import StringIO
+import threading
+import BaseHTTPServer
+import SocketServer
+import simplejson
+from myspace.myspaceapi import MySpace, AsyncMySpace, MySpaceApp, MySpaceError, PooledUrlFetcher, HTTPResponse, \
+     StreamingHTTPResponse
+from myspace.errors import MySpaceTransportError, MySpaceTimeoutError
+from myspace.retry import CircuitBreaker
+from myspace.connpool import ConnectionPool
+from myspace.workers import WorkerPool
+from oauthlib import oauth
+
+class FakeFetcher(object):
+  """Serves canned JSON bodies keyed by URL path and records the requested URLs."""
+
+  def __init__(self, responses=None, status=200):
+      self.responses = responses or {}
+      self.status = status
+      self.requests = []
+
+  def fetch(self, url, body=None, headers=None):
+      self.requests.append((url, body, headers))
+      path = url.split('?')[0].replace('http://api.myspace.com', '')
+      return HTTPResponse(url, self.status, {}, self.responses.get(path, '{}'))
+
+class KeepAliveHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+
+  def do_GET(self):
+      body = '{"port": %d}' % self.client_address[1]
+      self.send_response(200)
+      self.send_header('Content-Type', 'application/json')
+      self.send_header('Content-Length', str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+  def log_message(self, *args):
+      pass
+
+class OneRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  """Keeps connections alive but drops them, unanswered, at their second request."""
+  protocol_version = 'HTTP/1.1'
+  received = []
+
+  def do_GET(self):
+      self.serve()
+
+  def do_POST(self):
+      self.rfile.read(int(self.headers['Content-Length']))
+      self.serve()
+
+  def serve(self):
+      self.received.append(self.command)
+      if getattr(self, 'served', False):
+          self.close_connection = 1
+          return
+      self.served = True
+      self.send_response(200)
+      self.send_header('Content-Length', '2')
+      self.end_headers()
+      self.wfile.write('{}')
+
+  def log_message(self, *args):
+      pass
+
+class ThreadedHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+  daemon_threads = True
+
+def start_server(handler_class):
+  server = ThreadedHTTPServer(('127.0.0.1', 0), handler_class)
+  thread = threading.Thread(target=server.serve_forever)
+  thread.setDaemon(True)
+  thread.start()
+  return server
 
 class ApiParameterValidationTest(unittest.TestCase):
 
@@ -57,4 +135,532 @@ class ApiParameterValidationTest(unittest.TestCase):
       self.assertRaises(MySpaceError, self.ms.get_videos, user_id)
       self.assertRaises(MySpaceError, self.ms.get_video, user_id, video_id)
 
-  
\ No newline at end of file
+class PooledUrlFetcherTest(unittest.TestCase):
+
+  def setUp(self):
+      self.server = start_server(KeepAliveHandler)
+      self.url = 'http://127.0.0.1:%d/v1/user.json' % self.server.server_port
+
+  def tearDown(self):
+      self.server.shutdown()
+      self.server.server_close()
+
+  def test_connection_is_reused(self):
+      fetcher = PooledUrlFetcher()
+      first = fetcher.fetch(self.url)
+      second = fetcher.fetch(self.url)
+      self.assertEqual(first.status, 200)
+      self.assertEqual(first.body, second.body)
+      self.assertEqual(fetcher.pool.idle_count(), 1)
+
+  def test_idle_timeout_discards_connection(self):
+      fetcher = PooledUrlFetcher(ConnectionPool(idle_timeout=-1))
+      first = fetcher.fetch(self.url)
+      second = fetcher.fetch(self.url)
+      self.assertNotEqual(first.body, second.body)
+
+  def test_timings(self):
+      fetcher = PooledUrlFetcher()
+      first = fetcher.fetch(self.url)
+      second = fetcher.fetch(self.url)
+      self.assertEqual(sorted(first.timings.keys()), ['connect', 'read', 'ttfb'])
+      # the second request reuses the connection
+      self.assertEqual(sorted(second.timings.keys()), ['read', 'ttfb'])
+
+  def test_dropped_connection_retried_for_get_only(self):
+      server = start_server(OneRequestHandler)
+      OneRequestHandler.received = []
+      url = 'http://127.0.0.1:%d/v1/user.json' % server.server_port
+      try:
+          fetcher = PooledUrlFetcher()
+          fetcher.fetch(url)
+          self.assertEqual(fetcher.fetch(url).status, 200)
+          self.assertEqual(OneRequestHandler.received, ['GET', 'GET', 'GET'])
+          self.assertRaises(httplib.HTTPException, fetcher.fetch, url, 'status=posted')
+          self.assertEqual(OneRequestHandler.received, ['GET', 'GET', 'GET', 'POST'])
+      finally:
+          server.shutdown()
+          server.server_close()
+
+  def test_fetcher_is_shared_between_clients(self):
+      fetcher = PooledUrlFetcher()
+      ms1 = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN1', 'SECRET1', url_fetcher=fetcher)
+      ms2 = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN2', 'SECRET2', url_fetcher=fetcher)
+      self.assert_(ms1.url_fetcher is ms2.url_fetcher)
+
+class AsyncMySpaceTest(unittest.TestCase):
+
+  def setUp(self):
+      self.fetcher = FakeFetcher({'/v1/users/1234/profile.json': '{"name": "Tom"}',
+                                  '/v1/users/1234/status.json': '{"status": "busy"}'})
+      self.ams = AsyncMySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET',
+                              url_fetcher=self.fetcher, worker_pool=WorkerPool(4))
+
+  def tearDown(self):
+      self.ams.worker_pool.shutdown()
+
+  def test_results_are_delivered(self):
+      profile = self.ams.get_profile(1234)
+      status = self.ams.get_status(1234)
+      self.assertEqual(profile.get(5), {'name': 'Tom'})
+      self.assertEqual(status.get(5), {'status': 'busy'})
+      self.assertEqual(len(self.fetcher.requests), 2)
+
+  def test_validation_error_is_raised_by_get(self):
+      result = self.ams.get_friends(1234, list='junk')
+      self.assertRaises(MySpaceError, result.get, 5)
+
+  def test_mirrors_every_wrapper(self):
+      for name in ('get_albums', 'get_friends_activities_atom', 'set_mood', 'send_notification'):
+          self.assert_(callable(getattr(self.ams, name)))
+
+class FetchManyTest(unittest.TestCase):
+
+  def setUp(self):
+      self.fetcher = FakeFetcher({'/v1/users/1234/profile.json': '{"name": "Tom"}',
+                                  '/v1/users/1234/status.json': '{"status": "busy"}',
+                                  '/v1/users/1234/mood.json': '{"mood": "happy"}'})
+      self.ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=self.fetcher)
+
+  def test_results_in_input_order(self):
+      results = self.ms.fetch_many([('get_profile', {'user_id': 1234}),
+                                    ('get_status', {'user_id': 1234}),
+                                    ('get_mood', {'user_id': 1234})])
+      self.assertEqual(results, [{'name': 'Tom'}, {'status': 'busy'}, {'mood': 'happy'}])
+
+  def test_per_item_errors(self):
+      results = self.ms.fetch_many([('get_profile', {'user_id': 1234}),
+                                    ('get_friends', {'user_id': 1234, 'list': 'junk'}),
+                                    ('get_nothing', None),
+                                    ('get_status', {'user_id': 1234})])
+      self.assertEqual(results[0], {'name': 'Tom'})
+      self.assert_(isinstance(results[1], MySpaceError))
+      self.assert_(isinstance(results[2], MySpaceError))
+      self.assertEqual(results[3], {'status': 'busy'})
+      self.assertEqual(len(self.fetcher.requests), 2)
+
+  def test_http_errors_are_returned(self):
+      self.fetcher.status = 500
+      results = self.ms.fetch_many([('get_profile', {'user_id': 1234})])
+      self.assert_(isinstance(results[0], MySpaceError))
+      self.assertEqual(results[0].http_response.status, 500)
+
+class PagingFetcher(object):
+  """Serves a friends list of `total` entries page by page."""
+
+  def __init__(self, total, report_count=True):
+      self.total = total
+      self.report_count = report_count
+      self.pages = []
+
+  def fetch(self, url, body=None, headers=None):
+      params = cgi.parse_qs(url.split('?', 1)[1])
+      page = int(params['page'][0])
+      page_size = int(params['page_size'][0])
+      self.pages.append(page)
+      ids = range((page - 1) * page_size, min(page * page_size, self.total))
+      response = {'Friends': [{'userId': i} for i in ids]}
+      if self.report_count:
+          response['count'] = self.total
+      return HTTPResponse(url, 200, {}, simplejson.dumps(response))
+
+class PagingIteratorTest(unittest.TestCase):
+
+  def test_iterates_all_pages(self):
+      fetcher = PagingFetcher(25)
+      ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=fetcher)
+      ids = [friend['userId'] for friend in ms.iter_friends(1234, page_size=10)]
+      self.assertEqual(ids, range(25))
+      self.assertEqual(fetcher.pages, [1, 2, 3])
+
+  def test_stops_at_reported_count(self):
+      fetcher = PagingFetcher(20)
+      ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=fetcher)
+      self.assertEqual(len(list(ms.iter_friends(1234, page_size=10, prefetch=False))), 20)
+      self.assertEqual(fetcher.pages, [1, 2])
+
+  def test_no_prefetch_fetches_page_by_page(self):
+      fetcher = PagingFetcher(25)
+      ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=fetcher)
+      friends = ms.iter_friends(1234, page_size=10, prefetch=False)
+      self.assertEqual(fetcher.pages, [])
+      friends.next()
+      self.assertEqual(fetcher.pages, [1])
+      for i in range(9):
+          friends.next()
+      self.assertEqual(fetcher.pages, [1])
+      friends.next()
+      self.assertEqual(fetcher.pages, [1, 2])
+      friends.close()
+      self.assertEqual(fetcher.pages, [1, 2])
+
+  def test_stops_at_short_page_without_count(self):
+      fetcher = PagingFetcher(15, report_count=False)
+      ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=fetcher)
+      self.assertEqual(len(list(ms.iter_friends(1234, page_size=10))), 15)
+      self.assertEqual(fetcher.pages, [1, 2])
+
+class FriendsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1'
+  body = simplejson.dumps({'count': 3, 'Friends': [{'userId': 1}, {'userId': 2}, {'userId': 3}]})
+
+  def do_GET(self):
+      self.send_response(200)
+      self.send_header('Content-Type', 'application/json')
+      self.send_header('Content-Length', str(len(self.body)))
+      self.end_headers()
+      self.wfile.write(self.body)
+
+  def log_message(self, *args):
+      pass
+
+class LocalFetcher(PooledUrlFetcher):
+  """Sends requests for api.myspace.com to a local test server instead."""
+
+  def __init__(self, port):
+      PooledUrlFetcher.__init__(self)
+      self.base_url = 'http://127.0.0.1:%d' % port
+
+  def open(self, url, body=None, headers=None):
+      return PooledUrlFetcher.open(self, url.replace('http://api.myspace.com', self.base_url), body, headers)
+
+class StreamingTest(unittest.TestCase):
+
+  def setUp(self):
+      self.server = start_server(FriendsHandler)
+      self.fetcher = LocalFetcher(self.server.server_port)
+      self.ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=self.fetcher)
+
+  def tearDown(self):
+      self.fetcher.pool.clear()
+      self.server.shutdown()
+      self.server.server_close()
+
+  def test_stream_friends(self):
+      self.assertEqual([f['userId'] for f in self.ms.stream_friends(1234)], [1, 2, 3])
+      # the rest of the body is drained so the connection goes back to the pool
+      self.assertEqual(self.fetcher.pool.idle_count(), 1)
+
+  def test_stream_validates_eagerly(self):
+      self.assertRaises(MySpaceError, self.ms.stream_friends, 1234, list='junk')
+      self.assertRaises(MySpaceError, self.ms.stream_photos, -1)
+
+class ResettingStream(object):
+  """Returns data on the first read, then fails as if the connection was reset."""
+
+  def __init__(self, data):
+      self.data = data
+
+  def read(self, size=-1):
+      if self.data is None:
+          raise socket.error(errno.ECONNRESET, 'Connection reset by peer')
+      data, self.data = self.data, None
+      return data
+
+  def close(self):
+      pass
+
+class StreamFetcher(object):
+
+  def __init__(self, make_stream):
+      self.make_stream = make_stream
+
+  def open(self, url, body=None, headers=None):
+      fp = self.make_stream()
+      return StreamingHTTPResponse(url, 200, {}, fp, fp.close)
+
+class StreamingErrorTest(unittest.TestCase):
+
+  def client(self, make_stream):
+      self.breaker = CircuitBreaker(failure_threshold=1)
+      return MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=StreamFetcher(make_stream),
+                     circuit_breaker=self.breaker)
+
+  def assertTransportError(self, items):
+      try:
+          for item in items:
+              pass
+          self.fail('MySpaceTransportError not raised')
+      except MySpaceTransportError:
+          pass
+      self.failUnless(self.breaker.is_open('http://api.myspace.com/'))
+
+  def test_reset_while_streaming(self):
+      ms = self.client(lambda: ResettingStream('{"count": 3, "Friends": [{"userId": 1}, '))
+      friends = ms.stream_friends(1234)
+      self.assertEqual(friends.next(), {'userId': 1})
+      self.assertTransportError(friends)
+      ms = self.client(lambda: ResettingStream('<?xml version="1.0"?><feed xmlns="http://www.w3.org/2005/Atom"><entry>'))
+      self.assertTransportError(ms.iter_activities(1234))
+
+  def test_malformed_entry(self):
+      body = '{"count": 3, "Friends": [{"userId": 1}, {"userId": }, {"userId": 3}]}'
+      ms = self.client(lambda: StringIO.StringIO(body))
+      friends = ms.stream_friends(1234)
+      self.assertEqual(friends.next(), {'userId': 1})
+      self.assertRaises(MySpaceError, friends.next)
+      # same error as the buffered call
+      ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET',
+                   url_fetcher=FakeFetcher({'/v1/users/1234/friends.json': body}))
+      self.assertRaises(MySpaceError, ms.get_friends, 1234)
+
+  def test_truncated_body(self):
+      ms = self.client(lambda: StringIO.StringIO('{"count": 3, "Photos": [{"id": 1}, {"id": 2'))
+      self.assertTransportError(ms.stream_photos(1234))
+
+class EndpointRegistryTest(unittest.TestCase):
+
+  def setUp(self):
+      self.fetcher = FakeFetcher({'/v1/user.json': '{"userId": 1234}'})
+      self.ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=self.fetcher)
+
+  def test_every_endpoint_has_a_wrapper(self):
+      from myspace.endpoints import ENDPOINT_NAMES
+      for name in ENDPOINT_NAMES:
+          self.assert_(callable(getattr(self.ms, name)))
+
+  def test_parameters_are_mapped(self):
+      self.ms.get_profile(1234, type='basic')
+      url = self.fetcher.requests[0][0]
+      self.assert_(url.startswith('http://api.myspace.com/v1/users/1234/profile.json?'))
+      self.assert_('detailtype=basic' in url)
+
+  def test_invalid_values(self):
+      self.assertRaises(MySpaceError, self.ms.get_profile, 1234, type='junk')
+      self.assertRaises(MySpaceError, self.ms.create_album, 1234, 'title', privacy='junk')
+      self.assertRaises(MySpaceError, self.ms.set_status, 1234, '')
+      self.assertRaises(MySpaceError, self.ms.send_notification, 'junk', '1', 'content')
+      self.assertEqual(self.fetcher.requests, [])
+
+  def test_call_by_name(self):
+      self.assertEqual(self.ms.call('get_userid'), 1234)
+      self.assertRaises(MySpaceError, self.ms.call, 'get_profile', user_id=1234, junk=1)
+      self.assertRaises(MySpaceError, self.ms.call, 'get_profile')
+      self.assertEqual(self.ms.fetch_many([('get_userid', None)]), [1234])
+
+class RequestSerializationTest(unittest.TestCase):
+
+  def setUp(self):
+      self.fetcher = FakeFetcher()
+
+  def make_client(self, **options):
+      return MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=self.fetcher, **options)
+
+  def test_post_splits_oauth_and_request_parameters(self):
+      self.make_client().create_album(1234, 'my album')
+      url, body, headers = self.fetcher.requests[0]
+      query = cgi.parse_qs(url.split('?', 1)[1])
+      self.assert_('oauth_signature' in query)
+      self.assert_(not [k for k in query if not k.startswith('oauth_')])
+      self.assertEqual(cgi.parse_qs(body), {'title': ['my album'], 'privacy': ['Everyone']})
+
+  def test_get_sends_everything_in_the_query(self):
+      self.make_client().get_profile(1234, type='basic')
+      url, body, headers = self.fetcher.requests[0]
+      query = cgi.parse_qs(url.split('?', 1)[1])
+      self.assertEqual(query['detailtype'], ['basic'])
+      self.assert_('oauth_signature' in query)
+      self.assertEqual(body, None)
+
+  def test_header_mode(self):
+      ms = self.make_client(auth_mode='header')
+      ms.get_profile(1234, type='basic')
+      ms.set_status(1234, 'hello')
+      url, body, headers = self.fetcher.requests[0]
+      self.assertEqual(url, 'http://api.myspace.com/v1/users/1234/profile.json?detailtype=basic')
+      self.assert_(headers['Authorization'].startswith('OAuth realm=""'))
+      self.assert_('oauth_signature=' in headers['Authorization'])
+      self.assert_('detailtype' not in headers['Authorization'])
+      url, body, headers = self.fetcher.requests[1]
+      self.assertEqual(url, 'http://api.myspace.com/v1/users/1234/status')
+      self.assertEqual(body, 'status=hello')
+      self.assertEqual(headers['X-HTTP-Method-Override'], 'PUT')
+
+  def test_invalid_auth_mode(self):
+      self.assertRaises(ValueError, self.make_client, auth_mode='junk')
+
+  def test_fetch_many_signs_in_one_batch(self):
+      self.make_client().fetch_many([('get_profile', {'user_id': i, 'type': 'basic'}) for i in range(1, 6)] +
+                                    [('create_album', {'user_id': 1, 'title': 'my album'})], max_workers=1)
+      self.assertEqual(len(self.fetcher.requests), 6)
+      consumer = oauth.OAuthConsumer('CONSUMER_KEY', 'CONSUMER_SECRET')
+      token = oauth.OAuthToken('TOKEN', 'SECRET')
+      nonces = set()
+      for url, body, headers in self.fetcher.requests:
+          api_url, query = url.split('?', 1)
+          parameters = dict([(k, v[0]) for k, v in cgi.parse_qs(query).items() + cgi.parse_qs(body or '').items()])
+          request = oauth.OAuthRequest(body and 'POST' or 'GET', api_url, parameters)
+          signature = parameters['oauth_signature']
+          self.assert_(oauth.OAuthSignatureMethod_HMAC_SHA1().check_signature(request, consumer, token, signature))
+          nonces.add(parameters['oauth_nonce'])
+      self.assertEqual(len(nonces), 6)
+
+class NotificationFanoutTest(unittest.TestCase):
+
+  class FailingFetcher(FakeFetcher):
+      """Fails the calls whose recipients include one of the failing ids."""
+
+      def __init__(self, failing):
+          FakeFetcher.__init__(self)
+          self.failing = failing
+
+      def fetch(self, url, body=None, headers=None):
+          FakeFetcher.fetch(self, url, body, headers)
+          recipients = cgi.parse_qs(body)['recipients'][0].split(',')
+          if [r for r in recipients if r in self.failing]:
+              return HTTPResponse(url, 500, {}, '')
+          return HTTPResponse(url, 201, {}, '{}')
+
+  def test_template_is_proper_json(self):
+      fetcher = FakeFetcher()
+      ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=fetcher)
+      ms.send_notification(1234, '1,2', 'say "hi"', btn0_label='Go', btn0_surface='canvas')
+      params = cgi.parse_qs(fetcher.requests[0][1])
+      self.assertEqual(params['recipients'], ['1,2'])
+      self.assertEqual(simplejson.loads(params['templateParameters'][0]),
+                       {'content': 'say "hi"', 'button0_label': 'Go', 'button0_surface': 'canvas'})
+
+  def test_mediaitems_are_escaped(self):
+      fetcher = FakeFetcher()
+      ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=fetcher)
+      ms.send_notification(1234, '1', 'content', mediaitems='http://api.myspace.com/v1/users/296768296')
+      ms.send_notification(1234, '1', 'content', mediaitems='http://x/"}, "injected": {"\\')
+      mediaitems = [cgi.parse_qs(body)['mediaitems'][0] for url, body, headers in fetcher.requests]
+      self.assertEqual(mediaitems[0], '{"http://api.myspace.com/v1/users/296768296"}')
+      self.assertEqual(simplejson.loads(mediaitems[1][1:-1]), 'http://x/"}, "injected": {"\\')
+
+  def test_fan_out(self):
+      fetcher = self.FailingFetcher(['57'])
+      ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=fetcher)
+      report = ms.send_notifications(1234, xrange(250), 'content', chunk_size=20, max_workers=4)
+      self.assertEqual(len(report.chunks), 13)
+      self.assertEqual([chunk.index for chunk in report.chunks], range(13))
+      self.assertEqual(report.recipient_count(), 250)
+      self.assertEqual(len(fetcher.requests), 13)
+      self.assertEqual([chunk.index for chunk in report.failed()], [2])
+      self.assertEqual(report.failed_recipients(), [str(i) for i in range(40, 60)])
+      self.assert_(isinstance(report.failed()[0].error, MySpaceError))
+      self.failIf(report.ok())
+
+  def test_no_recipients(self):
+      fetcher = FakeFetcher()
+      ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=fetcher)
+      self.assertEqual(ms.send_notifications(1234, [], 'content').chunks, [])
+      self.assertRaises(MySpaceError, ms.send_notifications, 'junk', [1], 'content')
+      self.assertEqual(fetcher.requests, [])
+
+class SingleFlightTest(unittest.TestCase):
+
+  class BlockingFetcher(FakeFetcher):
+      """Holds every request until release is set."""
+
+      def __init__(self, status=200):
+          FakeFetcher.__init__(self, {'/v1/users/1234/profile.json': '{"name": "Tom"}'}, status)
+          self.release = threading.Event()
+
+      def fetch(self, url, body=None, headers=None):
+          self.release.wait(5)
+          return FakeFetcher.fetch(self, url, body, headers)
+
+  def call_concurrently(self, ms, fetcher, count=10):
+      results = []
+      def call():
+          try:
+              results.append(ms.get_profile(1234))
+          except MySpaceError, e:
+              results.append(e)
+      threads = [threading.Thread(target=call) for i in range(count)]
+      for thread in threads:
+          thread.start()
+      while ms.single_flight.shared < count - 1:
+          threading.Event().wait(0.01)
+      fetcher.release.set()
+      for thread in threads:
+          thread.join(5)
+      return results
+
+  def test_identical_calls_are_sent_once(self):
+      fetcher = self.BlockingFetcher()
+      ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=fetcher)
+      results = self.call_concurrently(ms, fetcher)
+      self.assertEqual(len(fetcher.requests), 1)
+      self.assertEqual(results, [{'name': 'Tom'}] * 10)
+      self.assertEqual(ms.single_flight.in_flight(), 0)
+
+  def test_errors_are_shared(self):
+      fetcher = self.BlockingFetcher(status=500)
+      ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=fetcher)
+      results = self.call_concurrently(ms, fetcher, 5)
+      self.assertEqual(len(fetcher.requests), 1)
+      self.assertEqual(len([e for e in results if isinstance(e, MySpaceError)]), 5)
+
+  def test_leader_timeout_not_shared(self):
+      fetcher = self.BlockingFetcher()
+      fetch = fetcher.fetch
+      def fetch_timing_out_once(url, body=None, headers=None, connect_timeout=None, read_timeout=None):
+          if not fetcher.requests:
+              fetcher.release.wait(5)
+              fetcher.requests.append((url, body, headers))
+              raise socket.timeout('timed out')
+          return fetch(url, body, headers)
+      fetcher.fetch = fetch_timing_out_once
+      ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=fetcher)
+      results = {}
+      def call(name, client):
+          try:
+              results[name] = client.get_profile(1234)
+          except MySpaceError, e:
+              results[name] = e
+      leader = threading.Thread(target=call, args=('leader', ms.with_timeouts(read_timeout=0.1)))
+      leader.start()
+      while ms.single_flight.in_flight() < 1:
+          threading.Event().wait(0.01)
+      follower = threading.Thread(target=call, args=('follower', ms))
+      follower.start()
+      while ms.single_flight.shared < 1:
+          threading.Event().wait(0.01)
+      fetcher.release.set()
+      leader.join(5)
+      follower.join(5)
+      self.failUnless(isinstance(results['leader'], MySpaceTimeoutError))
+      self.assertEqual(results['follower'], {'name': 'Tom'})
+      self.assertEqual(len(fetcher.requests), 2)
+
+  def test_sequential_calls_are_not_cached(self):
+      fetcher = FakeFetcher()
+      ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=fetcher)
+      ms.get_profile(1234)
+      ms.get_profile(1234)
+      self.assertEqual(len(fetcher.requests), 2)
+
+  def test_disabled(self):
+      ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=FakeFetcher(), single_flight=False)
+      self.assertEqual(ms.single_flight, None)
+
+class MySpaceAppTest(unittest.TestCase):
+
+  def setUp(self):
+      self.fetcher = FakeFetcher({'/v1/user.json': '{"userId": 1234}'})
+      self.app = MySpaceApp('CONSUMER_KEY', 'CONSUMER_SECRET', url_fetcher=self.fetcher)
+
+  def test_views_share_state(self):
+      ms1 = self.app.for_token('TOKEN1', 'SECRET1')
+      ms2 = self.app.for_token('TOKEN2', 'SECRET2')
+      for attr in ('consumer', 'signature_method', 'url_fetcher', 'single_flight'):
+          self.assert_(getattr(ms1, attr) is getattr(ms2, attr), attr)
+      self.assertEqual((ms1.token.key, ms2.token.key), ('TOKEN1', 'TOKEN2'))
+      self.assertEqual(self.app.onsite().token, None)
+      self.assert_(self.app.url_fetcher is self.fetcher)
+
+  def test_views_sign_with_their_token(self):
+      self.assertEqual(self.app.for_token('TOKEN1', 'SECRET1').get_userid(), 1234)
+      self.assertEqual(self.app.for_token('TOKEN2', 'SECRET2').get_userid(), 1234)
+      tokens = [cgi.parse_qs(url.split('?', 1)[1])['oauth_token'] for url, body, headers in self.fetcher.requests]
+      self.assertEqual(tokens, [['TOKEN1'], ['TOKEN2']])
+
+  def test_async_view(self):
+      ams = self.app.async_for_token('TOKEN', 'SECRET')
+      self.assertEqual(ams.get_userid().get(5), 1234)
+
+  def test_default_fetcher_is_pooled(self):
+      self.assert_(isinstance(MySpaceApp('CONSUMER_KEY', 'CONSUMER_SECRET').url_fetcher, PooledUrlFetcher))
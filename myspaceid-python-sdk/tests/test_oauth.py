@@ -0,0 +1,189 @@
+import base64
+import hashlib
+import hmac
+import threading
+import unittest
+import urllib
+from oauthlib import oauth
+
+def reference_signature(request, consumer, token):
+    key = oauth.escape(consumer.secret) + '&'
+    if token:
+        key += oauth.escape(token.secret)
+    raw = '&'.join([oauth.escape(request.get_normalized_http_method()),
+                    oauth.escape(request.get_normalized_http_url()),
+                    oauth.escape(request.get_normalized_parameters())])
+    return base64.b64encode(hmac.new(key, raw, hashlib.sha1).digest())
+
+class EscapeTest(unittest.TestCase):
+
+  def test_matches_quote(self):
+      for value in ('', 'abc-._~XYZ019', 'a b', 'a+b/c=d&e', 'http://api.myspace.com/v1/user.json', '\xe9t\xe9',
+                    '%20', u'unicode value', '1234;5678'):
+          self.assertEqual(oauth.escape(value), urllib.quote(value, safe='~'))
+          # memoized the second time
+          self.assertEqual(oauth.escape(value), urllib.quote(value, safe='~'))
+
+  def test_unreserved_strings_returned_as_is(self):
+      nonce = '%08d' % 1234
+      self.failUnless(oauth.escape(nonce) is nonce)
+
+  def test_cache_bounded(self):
+      for i in range(oauth.ESCAPE_CACHE_SIZE + 10):
+          self.assertEqual(oauth.escape('value %d' % i), 'value%%20%d' % i)
+      self.failUnless(len(oauth._escaped) <= oauth.ESCAPE_CACHE_SIZE)
+
+  def test_long_strings_and_secrets_not_cached(self):
+      oauth._escaped.clear()
+      body = 'status=' + 'a b ' * 100
+      self.assertEqual(oauth.escape(body), urllib.quote(body, safe='~'))
+      request = oauth.OAuthRequest.from_consumer_and_token(oauth.OAuthConsumer('KEY', 'con sumer/secret'),
+                                                           http_url='http://api.myspace.com/v1/user.json')
+      request.sign_request(oauth.OAuthSignatureMethod_HMAC_SHA1(), oauth.OAuthConsumer('KEY', 'con sumer/secret'),
+                           oauth.OAuthToken('TOKEN', 'to&ken secret'))
+      request.sign_request(oauth.OAuthSignatureMethod_PLAINTEXT(), oauth.OAuthConsumer('KEY', 'con sumer/secret'),
+                           oauth.OAuthToken('TOKEN', 'to&ken secret'))
+      for value in (body, 'con sumer/secret', 'to&ken secret'):
+          self.failIf(value in oauth._escaped, value)
+
+class NonceTest(unittest.TestCase):
+
+  def test_length_and_characters(self):
+      for length in (1, 8, 16, 40):
+          nonce = oauth.generate_nonce(length)
+          self.assertEqual(len(nonce), length)
+          self.failUnless(oauth.escape(nonce) is nonce)
+      self.assertEqual(len(oauth.generate_nonce()), oauth.DEFAULT_NONCE_LENGTH)
+
+  def test_unique(self):
+      nonces = [oauth.generate_nonce() for i in range(20000)]
+      self.assertEqual(len(set(nonces)), len(nonces))
+
+  def test_batch(self):
+      source = oauth.NonceSource(length=12, buffer_size=30)
+      nonces = source.nonces(100)
+      self.assertEqual([len(nonce) for nonce in nonces], [12] * 100)
+      self.assertEqual(len(set(nonces)), 100)
+      self.assertEqual(len(set(oauth.generate_nonces(500, 2))), 500)
+
+  def test_buffer_discarded_after_fork(self):
+      source = oauth.NonceSource(length=8)
+      source.nonce()
+      pending = source._chars[source._position:source._position + 8]
+      # as seen from a child process
+      source._pid = -1
+      self.assertNotEqual(source.nonce(), pending)
+
+  def test_thread_safe(self):
+      source = oauth.NonceSource(length=8, buffer_size=300)
+      nonces = []
+      def draw():
+          nonces.extend([source.nonce() for i in range(2000)])
+      threads = [threading.Thread(target=draw) for i in range(4)]
+      for thread in threads:
+          thread.start()
+      for thread in threads:
+          thread.join()
+      self.assertEqual(len(set(nonces)), 8000)
+
+class NormalizedUrlTest(unittest.TestCase):
+
+  def test_normalize(self):
+      for url, normalized in (
+          ('http://api.myspace.com/v1/user.json', 'http://api.myspace.com/v1/user.json'),
+          ('HTTP://API.MySpace.com:80/v1/Users/1234/friends.json?page=2#top', 'http://api.myspace.com/v1/Users/1234/friends.json'),
+          ('https://api.myspace.com:443/v1/user.json', 'https://api.myspace.com/v1/user.json'),
+          ('http://api.myspace.com:8080/v1/user.json', 'http://api.myspace.com:8080/v1/user.json'),
+          ('https://api.myspace.com:80/v1/user.json', 'https://api.myspace.com:80/v1/user.json'),
+          ('http://api.myspace.com/v1/users/1/friends/2;3;4.json', 'http://api.myspace.com/v1/users/1/friends/2;3;4.json'),
+          ('http://example.com', 'http://example.com/'),
+          ):
+          self.assertEqual(oauth.normalize_http_url(url), normalized)
+          # memoized the second time
+          self.assertEqual(oauth.normalize_http_url(url), normalized)
+
+  def test_cache_bounded(self):
+      for i in range(oauth.NORMALIZED_URL_CACHE_SIZE + 10):
+          oauth.normalize_http_url('http://api.myspace.com/v1/users/%d/profile.json?a=b' % i)
+      self.failUnless(len(oauth._normalized_urls) <= oauth.NORMALIZED_URL_CACHE_SIZE)
+
+  def test_cached_per_request(self):
+      request = oauth.OAuthRequest('GET', 'http://api.myspace.com:80/v1/user.json?x=1')
+      normalized = request.get_normalized_http_url()
+      self.assertEqual(normalized, 'http://api.myspace.com/v1/user.json')
+      self.failUnless(request.get_normalized_http_url() is normalized)
+      request.http_url = 'http://api.myspace.com/v1/users/1234/status.json'
+      self.assertEqual(request.get_normalized_http_url(), 'http://api.myspace.com/v1/users/1234/status.json')
+
+class HmacSha1Test(unittest.TestCase):
+
+  def setUp(self):
+      self.method = oauth.OAuthSignatureMethod_HMAC_SHA1()
+      self.consumer = oauth.OAuthConsumer('KEY', 'con sumer/secret')
+      self.token = oauth.OAuthToken('TOKEN', 'to&ken~secret')
+
+  def request(self, **parameters):
+      return oauth.OAuthRequest.from_consumer_and_token(self.consumer, token=self.token,
+                                                        http_url='http://api.myspace.com/v1/users/1234/friends.json',
+                                                        parameters=parameters)
+
+  def test_signature_matches_reference(self):
+      for token in (self.token, None):
+          for page in range(3):
+              request = self.request(page=page, page_size=100)
+              self.assertEqual(self.method.build_signature(request, self.consumer, token),
+                               reference_signature(request, self.consumer, token))
+
+  def test_key_state_reused(self):
+      self.method.build_signature(self.request(page=1), self.consumer, self.token)
+      self.method.build_signature(self.request(page=2), self.consumer, self.token)
+      self.assertEqual(len(self.method._keyed), 1)
+
+  def test_key_cache_bounded(self):
+      self.method.max_cached_keys = 4
+      for i in range(10):
+          token = oauth.OAuthToken('TOKEN', 'secret%d' % i)
+          request = self.request(page=i)
+          self.assertEqual(self.method.build_signature(request, self.consumer, token),
+                           reference_signature(request, self.consumer, token))
+      self.failUnless(len(self.method._keyed) <= 4)
+
+  def test_check_signature(self):
+      request = self.request(page=1)
+      request.sign_request(self.method, self.consumer, self.token)
+      signature = request.get_parameter('oauth_signature')
+      self.failUnless(self.method.check_signature(request, self.consumer, self.token, signature))
+
+class BatchSigningTest(unittest.TestCase):
+
+  def setUp(self):
+      self.method = oauth.OAuthSignatureMethod_HMAC_SHA1()
+      self.consumer = oauth.OAuthConsumer('KEY', 'SECRET')
+      self.token = oauth.OAuthToken('TOKEN', 'TOKEN_SECRET')
+
+  def test_sign_requests(self):
+      url = 'http://api.myspace.com/v1/users/%d/profile.json'
+      batch = [('GET', url % i, {'detailtype': 'basic'}) for i in range(50)] + [('POST', url % 99, {'status': 'a b'})]
+      signed = oauth.sign_requests(self.method, self.consumer, self.token, batch)
+      self.assertEqual(len(signed), len(batch))
+      self.assertEqual(len(set([r.get_parameter('oauth_nonce') for r in signed])), len(batch))
+      self.assertEqual(len(set([r.get_parameter('oauth_timestamp') for r in signed])), 1)
+      for (http_method, http_url, parameters), request in zip(batch, signed):
+          self.assertEqual((request.http_method, request.http_url), (http_method, http_url))
+          self.assertEqual(request.get_nonoauth_parameters(), parameters)
+          self.assertEqual(request.get_parameter('oauth_token'), 'TOKEN')
+          signature = request.get_parameter('oauth_signature')
+          self.assertEqual(signature, reference_signature(request, self.consumer, self.token))
+
+  def test_same_parameters_as_single_signing(self):
+      single = oauth.OAuthRequest.from_consumer_and_token(self.consumer, token=self.token,
+                                                          http_url='http://api.myspace.com/v1/user.json')
+      single.sign_request(self.method, self.consumer, self.token)
+      batch = oauth.sign_requests(self.method, self.consumer, None, [('GET', 'http://api.myspace.com/v1/user.json', None)])
+      self.assertEqual(sorted(batch[0].parameters.keys() + ['oauth_token']), sorted(single.parameters.keys()))
+
+  def test_empty_batch(self):
+      self.assertEqual(oauth.sign_requests(self.method, self.consumer, self.token, []), [])
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+from myspace.myspaceapi import MySpace, MySpaceTimeoutError, HTTPResponse
+from myspace.ratelimit import RequestScheduler, TokenBucket, endpoint_family
+
+class FakeClock(object):
+
+  def __init__(self):
+      self.now = 1000.0
+      self.sleeps = []
+
+  def __call__(self):
+      return self.now
+
+  def sleep(self, seconds):
+      self.sleeps.append(seconds)
+      self.now += seconds
+
+class OkFetcher(object):
+
+  def fetch(self, url, body=None, headers=None, connect_timeout=None, read_timeout=None):
+      return HTTPResponse(url, 200, {}, '{}')
+
+class TokenBucketTest(unittest.TestCase):
+
+  def test_burst_then_wait(self):
+      clock = FakeClock()
+      bucket = TokenBucket(2, 2, clock)
+      self.assertEqual(bucket.reserve(), 0.0)
+      self.assertEqual(bucket.reserve(), 0.0)
+      self.assertEqual(bucket.reserve(), 0.5)
+      self.assertEqual(bucket.reserve(), 1.0)
+      clock.now += 1.0
+      self.assertEqual(bucket.reserve(), 0.5)
+
+  def test_max_wait(self):
+      clock = FakeClock()
+      bucket = TokenBucket(2, 1, clock)
+      self.assertEqual(bucket.reserve(0), 0.0)
+      self.assertEqual(bucket.reserve(0.4), None)
+      # the refused request took no token
+      self.assertEqual(bucket.reserve(0.5), 0.5)
+      self.assertEqual(bucket.reserve(), 1.0)
+
+class RequestSchedulerTest(unittest.TestCase):
+
+  def test_endpoint_family(self):
+      self.assertEqual(endpoint_family('http://api.myspace.com/v1/users/1/friends.json'), 'friends')
+      self.assertEqual(endpoint_family('http://api.myspace.com/v1/users/1/friends/2;3.json'), 'friends')
+      self.assertEqual(endpoint_family('http://api.myspace.com/v1/users/1/albums/2/photos.json'), 'photos')
+      self.assertEqual(endpoint_family('http://api.myspace.com/v1/applications/1/notifications'), 'notifications')
+      self.assertEqual(endpoint_family('http://api.myspace.com/v1/users/1/profile.json'), 'default')
+
+  def test_requests_are_queued_per_family_and_consumer(self):
+      clock = FakeClock()
+      scheduler = RequestScheduler({'friends': (1, 1), ('KEY2', 'friends'): (10, 10)}, clock=clock, sleep=clock.sleep)
+      ms = MySpace('KEY', 'SECRET', 'TOKEN', 'SECRET', url_fetcher=OkFetcher(), scheduler=scheduler)
+      ms2 = MySpace('KEY2', 'SECRET', 'TOKEN', 'SECRET', url_fetcher=OkFetcher(), scheduler=scheduler)
+      for i in range(3):
+          ms.get_friends(1234)
+          ms2.get_friends(1234)
+          ms.get_profile(1234)
+      self.assertEqual(clock.sleeps, [1.0, 1.0])
+      stats = scheduler.stats()
+      self.assertEqual(stats[('KEY', 'friends')]['delayed'], 2)
+      self.assertEqual(stats[('KEY', 'friends')]['total_wait'], 2.0)
+      self.assertEqual(stats[('KEY2', 'friends')]['delayed'], 0)
+      self.assertEqual(stats[('KEY', 'default')]['delayed'], 0)
+      self.assertEqual(scheduler.queue_depth(), 0)
+
+  def test_no_wait_past_deadline(self):
+      clock = FakeClock()
+      scheduler = RequestScheduler(default_limit=(0.5, 1), clock=clock, sleep=clock.sleep)
+      ms = MySpace('KEY', 'SECRET', 'TOKEN', 'SECRET', url_fetcher=OkFetcher(), scheduler=scheduler, timeout=0.5)
+      ms.get_profile(1234)
+      for i in range(3):
+          self.assertRaises(MySpaceTimeoutError, ms.get_profile, 1234)
+      self.assertEqual(clock.sleeps, [])
+      stats = scheduler.stats()[('KEY', 'default')]
+      self.assertEqual((stats['requests'], stats['delayed'], stats['timed_out']), (4, 0, 3))
+      # the calls shed did not use up turns
+      clock.now += 2.0
+      ms.get_profile(1234)
+      self.assertEqual(clock.sleeps, [])
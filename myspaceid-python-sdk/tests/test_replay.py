@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+from openid import fetchers
+from myspace.myspaceapi import MySpace
+from myspace.replay import RecordingFetcher, ReplayFetcher, ReplayMissError, TrafficLog, read_log, replay
+from fake_myspace import FakeMySpaceServer
+
+class StaticOpenIDFetcher(fetchers.HTTPFetcher):
+
+  def fetch(self, url, body=None, headers=None):
+      return fetchers.HTTPResponse(url, 200, {'content-type': 'text/plain'}, 'ns:http://specs.openid.net/auth/2.0\n')
+
+class ReplayTest(unittest.TestCase):
+
+  def setUp(self):
+      fd, self.path = tempfile.mkstemp(suffix='.log')
+      os.close(fd)
+
+  def tearDown(self):
+      os.remove(self.path)
+
+  def record_workload(self):
+      server = FakeMySpaceServer(friend_count=120, activity_count=10, compress=True).start()
+      fetcher = server.fetcher()
+      log = TrafficLog(self.path)
+      try:
+          ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=RecordingFetcher(fetcher, log))
+          results = (ms.get_userid(), ms.get_profile(1234), len(list(ms.iter_friends(1234, page_size=50))),
+                     ms.set_status(1234, 'replayed'), len(list(ms.iter_activities(1234))))
+      finally:
+          log.close()
+          fetcher.pool.clear()
+          server.stop()
+      return results
+
+  def replay_client(self, exchanges, **kwargs):
+      return MySpace('OTHER_KEY', 'OTHER_SECRET', 'OTHER_TOKEN', 'OTHER_SECRET', url_fetcher=ReplayFetcher(exchanges, **kwargs))
+
+  def test_volatile_parameters_not_recorded(self):
+      self.record_workload()
+      data = open(self.path).read()
+      for name in ('oauth_nonce=', 'oauth_timestamp=', 'oauth_signature='):
+          self.failIf(name in data, name)
+      self.failUnless('oauth_consumer_key' in data)
+      self.assertEqual(len(list(read_log(self.path))), 7)
+
+  def test_log_is_appended(self):
+      self.record_workload()
+      self.record_workload()
+      self.assertEqual(len(list(read_log(self.path))), 14)
+
+  def test_replay_fetcher(self):
+      recorded = self.record_workload()
+      exchanges = list(read_log(self.path))
+      self.failIf([e for e in exchanges if 'Content-Encoding' in e.headers or 'content-encoding' in e.headers])
+      ms = self.replay_client(exchanges)
+      replayed = (ms.get_userid(), ms.get_profile(1234), len(list(ms.iter_friends(1234, page_size=50))),
+                  ms.set_status(1234, 'replayed'), len(list(ms.iter_activities(1234))))
+      self.assertEqual(replayed, recorded)
+      self.assertRaises(ReplayMissError, ms.get_profile, 5678)
+
+  def test_replay_driver(self):
+      self.record_workload()
+      exchanges = list(read_log(self.path))
+      report = replay(exchanges, self.replay_client(exchanges), concurrency=4)
+      self.assertEqual(report.requests, len(exchanges))
+      self.assertEqual(report.errors, [])
+      self.assertEqual(report.summary()['latency']['count'], len(exchanges))
+
+  def test_openid_fetcher(self):
+      log = TrafficLog(self.path)
+      recorder = RecordingFetcher(StaticOpenIDFetcher(), log)
+      recorder.fetch('http://openid.example.com/server', 'openid.mode=associate&oauth_nonce=123')
+      log.close()
+      exchange = list(read_log(self.path))[0]
+      self.assertEqual((exchange.method, exchange.body), ('POST', 'openid.mode=associate'))
+      fetcher = ReplayFetcher([exchange], response_class=fetchers.HTTPResponse)
+      resp = fetcher.fetch('http://openid.example.com/server', 'openid.mode=associate')
+      self.failUnless(isinstance(resp, fetchers.HTTPResponse))
+      self.assertEqual(resp.body, 'ns:http://specs.openid.net/auth/2.0\n')
+
+if __name__ == '__main__':
+  unittest.main()
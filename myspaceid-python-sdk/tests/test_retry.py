@@ -0,0 +1,86 @@
+import socket
+import unittest
+from myspace.myspaceapi import MySpace, MySpaceError, HTTPResponse
+from myspace.errors import CircuitOpenError, MySpaceTransportError
+from myspace.retry import RetryPolicy, CircuitBreaker, parse_retry_after
+
+class ScriptedFetcher(object):
+  """Returns the scripted statuses in order; None raises a socket error, exceptions are raised."""
+
+  def __init__(self, statuses, headers=None):
+      self.statuses = list(statuses)
+      self.headers = headers or {}
+      self.urls = []
+
+  def fetch(self, url, body=None, headers=None):
+      self.urls.append(url)
+      status = self.statuses.pop(0)
+      if status is None:
+          raise socket.error('connection reset')
+      if isinstance(status, Exception):
+          raise status
+      return HTTPResponse(url, status, dict(self.headers), '{"ok": true}')
+
+class RetryPolicyTest(unittest.TestCase):
+
+  def setUp(self):
+      self.sleeps = []
+      self.policy = RetryPolicy(max_attempts=3, backoff=1, jitter=False, sleep=self.sleeps.append)
+
+  def client(self, fetcher, **kwargs):
+      return MySpace('KEY', 'SECRET', 'TOKEN', 'SECRET', url_fetcher=fetcher, retry_policy=self.policy, **kwargs)
+
+  def test_retries_get_with_fresh_signature(self):
+      fetcher = ScriptedFetcher([503, None, 200])
+      self.assertEqual(self.client(fetcher).get_profile(1234), {'ok': True})
+      self.assertEqual(self.sleeps, [1, 2])
+      nonces = [url.split('oauth_nonce=')[1].split('&')[0] for url in fetcher.urls]
+      self.assertEqual(len(set(nonces)), 3)
+
+  def test_gives_up_after_max_attempts(self):
+      fetcher = ScriptedFetcher([500, 500, 500])
+      self.assertRaises(MySpaceError, self.client(fetcher).get_profile, 1234)
+      self.assertEqual(len(fetcher.urls), 3)
+
+  def test_post_is_not_retried(self):
+      fetcher = ScriptedFetcher([503, 201])
+      self.assertRaises(MySpaceError, self.client(fetcher).create_album, 1234, 'title')
+      self.assertEqual(len(fetcher.urls), 1)
+
+  def test_transport_errors_are_wrapped(self):
+      ms = MySpace('KEY', 'SECRET', 'TOKEN', 'SECRET', url_fetcher=ScriptedFetcher([None]))
+      self.assertRaises(MySpaceTransportError, ms.get_profile, 1234)
+
+  def test_retry_after(self):
+      fetcher = ScriptedFetcher([503, 200], headers={'retry-after': '7'})
+      self.client(fetcher).get_profile(1234)
+      self.assertEqual(self.sleeps, [7])
+      self.assertEqual(parse_retry_after(HTTPResponse(headers={'retry-after': 'junk'})), None)
+
+class CircuitBreakerTest(unittest.TestCase):
+
+  def test_opens_and_recovers(self):
+      now = [0.0]
+      breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: now[0])
+      fetcher = ScriptedFetcher([500, 500, 200])
+      ms = MySpace('KEY', 'SECRET', 'TOKEN', 'SECRET', url_fetcher=fetcher, circuit_breaker=breaker)
+      self.assertRaises(MySpaceError, ms.get_profile, 1234)
+      self.assertRaises(MySpaceError, ms.get_profile, 1234)
+      self.assertRaises(CircuitOpenError, ms.get_profile, 1234)
+      self.assertEqual(len(fetcher.urls), 2)
+      now[0] = 11.0
+      self.assertEqual(ms.get_profile(1234), {'ok': True})
+      self.failIf(breaker.is_open('http://api.myspace.com/'))
+
+  def test_trial_ended_by_any_error(self):
+      now = [0.0]
+      breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+      fetcher = ScriptedFetcher([None, ValueError('unexpected'), 200])
+      ms = MySpace('KEY', 'SECRET', 'TOKEN', 'SECRET', url_fetcher=fetcher, circuit_breaker=breaker)
+      self.assertRaises(MySpaceTransportError, ms.get_profile, 1234)
+      now[0] = 11.0
+      self.assertRaises(ValueError, ms.get_profile, 1234)
+      self.assertRaises(CircuitOpenError, ms.get_profile, 1234)
+      now[0] = 22.0
+      self.assertEqual(ms.get_profile(1234), {'ok': True})
+      self.failIf(breaker.is_open('http://api.myspace.com/'))
@@ -0,0 +1,121 @@
+import socket
+import time
+import unittest
+import urllib2
+from myspace.myspaceapi import MySpace, MySpaceError, MySpaceTimeoutError, HTTPResponse
+from myspace.retry import RetryPolicy
+from fake_myspace import FakeMySpaceServer
+
+class TimeoutFetcher(object):
+  """Records the timeouts passed with every request and replies with the
+     scripted statuses; None raises the scripted error instead.
+  """
+
+  def __init__(self, statuses, error=None):
+      self.statuses = list(statuses)
+      self.error = error
+      self.timeouts = []
+
+  def fetch(self, url, body=None, headers=None, connect_timeout=None, read_timeout=None):
+      self.timeouts.append((connect_timeout, read_timeout))
+      status = self.statuses.pop(0)
+      if status is None:
+          raise self.error
+      return HTTPResponse(url, status, {}, '{"userId": 1234}')
+
+class TimeoutOptionsTest(unittest.TestCase):
+
+  def client(self, fetcher, **kwargs):
+      return MySpace('KEY', 'SECRET', 'TOKEN', 'SECRET', url_fetcher=fetcher, **kwargs)
+
+  def test_no_timeouts_by_default(self):
+      fetcher = TimeoutFetcher([200])
+      self.client(fetcher).get_userid()
+      self.assertEqual(fetcher.timeouts, [(None, None)])
+
+  def test_timeouts_passed_to_fetcher(self):
+      fetcher = TimeoutFetcher([200, 200])
+      ms = self.client(fetcher, connect_timeout=2, read_timeout=5)
+      ms.get_userid()
+      ms.with_timeouts(read_timeout=1).get_userid()
+      self.assertEqual(fetcher.timeouts, [(2, 5), (2, 1)])
+      self.assertEqual(ms.read_timeout, 5)
+
+  def test_timeouts_capped_by_total_timeout(self):
+      fetcher = TimeoutFetcher([200])
+      self.client(fetcher, read_timeout=30, timeout=1).get_userid()
+      connect_timeout, read_timeout = fetcher.timeouts[0]
+      self.failUnless(0 < connect_timeout <= 1)
+      self.failUnless(0 < read_timeout <= 1)
+
+  def test_socket_timeouts_raise_timeout_error(self):
+      for error in (socket.timeout('timed out'), urllib2.URLError(socket.timeout('timed out'))):
+          ms = self.client(TimeoutFetcher([None], error))
+          try:
+              ms.get_userid()
+              self.fail('MySpaceTimeoutError not raised')
+          except MySpaceTimeoutError, e:
+              self.failUnless(e.cause is error)
+
+  def test_expired_deadline(self):
+      fetcher = TimeoutFetcher([200])
+      ms = self.client(fetcher).with_deadline(-1)
+      self.assertRaises(MySpaceTimeoutError, ms.get_userid)
+      self.assertEqual(fetcher.timeouts, [])
+
+  def test_earlier_deadline_kept(self):
+      ms = self.client(TimeoutFetcher([])).with_deadline(1)
+      self.assertEqual(ms.with_deadline(60).deadline, ms.deadline)
+
+  def test_no_retry_past_deadline(self):
+      sleeps = []
+      policy = RetryPolicy(max_attempts=5, backoff=10, jitter=False, sleep=sleeps.append)
+      fetcher = TimeoutFetcher([503, 503])
+      ms = self.client(fetcher, retry_policy=policy, timeout=5)
+      try:
+          ms.get_userid()
+          self.fail('MySpaceError not raised')
+      except MySpaceError, e:
+          self.assertEqual(e.http_response.status, 503)
+      self.assertEqual(len(fetcher.timeouts), 1)
+      self.assertEqual(sleeps, [])
+
+class SlowServerTest(unittest.TestCase):
+  """Timeouts against the local server answering after 0.3 seconds."""
+
+  def setUp(self):
+      self.server = FakeMySpaceServer(friend_count=500, latency=0.3).start()
+      self.fetcher = self.server.fetcher()
+      self.ms = MySpace('CONSUMER_KEY', 'CONSUMER_SECRET', 'TOKEN', 'SECRET', url_fetcher=self.fetcher)
+
+  def tearDown(self):
+      self.fetcher.pool.clear()
+      self.server.stop()
+
+  def test_read_timeout(self):
+      started = time.time()
+      self.assertRaises(MySpaceTimeoutError, self.ms.with_timeouts(read_timeout=0.05).get_userid)
+      self.failUnless(time.time() - started < 0.25)
+      # the timed out connection is not reused
+      self.assertEqual(self.fetcher.pool.idle_count(), 0)
+      self.assertEqual(self.ms.get_userid(), 1234)
+
+  def test_iter_friends_timeout(self):
+      friends = []
+      try:
+          for friend in self.ms.iter_friends(1234, page_size=100, timeout=0.5):
+              friends.append(friend)
+          self.fail('MySpaceTimeoutError not raised')
+      except MySpaceTimeoutError:
+          pass
+      self.failUnless(len(friends) < 500)
+
+  def test_fetch_many_timeout(self):
+      specs = [('get_profile', {'user_id': user_id}) for user_id in range(1, 5)]
+      results = self.ms.fetch_many(specs, max_workers=1, timeout=0.45)
+      self.assertEqual(results[0]['basicprofile']['userId'], 1)
+      for result in results[1:]:
+          self.failUnless(isinstance(result, MySpaceTimeoutError))
+
+if __name__ == '__main__':
+  unittest.main()